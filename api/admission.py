@@ -0,0 +1,205 @@
+"""
+Admission control and load shedding for the query endpoints.
+
+Two checks run before a request reaches its handler:
+
+* Per-client token bucket (FLOATCHAT_RATE_LIMIT requests/s, bursts of
+  FLOATCHAT_RATE_BURST). A client over its rate gets 429 with the time
+  until its next token in Retry-After. Clients are keyed by the peer
+  address; X-Forwarded-For is only honoured when the peer is one of
+  FLOATCHAT_TRUSTED_PROXIES (comma-separated), and then the nearest
+  address not itself a trusted proxy is used. A rate of 0 disables it.
+* Concurrency limit with a bounded wait queue. At most
+  FLOATCHAT_MAX_CONCURRENCY requests run at once; up to FLOATCHAT_MAX_QUEUE
+  more wait, each for at most FLOATCHAT_QUEUE_TIMEOUT_MS. A request that
+  finds the queue full, or times out waiting, gets 503 immediately instead
+  of adding to the latency of everyone already admitted.
+
+Queue depth, active requests, queue wait and shed counts are exported
+through ``metrics``.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+from metrics import Counter, Gauge, Histogram
+
+MAX_CONCURRENCY = int(os.getenv("FLOATCHAT_MAX_CONCURRENCY", "8"))
+MAX_QUEUE = int(os.getenv("FLOATCHAT_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.getenv("FLOATCHAT_QUEUE_TIMEOUT_MS", "2000")) / 1e3
+RATE_LIMIT = float(os.getenv("FLOATCHAT_RATE_LIMIT", "0"))
+RATE_BURST = float(os.getenv("FLOATCHAT_RATE_BURST", str(max(1.0, 2 * RATE_LIMIT))))
+TRUSTED_PROXIES = frozenset(a.strip() for a in os.getenv("FLOATCHAT_TRUSTED_PROXIES", "").split(",") if a.strip())
+MAX_TRACKED_CLIENTS = 10_000
+
+QUEUE_DEPTH = Gauge("floatchat_admission_queue_depth", "Requests waiting for a concurrency slot.", ("endpoint",))
+ACTIVE = Gauge("floatchat_admission_active", "Requests holding a concurrency slot.", ("endpoint",))
+QUEUE_WAIT = Histogram("floatchat_admission_queue_wait_seconds", "Time spent waiting for a concurrency slot.", ("endpoint",))
+SHED = Counter("floatchat_requests_shed_total", "Requests rejected by admission control.", ("endpoint", "reason"))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """Consume one token; returns 0.0 on success or the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per client, least recently seen clients evicted past ``max_clients``."""
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket.take(now)
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders; at most ``max_queue`` waiters, each for ``timeout`` seconds."""
+
+    def __init__(self, endpoint, limit, max_queue, timeout):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.05  # EWMA of handler time, for Retry-After estimates
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Returns None once a slot is held, else the shed reason."""
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self._take_slot()
+                return None
+            if self.waiting >= self.max_queue:
+                return "queue_full"
+            self.waiting += 1
+            QUEUE_DEPTH.set(self.waiting, endpoint=self.endpoint)
+            started = time.monotonic()
+            deadline = started + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return "queue_timeout"
+                    self._cond.wait(remaining)
+                self._take_slot()
+                return None
+            finally:
+                self.waiting -= 1
+                QUEUE_DEPTH.set(self.waiting, endpoint=self.endpoint)
+                QUEUE_WAIT.observe(time.monotonic() - started, endpoint=self.endpoint)
+
+    def _take_slot(self):
+        self.active += 1
+        ACTIVE.set(self.active, endpoint=self.endpoint)
+
+    def release(self, elapsed):
+        with self._cond:
+            self.active -= 1
+            ACTIVE.set(self.active, endpoint=self.endpoint)
+            self.service_time += 0.1 * (elapsed - self.service_time)
+            self._cond.notify()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained, at least 1."""
+        backlog = self.waiting + self.active
+        return max(1, math.ceil(backlog * self.service_time / max(1, self.limit)))
+
+
+def client_id(trusted=TRUSTED_PROXIES):
+    """Address the rate limit is keyed on; X-Forwarded-For only counts behind a trusted proxy."""
+    peer = request.remote_addr or "unknown"
+    if peer not in trusted:
+        return peer
+    # Walk back from the proxy that reached us; anything past the first untrusted hop is client-supplied
+    for hop in reversed([a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]):
+        if hop not in trusted:
+            return hop
+    return peer
+
+
+def _reject(endpoint, status, reason, retry_after):
+    SHED.inc(endpoint=endpoint, reason=reason)
+    response = jsonify({"error": "Server busy, please retry" if status == 503 else "Rate limit exceeded",
+                        "reason": reason})
+    return response, status, {"Retry-After": str(retry_after)}
+
+
+_rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST)
+
+
+def admitted(endpoint, limit=MAX_CONCURRENCY, max_queue=MAX_QUEUE, timeout=QUEUE_TIMEOUT):
+    """Decorator applying the per-client rate limit and concurrency limit to a Flask view.
+
+    CORS preflight requests are always let through. A streamed response keeps
+    its slot until the server closes the body.
+    """
+    limiter = ConcurrencyLimiter(endpoint, limit, max_queue, timeout)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == "OPTIONS":
+                return view(*args, **kwargs)
+
+            wait = _rate_limiter.check(client_id())
+            if wait > 0:
+                return _reject(endpoint, 429, "rate_limited", math.ceil(wait))
+
+            reason = limiter.acquire()
+            if reason is not None:
+                return _reject(endpoint, 503, reason, limiter.retry_after())
+
+            started = time.monotonic()
+            release = lambda: limiter.release(time.monotonic() - started)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                release()
+                raise
+            # A streamed body is produced after the view returns; hold the slot until it is closed
+            if response.is_streamed:
+                response.call_on_close(release)
+            else:
+                release()
+            return response
+        wrapper.limiter = limiter
+        return wrapper
+    return decorator
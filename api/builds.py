@@ -0,0 +1,64 @@
+"""
+Index builds off the request path.
+
+Each engine (semantic, shape, climatology, extremes) owns a
+``BackgroundBuild``. When a request finds no index for the current
+catalog it starts the build on a daemon thread and carries on without
+the index; the next request after the build finishes picks it up. The
+startup warmup and the CLIs pass ``wait`` to block until it is done.
+
+At most one build per engine runs at a time, and a build that failed is
+not retried for the same catalog version.
+"""
+
+import logging
+import threading
+import time
+
+log = logging.getLogger("floatchat")
+
+
+class BackgroundBuild:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+        self._version = None
+        self._failed = None
+
+    def submit(self, build, store, wait=False):
+        """Run ``build(store)`` on a daemon thread unless one is already running;
+        block until the build for ``store`` has finished if ``wait``."""
+        while True:
+            with self._lock:
+                if store.version == self._failed:
+                    return
+                thread = self._thread
+                if thread is None or not thread.is_alive():
+                    self._version = store.version
+                    thread = threading.Thread(target=self._run, args=(build, store),
+                                              name=f"{self.name}-build", daemon=True)
+                    self._thread = thread
+                    thread.start()
+                version = self._version
+            if not wait:
+                return
+            thread.join()
+            if version == store.version:
+                return
+
+    @property
+    def running(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def _run(self, build, store):
+        started = time.perf_counter()
+        try:
+            build(store)
+        except Exception:
+            self._failed = store.version
+            log.exception("index.build_failed", extra={"index": self.name, "profiles": len(store)})
+            return
+        log.info("index.built", extra={"index": self.name, "profiles": len(store),
+                                       "build_ms": round((time.perf_counter() - started) * 1e3, 1)})
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Monthly climatology cube of the profile catalog.
+
+Every profile is interpolated onto the standard levels ``CLIM_PRESSURES``
+(interpolate.py) and binned by month and ``CLIM_CELL_DEG`` lat/lon cell.
+The result is a (variable x month x pressure x lat x lon) cube of mean,
+standard deviation and count, written as ``.npy`` files and opened
+memory-mapped, so a lookup is a handful of array reads.
+
+Cells without observations are filled at build time. Each empty cell
+first takes the average of its filled neighbours, repeated for
+``FILL_PASSES`` passes. Anything still empty after that takes the mean of
+its latitude row, then of the whole month and level. ``support`` records
+how each cell was filled:
+
+* 0 - observed
+* k - filled on neighbour pass k (about k cells from data)
+* 255 - row or global fill
+
+Callers can then refuse values that are too far from any observation.
+
+``Climatology.lookup`` is a vectorized trilinear interpolation in lat,
+lon (wrapping) and pressure at cell centres, for any month.
+
+    python api/climatology.py build --db dummy.db
+    python api/climatology.py lookup 15 65 --month 7
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from builds import BackgroundBuild
+from interpolate import interpolate_store
+from semantic import INDEX_DIR
+from store import DB_PATH, get_store, load_store
+
+CLIM_PRESSURES = np.array(
+    [float(p) for p in os.getenv("FLOATCHAT_CLIM_PRESSURES",
+                                 "5,10,20,30,50,75,100,125,150,200,300,500,750,1000,1500,2000").split(",")],
+    dtype=np.float64,
+)
+CLIM_CELL_DEG = float(os.getenv("FLOATCHAT_CLIM_CELL_DEG", "2"))
+VARIABLES = ("temperature", "salinity")
+FILL_PASSES = 4
+UNSUPPORTED = 255
+BUILD_BLOCK = 250_000  # profiles interpolated at a time
+AUTO_BUILD_MAX = int(os.getenv("FLOATCHAT_CLIM_AUTO_BUILD_MAX", "20000"))
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+
+def _neighbour_sum(a):
+    """Sum over each cell's 8 neighbours; longitude wraps, latitude does not."""
+    rows = a.copy()
+    rows[..., 1:] += a[..., :-1]
+    rows[..., :-1] += a[..., 1:]
+    rows[..., 0] += a[..., -1]
+    rows[..., -1] += a[..., 0]
+    total = rows - a
+    total[..., 1:, :] += rows[..., :-1, :]
+    total[..., :-1, :] += rows[..., 1:, :]
+    return total
+
+
+def _neighbour_fill(mean, std, valid, support):
+    """Fill empty cells from their 8 neighbours (longitude wraps), FILL_PASSES times, in place."""
+    for step in range(1, FILL_PASSES + 1):
+        if valid.all():
+            break
+        total = _neighbour_sum(np.where(valid, mean, 0.0))
+        spread = _neighbour_sum(np.where(valid, std, 0.0))
+        count = _neighbour_sum(valid.astype(np.int16))
+        grow = ~valid & (count > 0)
+        mean[grow] = total[grow] / count[grow]
+        std[grow] = spread[grow] / count[grow]
+        support[grow] = step
+        valid |= grow
+
+
+def _broad_fill(mean, std, valid, support):
+    """Remaining empty cells take their latitude-row mean, then the month/level mean."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for axes in ((-1,), (-2, -1)):
+            if valid.all():
+                break
+            n = valid.sum(axis=axes, keepdims=True)
+            row_mean = np.where(valid, mean, 0.0).sum(axis=axes, keepdims=True) / n
+            row_std = np.where(valid, std, 0.0).sum(axis=axes, keepdims=True) / n
+            fill = ~valid & (n > 0)
+            mean[fill] = np.broadcast_to(row_mean, mean.shape)[fill]
+            std[fill] = np.broadcast_to(row_std, std.shape)[fill]
+            support[fill] = UNSUPPORTED
+            valid |= fill
+    mean[~valid] = np.nan
+    std[~valid] = np.nan
+    support[~valid] = UNSUPPORTED
+
+
+def _path(cell_deg=CLIM_CELL_DEG):
+    return os.path.join(INDEX_DIR, f"climatology-{cell_deg:g}deg")
+
+
+def build_cube(store, directory=None, pressures=CLIM_PRESSURES, cell_deg=CLIM_CELL_DEG):
+    """Aggregate ``store`` into a monthly cube and write it to ``directory``."""
+    directory = directory or _path(cell_deg)
+    n_lat, n_lon, n_p = int(round(180 / cell_deg)), int(round(360 / cell_deg)), len(pressures)
+    shape = (len(VARIABLES), 12, n_p, n_lat, n_lon)
+    size = int(np.prod(shape[1:]))
+    sums = np.zeros((len(VARIABLES), size))
+    squares = np.zeros((len(VARIABLES), size))
+    counts = np.zeros((len(VARIABLES), size), dtype=np.int64)
+
+    for start in range(0, len(store), BUILD_BLOCK):
+        block = store.subset(np.arange(start, min(start + BUILD_BLOCK, len(store))))
+        grids = interpolate_store(block, pressures, VARIABLES)
+        row = np.clip(((block.lat + 90) // cell_deg).astype(np.int64), 0, n_lat - 1)
+        col = ((block.lon + 180) // cell_deg).astype(np.int64) % n_lon
+        month = block.times.astype("datetime64[M]").astype(np.int64) % 12
+        cell = ((month[:, None] * n_p + np.arange(n_p)[None, :]) * n_lat + row[:, None]) * n_lon + col[:, None]
+        for v, variable in enumerate(VARIABLES):
+            values = grids[variable]
+            ok = np.isfinite(values)
+            sums[v] += np.bincount(cell[ok], weights=values[ok], minlength=size)
+            squares[v] += np.bincount(cell[ok], weights=values[ok] ** 2, minlength=size)
+            counts[v] += np.bincount(cell[ok], minlength=size)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # float32 is what is stored, and halves the traffic of the fill passes
+        mean = (sums / counts).reshape(shape).astype(np.float32)
+        std = np.sqrt(np.maximum(squares / counts - (sums / counts) ** 2, 0.0)).reshape(shape).astype(np.float32)
+    counts = counts.reshape(shape)
+    valid = counts > 0
+    support = np.where(valid, 0, UNSUPPORTED).astype(np.uint8)
+    _neighbour_fill(mean, std, valid, support)
+    _broad_fill(mean, std, valid, support)
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    np.save(os.path.join(directory, "mean.npy"), mean.astype(np.float32))
+    np.save(os.path.join(directory, "std.npy"), std.astype(np.float32))
+    np.save(os.path.join(directory, "count.npy"), np.minimum(counts, np.iinfo(np.uint32).max).astype(np.uint32))
+    np.save(os.path.join(directory, "support.npy"), support)
+    meta = {"variables": list(VARIABLES), "pressures": pressures.tolist(), "cell_deg": cell_deg,
+            "store_version": store.version, "profiles": len(store),
+            "observed_cells": int((support == 0).sum())}
+    # meta.json last: its presence marks a complete cube
+    with open(meta_path, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    return Climatology.open(directory)
+
+
+class Climatology:
+    def __init__(self, directory, meta, mean, std, count, support):
+        self.directory = directory
+        self.meta = meta
+        self.variables = meta["variables"]
+        self.pressures = np.asarray(meta["pressures"], dtype=np.float64)
+        self.cell_deg = float(meta["cell_deg"])
+        self.mean, self.std, self.count, self.support = mean, std, count, support
+        self.n_lat, self.n_lon = mean.shape[-2:]
+
+    @classmethod
+    def open(cls, directory):
+        """Open a cube written by ``build_cube``; arrays stay memory-mapped."""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        return cls(directory, meta, load("mean.npy"), load("std.npy"), load("count.npy"), load("support.npy"))
+
+    def _axis(self, position, size, wrap=False):
+        """Lower index, upper index and weight of the upper one, between cell centres."""
+        f = position - 0.5
+        lower = np.floor(f).astype(np.int64)
+        weight = f - lower
+        upper = lower + 1
+        if wrap:
+            return lower % size, upper % size, weight
+        weight = np.where(lower < 0, 1.0, np.where(upper > size - 1, 0.0, weight))
+        return np.clip(lower, 0, size - 1), np.clip(upper, 0, size - 1), weight
+
+    def _pressure_axis(self, pressure):
+        p = np.clip(pressure, self.pressures[0], self.pressures[-1])
+        upper = np.clip(np.searchsorted(self.pressures, p, side="left"), 1, max(len(self.pressures) - 1, 1))
+        lower = upper - 1
+        if len(self.pressures) == 1:
+            return np.zeros_like(upper), np.zeros_like(upper), np.zeros(np.shape(p))
+        weight = (p - self.pressures[lower]) / (self.pressures[upper] - self.pressures[lower])
+        return lower, upper, weight
+
+    def lookup(self, variable, lat, lon, pressure, month, stat="mean"):
+        """Trilinear (lat, lon, pressure) value for calendar ``month`` (1-12); arrays broadcast.
+
+        Returns (values, support): support is the worst fill level among the
+        contributing cells (0 = all observed). Corners without a value are
+        left out and the remaining weights renormalized.
+        """
+        lat, lon, pressure, month = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                          for a in (lat, lon, pressure, month)))
+        cube = (self.mean if stat == "mean" else self.std)[self.variables.index(variable)]
+        support = self.support[self.variables.index(variable)]
+        m = (month.astype(np.int64) - 1) % 12
+        i0, i1, wi = self._axis((lat + 90) / self.cell_deg, self.n_lat)
+        j0, j1, wj = self._axis((lon + 180) / self.cell_deg, self.n_lon, wrap=True)
+        k0, k1, wk = self._pressure_axis(pressure)
+        total = np.zeros(lat.shape)
+        weights = np.zeros(lat.shape)
+        worst = np.zeros(lat.shape, dtype=np.int64)
+        for k, w_k in ((k0, 1 - wk), (k1, wk)):
+            for i, w_i in ((i0, 1 - wi), (i1, wi)):
+                for j, w_j in ((j0, 1 - wj), (j1, wj)):
+                    w = w_k * w_i * w_j
+                    value = cube[m, k, i, j]
+                    use = np.isfinite(value) & (w > 0)
+                    total += np.where(use, value, 0.0) * w
+                    weights += np.where(use, w, 0.0)
+                    worst = np.where(use, np.maximum(worst, support[m, k, i, j]), worst)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(weights > 0, total / weights, np.nan)
+        return values, np.where(weights > 0, worst, UNSUPPORTED)
+
+    def cell_count(self, variable, lat, lon, pressure, month):
+        """Profiles behind the cell containing a point (no interpolation)."""
+        i = int(np.clip((lat + 90) // self.cell_deg, 0, self.n_lat - 1))
+        j = int((lon + 180) // self.cell_deg) % self.n_lon
+        k = int(np.argmin(np.abs(self.pressures - pressure)))
+        return int(self.count[self.variables.index(variable), (int(month) - 1) % 12, k, i, j])
+
+    def departures(self, store, variable="temperature"):
+        """(level value minus climatology, usable mask) for every level of a store or subset.
+
+        Levels are usable where both values exist, the cube is observed within
+        FILL_PASSES cells, and the depth lies inside the cube's pressure range.
+        """
+        owner = np.repeat(np.arange(len(store)), store.n_levels)
+        month = store.times.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        depth = store.levels["depth"]
+        baseline, support = self.lookup(variable, store.lat[owner], store.lon[owner],
+                                        depth, month[owner])
+        departure = store.levels[variable] - baseline
+        ok = np.isfinite(departure) & (support <= FILL_PASSES) & (depth >= self.pressures[0]) & (
+            depth <= self.pressures[-1])
+        return departure, ok
+
+    def anomalies(self, store, variable="temperature"):
+        """Mean departure from climatology of each profile's levels (NaN where unsupported)."""
+        owner = np.repeat(np.arange(len(store)), store.n_levels)
+        departure, ok = self.departures(store, variable)
+        total = np.bincount(owner[ok], weights=departure[ok], minlength=len(store))
+        n = np.bincount(owner[ok], minlength=len(store))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, total / n, np.nan)
+
+
+_cube = None
+_cube_lock = threading.Lock()
+_builds = BackgroundBuild("climatology")
+
+
+def _publish(store):
+    global _cube
+    cube = build_cube(store)
+    with _cube_lock:
+        _cube = cube
+
+
+def get_climatology(store=None, wait=False):
+    """Climatology for the current catalog, or None if no cube is available yet.
+
+    A missing or stale cube is rebuilt in-process only for catalogs up to
+    FLOATCHAT_CLIM_AUTO_BUILD_MAX profiles, on a background thread unless
+    ``wait``; larger ones need ``build``.
+    """
+    global _cube
+    store = store if store is not None else get_store()
+    if store is None:
+        return None
+    cube = _cube
+    if cube is not None and cube.meta.get("store_version") == store.version:
+        return cube
+    with _cube_lock:
+        if _cube is not None and _cube.meta.get("store_version") == store.version:
+            return _cube
+        path = _path()
+        if os.path.exists(os.path.join(path, "meta.json")):
+            cube = Climatology.open(path)
+            if cube.meta.get("store_version") == store.version:
+                _cube = cube
+                return _cube
+    if not len(store) or len(store) > AUTO_BUILD_MAX:
+        return None
+    _builds.submit(_publish, store, wait)
+    cube = _cube
+    return cube if wait and cube is not None and cube.meta.get("store_version") == store.version else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the monthly climatology cube")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="aggregate the catalog into the cube")
+    build.add_argument("--db", default=DB_PATH)
+    lookup = sub.add_parser("lookup", help="climatological column at a point")
+    lookup.add_argument("lat", type=float)
+    lookup.add_argument("lon", type=float)
+    lookup.add_argument("--month", type=int, default=1)
+    lookup.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_store(args.db)
+    print(f"🗂️ {len(store):,} profiles loaded in {time.perf_counter() - started:.1f}s")
+    if args.command == "build":
+        started = time.perf_counter()
+        cube = build_cube(store)
+        print(f"✅ Climatology cube {cube.mean.shape} ({cube.meta['observed_cells']:,} observed cells) "
+              f"in {time.perf_counter() - started:.1f}s")
+        print(f"📁 {cube.directory}")
+    else:
+        cube = get_climatology(store, wait=True)
+        if cube is None:
+            raise SystemExit("❌ No climatology for this catalog; run the build command first")
+        for variable in cube.variables:
+            mean, support = cube.lookup(variable, args.lat, args.lon, cube.pressures, args.month)
+            std, _ = cube.lookup(variable, args.lat, args.lon, cube.pressures, args.month, stat="std")
+            print(f"{variable} ({MONTH_NAMES[args.month - 1]}):")
+            for p, mu, sd, s in zip(cube.pressures, mean, std, support):
+                print(f"  {p:6.0f} dbar  {mu:8.3f} ± {sd:6.3f}  support={s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Single-flight coalescing of identical in-flight computations.
+
+The first caller for a key runs the computation; callers arriving with
+the same key while it is running wait for it and share its result (or
+its exception). Nothing is cached once the computation finishes.
+"""
+
+import threading
+
+from metrics import Counter, Gauge
+
+COALESCED = Counter("floatchat_coalesced_requests_total",
+                    "Requests that waited on an identical in-flight computation.", ("group",))
+FLIGHTS = Gauge("floatchat_inflight_computations", "Distinct computations currently running.", ("group",))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, group):
+        self.group = group
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn()`` once per concurrent ``key``; returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED.inc(group=self.group)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        FLIGHTS.inc(group=self.group)
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            FLIGHTS.dec(group=self.group)
+            call.done.set()
+
+
+def normalize_query(query):
+    """Lower-case, whitespace-collapsed form used as the coalescing key."""
+    return " ".join(query.lower().split())
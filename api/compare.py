@@ -0,0 +1,104 @@
+"""
+Side-by-side comparison of locations or time windows.
+
+Each subject (a location, optionally restricted to a period) is evaluated
+on a shared worker pool, so a comparison of N subjects takes roughly as
+long as the slowest one rather than the sum. Workers run in a copy of
+the caller's context, so trace spans and log fields still attach to the
+request.
+
+Every subject ends up on the same pressure grid ``COMPARE_PRESSURES``:
+
+* the mean and spread of the observed profiles within ``radius_km`` of it
+  (and inside its period), when there are any
+* else its modelled profile
+
+Differences are taken against the first subject.
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from interpolate import interpolate_profiles, interpolate_store, levels_to_csr
+from spatial import haversine_km
+
+COMPARE_PRESSURES = np.array(
+    [float(p) for p in os.getenv("FLOATCHAT_COMPARE_PRESSURES", "5,10,20,30,50,75,100,125,150").split(",")],
+    dtype=np.float64,
+)
+COMPARE_VARIABLES = ("temperature", "salinity")
+COMPARE_WORKERS = int(os.getenv("FLOATCHAT_COMPARE_WORKERS", "4"))
+DEFAULT_RADIUS_KM = float(os.getenv("FLOATCHAT_COMPARE_RADIUS_KM", "300"))
+MAX_SUBJECTS = 6
+MAX_COMPOSITE = 5000  # most recent observed profiles averaged per subject
+
+_pool = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix="compare")
+
+
+def evaluate(fn, subjects):
+    """``fn(subject)`` for every subject on the worker pool, results in order."""
+    futures = [_pool.submit(contextvars.copy_context().run, fn, subject) for subject in subjects]
+    return [future.result() for future in futures]
+
+
+def composite(store, lat, lon, radius_km=DEFAULT_RADIUS_KM, period=None, pressures=COMPARE_PRESSURES):
+    """Mean, standard deviation and count per grid pressure of the observed profiles near a point.
+
+    ``period`` is a (first_day, last_day) datetime64[D] pair. Returns None
+    when no profile qualifies.
+    """
+    rows = store.grid.within(lat, lon, radius_km)
+    rows = rows[haversine_km(lat, lon, store.lat[rows], store.lon[rows]) <= radius_km]
+    if period is not None:
+        days = store.times[rows].astype("datetime64[D]")
+        rows = rows[(days >= period[0]) & (days <= period[1])]
+    if not len(rows):
+        return None
+    if len(rows) > MAX_COMPOSITE:
+        rows = rows[np.argsort(store.times[rows], kind="stable")[-MAX_COMPOSITE:]]
+    grids = interpolate_store(store.subset(rows), pressures, COMPARE_VARIABLES)
+    result = {"profiles": int(len(rows)), "mean": {}, "std": {}, "count": {}}
+    for variable, grid in grids.items():
+        count = np.isfinite(grid).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(grid, axis=0) / count
+            spread = np.sqrt(np.nansum((grid - mean) ** 2, axis=0) / count)
+        result["mean"][variable] = np.where(count > 0, mean, np.nan)
+        result["std"][variable] = np.where(count > 0, spread, np.nan)
+        result["count"][variable] = count
+    return result
+
+
+def align_levels(depth_levels, pressures=COMPARE_PRESSURES):
+    """{variable: values on ``pressures``} for one /query-style ``depth_levels`` profile."""
+    depth, columns, offsets = levels_to_csr([depth_levels], COMPARE_VARIABLES)
+    return {v: interpolate_profiles(depth, columns[v], offsets, pressures)[0] for v in COMPARE_VARIABLES}
+
+
+def differences(values, pressures=COMPARE_PRESSURES, reference=0):
+    """Per-level and summary differences of each subject's aligned values against ``reference``."""
+    result = []
+    for i, subject in enumerate(values):
+        if i == reference:
+            continue
+        entry = {"subject": i, "reference": reference}
+        for variable in COMPARE_VARIABLES:
+            diff = subject[variable] - values[reference][variable]
+            finite = np.isfinite(diff)
+            if not finite.any():
+                entry[variable] = None
+                continue
+            at = int(np.nanargmax(np.abs(diff)))
+            entry[variable] = {
+                "by_level": [round(float(d), 3) if ok else None for d, ok in zip(diff, finite)],
+                "mean": round(float(diff[finite].mean()), 3),
+                "rms": round(float(np.sqrt((diff[finite] ** 2).mean())), 3),
+                "max_abs": round(float(diff[at]), 3),
+                "max_abs_pressure": float(pressures[at]),
+                "levels": int(finite.sum()),
+            }
+        result.append(entry)
+    return result
@@ -0,0 +1,226 @@
+"""
+Derived oceanographic quantities for batches of profiles.
+
+Inputs are CSR level arrays like ProfileStore's (``offsets[i]`` to
+``offsets[i + 1]`` are profile ``i``'s levels, shallowest first), so a
+whole page or catalog is processed with a handful of NumPy passes and no
+per-profile Python loop.
+
+Per level:
+
+* ``theta``  - potential temperature referenced to 0 dbar (Bryden 1973)
+* ``sigma0`` - potential density anomaly, kg/m^3 minus 1000
+* ``n2``     - buoyancy frequency squared, g / rho * d(rho_theta)/dz, s^-2
+* ``dtdz`` / ``dsdz`` - vertical temperature and salinity gradients
+
+Per profile:
+
+* ``mld`` - mixed-layer depth: the first depth below 10 dbar where sigma0
+  exceeds its 10 dbar value by 0.03 kg/m^3 (de Boyer Montegut et al. 2004),
+  or the deepest level when the criterion is never met
+* ``thermocline_depth`` / ``thermocline_gradient`` - depth and value of the
+  strongest temperature decrease
+* ``halocline_depth`` / ``halocline_gradient`` - same for |dS/dz|
+* ``n2_max`` - peak stratification
+* ``heat_content`` - rho * cp * theta integrated over the sampled column, J/m^2
+
+The equation of state is TEOS-10 (``gsw``) when that optional package is
+installed, else the EOS-80 one-atmosphere polynomial (UNESCO 1981) on
+potential temperature; the two agree on sigma0 to a few hundredths of
+kg/m^3 in the open ocean. Pressure in dbar is taken as depth in metres.
+"""
+
+import numpy as np
+
+from interpolate import interpolate_profiles
+
+try:
+    import gsw
+except ImportError:  # optional
+    gsw = None
+
+MLD_REFERENCE_DBAR = 10.0
+MLD_THRESHOLD = 0.03  # kg/m^3
+CP0 = 3991.86795711963  # J/(kg K), TEOS-10 heat capacity for potential enthalpy
+SCALARS = ("mld", "thermocline_depth", "thermocline_gradient", "halocline_depth",
+           "halocline_gradient", "n2_max", "heat_content")
+
+
+def gravity(lat):
+    """Gravitational acceleration at the sea surface (WGS84 normal gravity), m/s^2."""
+    s = np.sin(np.radians(lat)) ** 2
+    return 9.780327 * (1.0 + 5.3024e-3 * s - 5.8e-6 * np.sin(np.radians(2 * np.asarray(lat))) ** 2)
+
+
+def potential_temperature(salinity, temperature, pressure):
+    """Potential temperature (0 dbar reference) from practical salinity, in-situ T and dbar."""
+    s, t, p = salinity - 35.0, temperature, pressure / 10.0  # the fit is in bars
+    return (t - p * (3.6504e-4 + 8.3198e-5 * t - 5.4065e-7 * t ** 2 + 4.0274e-9 * t ** 3)
+            - p * s * (1.7439e-5 - 2.9778e-7 * t)
+            - p ** 2 * (8.9309e-7 - 3.1628e-8 * t + 2.1987e-10 * t ** 2)
+            + 4.1057e-9 * s * p ** 2
+            - p ** 3 * (-1.6056e-10 + 5.0484e-12 * t))
+
+
+def sigma0_eos80(salinity, theta):
+    """Potential density anomaly from the EOS-80 one-atmosphere polynomial, kg/m^3 - 1000."""
+    t, s = theta, np.maximum(salinity, 0.0)
+    rho_w = (999.842594 + 6.793952e-2 * t - 9.095290e-3 * t ** 2 + 1.001685e-4 * t ** 3
+             - 1.120083e-6 * t ** 4 + 6.536332e-9 * t ** 5)
+    a = 8.24493e-1 - 4.0899e-3 * t + 7.6438e-5 * t ** 2 - 8.2467e-7 * t ** 3 + 5.3875e-9 * t ** 4
+    b = -5.72466e-3 + 1.0227e-4 * t - 1.6546e-6 * t ** 2
+    return rho_w + a * s + b * s ** 1.5 + 4.8314e-4 * s ** 2 - 1000.0
+
+
+def _owners(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def segment_gradient(values, depth, offsets):
+    """d(values)/dz per level: central differences inside each profile, one-sided at its ends."""
+    n = len(depth)
+    owner = _owners(offsets)
+    index = np.arange(n)
+    above = np.where((index > 0) & (owner == np.roll(owner, 1)), index - 1, index)
+    below = np.where((index < n - 1) & (owner == np.roll(owner, -1)), index + 1, index)
+    dz = depth[below] - depth[above]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(dz > 0, (values[below] - values[above]) / np.where(dz > 0, dz, 1.0), np.nan)
+
+
+def _segment_first(mask, offsets):
+    """Index of the first True level of each profile, -1 where none."""
+    result = np.full(len(offsets) - 1, -1, dtype=np.int64)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    if len(filled):
+        pos = np.where(mask, np.arange(len(mask)), len(mask))
+        first = np.minimum.reduceat(pos, offsets[filled])
+        result[filled] = np.where(first < offsets[filled + 1], first, -1)
+    return result
+
+
+def _segment_argmax(values, offsets):
+    """Index of each profile's largest finite value, -1 where there is none."""
+    values = np.where(np.isfinite(values), values, -np.inf)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    peak = np.full(len(offsets) - 1, -np.inf)
+    if len(filled):
+        peak[filled] = np.maximum.reduceat(values, offsets[filled])
+    first = _segment_first(values == peak[_owners(offsets)], offsets)
+    return np.where(np.isfinite(peak), first, -1)
+
+
+def _take(values, index):
+    return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+
+
+def derive(depth, temperature, salinity, offsets, lat=None, lon=None):
+    """Per-level and per-profile derived quantities for CSR profiles (see module docstring)."""
+    depth = np.asarray(depth, dtype=np.float64)
+    temperature = np.asarray(temperature, dtype=np.float64)
+    salinity = np.asarray(salinity, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    owner = _owners(offsets)
+    lat = np.zeros(n) if lat is None else np.broadcast_to(np.asarray(lat, dtype=np.float64), (n,))
+    lon = np.zeros(n) if lon is None else np.broadcast_to(np.asarray(lon, dtype=np.float64), (n,))
+
+    if gsw is not None:
+        absolute = gsw.SA_from_SP(salinity, depth, lon[owner], lat[owner])
+        conservative = gsw.CT_from_t(absolute, temperature, depth)
+        theta = gsw.pt_from_CT(absolute, conservative)
+        sigma0 = gsw.sigma0(absolute, conservative)
+    else:
+        theta = potential_temperature(salinity, temperature, depth)
+        sigma0 = sigma0_eos80(salinity, theta)
+    rho = 1000.0 + sigma0
+
+    n2 = gravity(lat)[owner] / rho * segment_gradient(sigma0, depth, offsets)
+    dtdz = segment_gradient(temperature, depth, offsets)
+    dsdz = segment_gradient(salinity, depth, offsets)
+    counts = np.diff(offsets)
+    layered = counts >= 2
+
+    # Mixed layer: density threshold relative to the 10 dbar value
+    reference = interpolate_profiles(depth, sigma0, offsets, [MLD_REFERENCE_DBAR], extrapolate="clamp")[:, 0]
+    crossed = (depth > MLD_REFERENCE_DBAR) & (sigma0 > reference[owner] + MLD_THRESHOLD)
+    first = _segment_first(crossed, offsets)
+    upper = np.maximum(first - 1, 0)
+    lower = np.maximum(first, 0)
+    ds = sigma0[lower] - sigma0[upper]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.clip((reference + MLD_THRESHOLD - sigma0[upper]) / np.where(ds > 0, ds, 1.0), 0.0, 1.0)
+    crossing = depth[upper] + np.where(ds > 0, fraction, 1.0) * (depth[lower] - depth[upper])
+    deepest = _take(depth, np.where(counts > 0, offsets[1:] - 1, -1))
+    mld = np.where(first >= 0, crossing, deepest)
+
+    thermocline = _segment_argmax(-dtdz, offsets)
+    halocline = _segment_argmax(np.abs(dsdz), offsets)
+    peak_n2 = _segment_argmax(n2, offsets)
+
+    # Trapezoidal column integral of rho * cp * theta
+    energy = rho * CP0 * theta
+    same = owner[:-1] == owner[1:]
+    slabs = 0.5 * (energy[:-1] + energy[1:]) * np.diff(depth)
+    heat = np.bincount(owner[:-1][same], weights=slabs[same], minlength=n) if len(same) else np.zeros(n)
+
+    undefined = np.where(layered, 0.0, np.nan)
+    return {
+        "levels": {"theta": theta, "sigma0": sigma0, "n2": n2, "dtdz": dtdz, "dsdz": dsdz},
+        "mld": mld + undefined,
+        "thermocline_depth": _take(depth, thermocline) + undefined,
+        "thermocline_gradient": _take(-dtdz, thermocline) + undefined,
+        "halocline_depth": _take(depth, halocline) + undefined,
+        "halocline_gradient": _take(np.abs(dsdz), halocline) + undefined,
+        "n2_max": _take(n2, peak_n2) + undefined,
+        "heat_content": heat + undefined,
+    }
+
+
+def derive_store(store):
+    """``derive`` over every profile of a ProfileStore (or a ``subset`` of one)."""
+    levels = store.levels
+    return derive(levels["depth"], levels["temperature"], levels["salinity"], store.offsets,
+                  store.lat, store.lon)
+
+
+def _rounded(value, digits):
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def _significant(value, digits):
+    value = float(value)
+    return float(f"{value:.{digits}g}") if np.isfinite(value) else None
+
+
+def profile_metrics(result, i, offsets):
+    """JSON-ready ``derived`` block of profile ``i``: scalars plus per-level sigma0 and N^2."""
+    s = slice(int(offsets[i]), int(offsets[i + 1]))
+    levels = result["levels"]
+    return {
+        "mld": _rounded(result["mld"][i], 1),
+        "thermocline_depth": _rounded(result["thermocline_depth"][i], 1),
+        "thermocline_gradient": _rounded(result["thermocline_gradient"][i], 4),
+        "halocline_depth": _rounded(result["halocline_depth"][i], 1),
+        "halocline_gradient": _rounded(result["halocline_gradient"][i], 5),
+        "n2_max": _significant(result["n2_max"][i], 4),
+        "heat_content": _significant(result["heat_content"][i], 5),
+        "sigma0": [_rounded(v, 3) for v in levels["sigma0"][s]],
+        "n2": [_significant(v, 4) for v in levels["n2"][s]],
+    }
+
+
+def derive_levels(depth_levels, lat=None, lon=None):
+    """``derived`` block for one profile in the /query ``depth_levels`` layout."""
+    depth = np.array([float(level["pres"]) for level in depth_levels])
+    temp = np.array([float(level["temp"]) for level in depth_levels])
+    sal = np.array([float(level["salinity"]) for level in depth_levels])
+    order = np.argsort(depth, kind="stable")
+    result = derive(depth[order], temp[order], sal[order], [0, len(depth)], lat, lon)
+    metrics = profile_metrics(result, 0, [0, len(depth)])
+    # Per-level values back in the caller's level order
+    restore = np.argsort(order, kind="stable")
+    for key in ("sigma0", "n2"):
+        metrics[key] = [metrics[key][j] for j in restore]
+    return metrics
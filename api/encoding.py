@@ -0,0 +1,253 @@
+"""
+Content negotiation for profile responses.
+
+Representations of a list of profiles, chosen from the Accept header or a
+``?format=`` override:
+
+* ``application/json`` - the original layout, ``depth_levels`` as a list
+  of ``{"pres", "temp", "salinity"}`` rows (default).
+* ``application/vnd.floatchat.columnar+json`` - ``depth_levels`` as one
+  array per variable: ``{"pres": [...], "temp": [...], "salinity": [...]}``.
+* ``application/msgpack`` - the columnar layout as MessagePack. Level
+  arrays are packed as float32 and everything else, coordinates included,
+  as float64 (needs the optional ``msgpack`` package).
+* ``application/vnd.apache.arrow.stream`` - an Arrow IPC stream, one row
+  per profile with ``depth_levels`` a struct of float64 lists (needs the
+  optional ``pyarrow`` package).
+
+Every representation carries the same fields. Callers that do not need
+the per-profile detail can ask for slim rows (``slim_profile``): observed
+profiles then leave out
+
+* ``score_components``
+* ``climatology_anomaly``
+* the per-level ``derived`` arrays (``sigma0``, ``n2``)
+
+keeping scalar ``derived`` values such as ``mld``. The modelled profile
+at the head of the page is always kept whole. For 200 observed profiles
+slim rows take MessagePack from about 146 KB to 92 KB and row JSON from
+193 KB to 140 KB.
+
+Any of them is gzip-compressed when the client accepts it and the body is
+large enough to benefit. Large pages are produced incrementally with
+``stream_profiles`` / ``stream_compress`` instead of as one body.
+"""
+
+import gzip
+import io
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional
+    pa = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.floatchat.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+FORMAT_ALIASES = {"json": JSON, "rows": JSON, "columnar": COLUMNAR_JSON, "msgpack": MSGPACK, "arrow": ARROW}
+MEDIA_ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+MIN_COMPRESS_BYTES = 1024
+STREAM_BATCH = 256  # profiles per Arrow record batch / yielded chunk
+
+
+def available_media_types():
+    """Supported media types, in server preference order for wildcard Accepts."""
+    types = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        types.append(MSGPACK)
+    if pa is not None:
+        types.append(ARROW)
+    return types
+
+
+def _parse_q(params):
+    for param in params:
+        name, _, value = param.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def parse_accept(header):
+    """[(media_range, q)] from an Accept-style header, highest q first (stable)."""
+    ranges = []
+    for item in (header or "").split(","):
+        parts = item.split(";")
+        media = parts[0].strip().lower()
+        if media:
+            ranges.append((MEDIA_ALIASES.get(media, media), _parse_q(parts[1:])))
+    return sorted(ranges, key=lambda r: -r[1])
+
+
+def negotiate(accept, format_param=None):
+    """Media type to respond with, or None when nothing acceptable is available."""
+    available = available_media_types()
+    if format_param:
+        media = FORMAT_ALIASES.get(format_param.lower())
+        return media if media in available else None
+    ranges = parse_accept(accept)
+    if not ranges:
+        return JSON
+    for media, q in ranges:
+        if q <= 0:
+            continue
+        if media in available:
+            return media
+        if media in ("*/*", "application/*"):
+            return JSON
+    return None
+
+
+def choose_coding(accept_encoding):
+    """``"gzip"`` if the client accepts it, else None (identity)."""
+    for coding, q in parse_accept(accept_encoding):
+        if coding in ("gzip", "x-gzip", "*") and q > 0:
+            return "gzip"
+    return None
+
+
+def columnar_levels(levels):
+    """List of per-level dicts -> dict of per-variable arrays."""
+    if isinstance(levels, dict) or not levels:
+        return levels
+    return {key: [level.get(key) for level in levels] for key in levels[0]}
+
+
+def to_columnar(profiles):
+    return [{**profile, "depth_levels": columnar_levels(profile.get("depth_levels"))} for profile in profiles]
+
+
+# Per-profile blocks slim rows leave out of observed profiles
+DETAIL_KEYS = ("score_components", "climatology_anomaly")
+
+
+def slim_profile(profile):
+    """Observed profile without DETAIL_KEYS and per-level derived arrays; others unchanged."""
+    if profile.get("source") != "observed":
+        return profile
+    profile = {key: value for key, value in profile.items() if key not in DETAIL_KEYS}
+    if isinstance(profile.get("derived"), dict):
+        profile["derived"] = {k: v for k, v in profile["derived"].items() if not isinstance(v, list)}
+    return profile
+
+
+def _msgpack_profile(profile, packer, level_packer):
+    """One profile as a MessagePack map, ``depth_levels`` as float32 and the rest as float64."""
+    parts = [packer.pack_map_header(len(profile))]
+    for key, value in profile.items():
+        parts.append(packer.pack(key))
+        parts.append((level_packer if key == "depth_levels" else packer).pack(value))
+    return b"".join(parts)
+
+
+def _msgpack_packers():
+    return msgpack.Packer(use_bin_type=True), msgpack.Packer(use_bin_type=True, use_single_float=True)
+
+
+def _uniform_rows(profiles, keys=None):
+    """Rows with the same keys in the same order (Arrow infers columns from the first row)."""
+    if keys is None:
+        keys = list(dict.fromkeys(key for profile in profiles for key in profile))
+    return [{key: profile.get(key) for key in keys} for profile in profiles], keys
+
+
+def _arrow_stream(profiles):
+    rows, _ = _uniform_rows(to_columnar(profiles))
+    table = pa.Table.from_pylist(rows)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_profiles(profiles, media_type):
+    """Serialize profiles in one of the non-default representations."""
+    if media_type == COLUMNAR_JSON:
+        return json.dumps(to_columnar(profiles), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if media_type == MSGPACK:
+        packer, level_packer = _msgpack_packers()
+        return packer.pack_array_header(len(profiles)) + b"".join(
+            _msgpack_profile(p, packer, level_packer) for p in to_columnar(profiles))
+    if media_type == ARROW:
+        return _arrow_stream(profiles)
+    raise ValueError(f"unsupported media type {media_type!r}")
+
+
+def _batches(profiles, size):
+    batch = []
+    for profile in profiles:
+        batch.append(profile)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_profiles(profiles, count, media_type):
+    """Yield the encoding of ``count`` profiles from an iterator, a batch at a time."""
+    if media_type in (JSON, COLUMNAR_JSON):
+        convert = to_columnar if media_type == COLUMNAR_JSON else list
+        yield b"["
+        first = True
+        for batch in _batches(profiles, STREAM_BATCH):
+            parts = [json.dumps(p, ensure_ascii=False, separators=(",", ":")) for p in convert(batch)]
+            yield (b"" if first else b",") + ",".join(parts).encode("utf-8")
+            first = False
+        yield b"]"
+    elif media_type == MSGPACK:
+        packer, level_packer = _msgpack_packers()
+        yield packer.pack_array_header(count)
+        for batch in _batches(profiles, STREAM_BATCH):
+            yield b"".join(_msgpack_profile(p, packer, level_packer) for p in to_columnar(batch))
+    elif media_type == ARROW:
+        sink = io.BytesIO()
+        writer = keys = schema = None
+        for batch in _batches(profiles, STREAM_BATCH):
+            rows, keys = _uniform_rows(to_columnar(batch), keys)
+            record_batch = pa.RecordBatch.from_pylist(rows, schema=schema)
+            if writer is None:
+                schema = record_batch.schema
+                writer = pa.ipc.new_stream(sink, schema)
+            writer.write_batch(record_batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        if writer is not None:
+            writer.close()
+            yield sink.getvalue()
+    else:
+        raise ValueError(f"unsupported media type {media_type!r}")
+
+
+def stream_compress(chunks, coding):
+    """Apply a content coding to a stream of chunks (gzip with mtime=0, like ``compress``)."""
+    if coding != "gzip":
+        yield from chunks
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def compress(body, coding):
+    """Apply a content coding; gzip output is byte-stable (mtime=0) so ETags are too."""
+    if coding == "gzip" and len(body) >= MIN_COMPRESS_BYTES:
+        return gzip.compress(body, compresslevel=6, mtime=0), "gzip"
+    return body, None
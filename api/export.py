@@ -0,0 +1,354 @@
+"""
+Streaming export of ``profiles`` rows as CSV, Parquet or NetCDF.
+
+Rows are read from SQLite ``EXPORT_CHUNK_ROWS`` at a time and each chunk
+is encoded and handed to the response before the next is read, so memory
+stays flat however large the export:
+
+* ``csv``     - header, then each chunk's rows
+* ``parquet`` - one row group per chunk; the writer's output is drained
+  after every group
+* ``netcdf``  - NetCDF-3 (64-bit offset) with one unlimited ``obs``
+  dimension. The header must carry the record count, so a counting pass
+  runs first (a plain COUNT(*) when every filter is pushed down to SQL).
+  Records are then written as packed big-endian rows.
+
+Time, float and lat/lon box filters go into the SQL query. Depth and the
+exact great-circle radius are applied per chunk, because depth may be
+blob-encoded in SQLite (see store.numeric_column).
+"""
+
+import os
+import sqlite3
+import struct
+
+import numpy as np
+import pandas as pd
+
+from spatial import haversine_km
+from store import read_rows, table_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: Parquet export unavailable
+    pa = pq = None
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "netcdf": ("application/x-netcdf", "nc"),
+}
+EXPORT_COLUMNS = ["id", "time", "latitude", "longitude", "depth", "temperature", "salinity", "oxygen",
+                  "air_temp", "float_id", "cycle"]
+INTEGER_COLUMNS = ("id", "float_id", "cycle")
+EXPORT_CHUNK_ROWS = int(os.getenv("FLOATCHAT_EXPORT_CHUNK_ROWS", "100000"))
+MAX_FLOAT_IDS = 1000
+KM_PER_DEGREE = 111.2
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != "parquet" or pq is not None]
+
+
+def _number(arg, name):
+    value = arg(name)
+    return None if value in (None, "") else float(value)
+
+
+def _timestamp(value, end=False):
+    """SQL bound for a date or datetime; a date-only end covers that whole day."""
+    stamp = pd.Timestamp(value)
+    if end and len(str(value).strip()) == 10:
+        return (stamp + pd.Timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"), "<"
+    return stamp.strftime("%Y-%m-%d %H:%M:%S"), "<=" if end else ">="
+
+
+def parse_filters(arg):
+    """Filters from request parameters (``arg(name)`` returns a value or None); ValueError if invalid."""
+    filters = {
+        "start": arg("start") or None,
+        "end": arg("end") or None,
+        "depth_min": _number(arg, "depth_min"),
+        "depth_max": _number(arg, "depth_max"),
+        "bbox": None,
+        "near": None,
+        "float_ids": None,
+        "columns": None,
+    }
+    for bound in ("start", "end"):
+        if filters[bound]:
+            _timestamp(filters[bound])
+    box = [_number(arg, name) for name in ("lat_min", "lat_max", "lon_min", "lon_max")]
+    if any(v is not None for v in box):
+        if any(v is None for v in box):
+            raise ValueError("a box needs lat_min, lat_max, lon_min and lon_max")
+        filters["bbox"] = box
+    near = [_number(arg, name) for name in ("lat", "lon", "radius_km")]
+    if any(v is not None for v in near):
+        if any(v is None for v in near) or near[2] <= 0:
+            raise ValueError("a radius filter needs lat, lon and a positive radius_km")
+        filters["near"] = near
+    float_ids = arg("float_ids")
+    if float_ids not in (None, "", []):
+        items = float_ids.split(",") if isinstance(float_ids, str) else float_ids
+        filters["float_ids"] = [int(v) for v in items]
+        if len(filters["float_ids"]) > MAX_FLOAT_IDS:
+            raise ValueError(f"at most {MAX_FLOAT_IDS} float_ids")
+    columns = arg("columns")
+    if columns not in (None, "", []):
+        filters["columns"] = [c.strip() for c in (columns.split(",") if isinstance(columns, str) else columns)]
+    return filters
+
+
+def plan_export(conn, filters):
+    """Columns, SQL filter and per-chunk filters of an export; ValueError for unknown columns."""
+    available = table_columns(conn)
+    exportable = [c for c in EXPORT_COLUMNS if c in available]
+    columns = filters["columns"] or exportable
+    unknown = [c for c in columns if c not in exportable]
+    if unknown:
+        raise ValueError(f"unknown columns {unknown}; available: {exportable}")
+
+    where, params = [], []
+    for bound, end in (("start", False), ("end", True)):
+        if filters[bound]:
+            value, op = _timestamp(filters[bound], end)
+            where.append(f"time {op} ?")
+            params.append(value)
+    if filters["float_ids"] is not None:
+        if "float_id" not in available:
+            raise ValueError("this catalog has no float_id column")
+        where.append(f"float_id IN ({', '.join('?' * len(filters['float_ids']))})")
+        params.extend(filters["float_ids"])
+    if filters["bbox"]:
+        lat_min, lat_max, lon_min, lon_max = filters["bbox"]
+        where.append("latitude BETWEEN ? AND ?")
+        params.extend([lat_min, lat_max])
+        # A box with lon_min > lon_max crosses the antimeridian
+        where.append("(longitude >= ? AND longitude <= ?)" if lon_min <= lon_max
+                     else "(longitude >= ? OR longitude <= ?)")
+        params.extend([lon_min, lon_max])
+    if filters["near"]:
+        lat, lon, radius_km = filters["near"]
+        dlat = radius_km / KM_PER_DEGREE
+        where.append("latitude BETWEEN ? AND ?")
+        params.extend([lat - dlat, lat + dlat])
+        cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 90.0)))
+        if cos_lat > 0 and radius_km / (KM_PER_DEGREE * cos_lat) < 180:
+            dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+            low, high = lon - dlon, lon + dlon
+            if low < -180 or high > 180:
+                where.append("(longitude >= ? OR longitude <= ?)")
+                params.extend([(low + 540) % 360 - 180, (high + 540) % 360 - 180])
+            else:
+                where.append("longitude BETWEEN ? AND ?")
+                params.extend([low, high])
+
+    chunk_filtered = filters["depth_min"] is not None or filters["depth_max"] is not None or bool(filters["near"])
+    needed = [c for c in ("depth", "latitude", "longitude") if chunk_filtered and c not in columns]
+    return {"columns": columns, "read": columns + needed, "where": " AND ".join(where), "params": params,
+            "chunk_filtered": chunk_filtered, "filters": filters}
+
+
+def _chunk_mask(chunk, filters):
+    keep = np.ones(len(chunk), dtype=bool)
+    if filters["depth_min"] is not None:
+        keep &= (chunk["depth"] >= filters["depth_min"]).to_numpy()
+    if filters["depth_max"] is not None:
+        keep &= (chunk["depth"] <= filters["depth_max"]).to_numpy()
+    if filters["near"]:
+        lat, lon, radius_km = filters["near"]
+        keep &= haversine_km(lat, lon, chunk["latitude"].to_numpy(), chunk["longitude"].to_numpy()) <= radius_km
+    return keep
+
+
+def iter_chunks(conn, plan, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Filtered DataFrames holding only the exported columns, integers as nullable Int64."""
+    for chunk in read_rows(conn, plan["read"], plan["where"], plan["params"], chunk_rows):
+        if plan["chunk_filtered"]:
+            chunk = chunk[_chunk_mask(chunk, plan["filters"])]
+        chunk = chunk[plan["columns"]]
+        for col in INTEGER_COLUMNS:
+            if col in chunk:
+                chunk[col] = chunk[col].round().astype("Int64")
+        yield chunk
+
+
+def count_rows(conn, plan):
+    """Rows an export will contain."""
+    if not plan["chunk_filtered"]:
+        sql = "SELECT COUNT(*) FROM profiles" + (f" WHERE {plan['where']}" if plan["where"] else "")
+        return int(conn.execute(sql, plan["params"]).fetchone()[0])
+    needed = ["depth", "latitude", "longitude"]
+    return sum(int(_chunk_mask(chunk, plan["filters"]).sum())
+               for chunk in read_rows(conn, needed, plan["where"], plan["params"], EXPORT_CHUNK_ROWS))
+
+
+def csv_stream(chunks, columns):
+    yield (",".join(columns) + "\n").encode("utf-8")
+    for chunk in chunks:
+        if len(chunk):
+            yield chunk.to_csv(index=False, header=False, date_format="%Y-%m-%d %H:%M:%S").encode("utf-8")
+
+
+class _Drain:
+    """Write-only file object whose buffered bytes are taken after each row group."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _arrow_type(column):
+    if column == "time":
+        return pa.timestamp("ms")
+    return pa.int64() if column in INTEGER_COLUMNS else pa.float64()
+
+
+def parquet_stream(chunks, columns):
+    schema = pa.schema([(c, _arrow_type(c)) for c in columns])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for chunk in chunks:
+            if len(chunk):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                data = sink.take()
+                if data:
+                    yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+# NetCDF-3 classic structure (64-bit offset variant)
+NC_CHAR, NC_INT, NC_FLOAT, NC_DOUBLE = 2, 4, 5, 6
+NC_DIMENSION, NC_VARIABLE, NC_ATTRIBUTE = 10, 11, 12
+NC_FILL = {NC_INT: -2147483647, NC_FLOAT: 9.9692099683868690e+36, NC_DOUBLE: 9.9692099683868690e+36}
+NC_DTYPES = {NC_INT: ">i4", NC_FLOAT: ">f4", NC_DOUBLE: ">f8"}
+NC_VARIABLES = {
+    "id": (NC_INT, {"long_name": "source row id"}),
+    "time": (NC_DOUBLE, {"standard_name": "time", "units": "seconds since 1970-01-01 00:00:00",
+                         "calendar": "standard"}),
+    "latitude": (NC_DOUBLE, {"standard_name": "latitude", "units": "degrees_north"}),
+    "longitude": (NC_DOUBLE, {"standard_name": "longitude", "units": "degrees_east"}),
+    "depth": (NC_FLOAT, {"standard_name": "depth", "units": "m", "positive": "down"}),
+    "temperature": (NC_FLOAT, {"standard_name": "sea_water_temperature", "units": "degree_Celsius"}),
+    "salinity": (NC_FLOAT, {"standard_name": "sea_water_practical_salinity", "units": "1"}),
+    "oxygen": (NC_FLOAT, {"long_name": "dissolved oxygen", "units": "umol/kg"}),
+    "air_temp": (NC_FLOAT, {"standard_name": "air_temperature", "units": "degree_Celsius"}),
+    "float_id": (NC_INT, {"long_name": "float identifier"}),
+    "cycle": (NC_INT, {"long_name": "float cycle number"}),
+}
+
+
+def _padded(data):
+    return data + b"\0" * (-len(data) % 4)
+
+
+def _nc_name(name):
+    encoded = name.encode("utf-8")
+    return struct.pack(">i", len(encoded)) + _padded(encoded)
+
+
+def _nc_attributes(attributes):
+    """Attribute list: strings as NC_CHAR, (nc_type, value) pairs as one typed value."""
+    if not attributes:
+        return struct.pack(">ii", 0, 0)
+    out = struct.pack(">ii", NC_ATTRIBUTE, len(attributes))
+    for name, value in attributes.items():
+        out += _nc_name(name)
+        if isinstance(value, str):
+            encoded = value.encode("utf-8")
+            out += struct.pack(">ii", NC_CHAR, len(encoded)) + _padded(encoded)
+        else:
+            nc_type, number = value
+            out += struct.pack(">ii", nc_type, 1) + _padded(np.array([number], dtype=NC_DTYPES[nc_type]).tobytes())
+    return out
+
+
+def netcdf_header(columns, numrecs, title="FloatChat profile export"):
+    """CDF-2 header for record variables ``columns`` over ``numrecs`` records, and the record dtype."""
+    def build(begins):
+        out = b"CDF\x02" + struct.pack(">I", numrecs)
+        out += struct.pack(">ii", NC_DIMENSION, 1) + _nc_name("obs") + struct.pack(">i", 0)
+        out += _nc_attributes({"title": title, "Conventions": "CF-1.8", "featureType": "point"})
+        out += struct.pack(">ii", NC_VARIABLE, len(columns))
+        for column, begin in zip(columns, begins):
+            nc_type, attributes = NC_VARIABLES[column]
+            out += _nc_name(column) + struct.pack(">ii", 1, 0)
+            out += _nc_attributes({**attributes, "_FillValue": (nc_type, NC_FILL[nc_type])})
+            out += struct.pack(">iiq", nc_type, np.dtype(NC_DTYPES[nc_type]).itemsize, begin)
+        return out
+
+    sizes = [np.dtype(NC_DTYPES[NC_VARIABLES[c][0]]).itemsize for c in columns]
+    start = len(build([0] * len(columns)))
+    begins = start + np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    record = np.dtype([(c, NC_DTYPES[NC_VARIABLES[c][0]]) for c in columns])
+    return build([int(b) for b in begins]), record
+
+
+def _records(chunk, record):
+    rows = np.empty(len(chunk), dtype=record)
+    for column in record.names:
+        nc_type = NC_VARIABLES[column][0]
+        series = chunk[column]
+        if column == "time":
+            values = (series - pd.Timestamp("1970-01-01")).dt.total_seconds().to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        rows[column] = np.where(np.isfinite(values), values, NC_FILL[nc_type])
+    return rows.tobytes()
+
+
+def netcdf_stream(chunks, columns, numrecs):
+    header, record = netcdf_header(columns, numrecs)
+    yield header
+    remaining = numrecs
+    for chunk in chunks:
+        # The header's count is binding: rows added since counting are dropped
+        chunk = chunk.iloc[:remaining]
+        remaining -= len(chunk)
+        if len(chunk):
+            yield _records(chunk, record)
+    if remaining > 0:
+        # ...and rows removed since counting become fill records
+        fill = pd.DataFrame({c: [np.nan] * remaining for c in columns})
+        fill["time"] = pd.NaT
+        yield _records(fill, record)
+
+
+def export_stream(path, fmt, plan):
+    """Encoded chunks of an export; the connection lives as long as the stream."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        chunks = iter_chunks(conn, plan)
+        if fmt == "csv":
+            yield from csv_stream(chunks, plan["columns"])
+        elif fmt == "parquet":
+            yield from parquet_stream(chunks, plan["columns"])
+        else:
+            yield from netcdf_stream(chunks, plan["columns"], count_rows(conn, plan))
+    finally:
+        conn.close()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Top-k extremes and climatology anomalies over the profile catalog.
+
+Profiles are sorted by 10° cell and time and cut into partitions of
+``PARTITION_SIZE``. Nearby, contemporaneous profiles therefore share a
+partition. At build time every profile gets three bounds per variable:
+
+* its column maximum
+* its column minimum
+* its largest absolute level departure from the monthly climatology
+  (climatology.py), for the variables the cube holds
+
+Each partition keeps the max/min of these bounds plus its time range.
+
+A query visits the candidate partitions (those the region touches and the
+time window overlaps) in order of their bound, best first. It keeps the
+best k exact values in a bounded heap, and stops as soon as the next
+partition's bound cannot beat the heap's k-th value. Only the visited
+partitions' levels are read. A band max is never above the column max,
+and a band-mean departure never exceeds the largest level departure, so
+the bounds stay valid for depth-band queries.
+
+Kinds:
+
+* ``max`` / ``min`` - highest / lowest level value (within ``band``)
+* ``anomaly``       - largest |mean departure from climatology| (within ``band``)
+
+    python api/extremes.py build --db dummy.db
+    python api/extremes.py top temperature --kind anomaly -k 5
+"""
+
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from builds import BackgroundBuild
+from climatology import get_climatology
+from semantic import INDEX_DIR
+from spatial import haversine_km
+from store import DB_PATH, get_store, load_store
+
+VARIABLES = ("temperature", "salinity", "oxygen")
+KINDS = ("max", "min", "anomaly")
+PARTITION_SIZE = int(os.getenv("FLOATCHAT_EXTREMES_PARTITION", "1024"))
+PARTITION_CELL_DEG = 10.0
+MAX_K = 100
+BUILD_BLOCK = 250_000  # profiles per climatology pass
+AUTO_BUILD_MAX = int(os.getenv("FLOATCHAT_EXTREMES_AUTO_BUILD_MAX", "100000"))
+
+
+def _path(size=PARTITION_SIZE):
+    return os.path.join(INDEX_DIR, f"extremes-{size}")
+
+
+def segment_reduce(values, offsets, reduce):
+    """``reduce`` (np.fmax or np.fmin) of each CSR segment; NaN for empty or all-NaN segments."""
+    out = np.full(len(offsets) - 1, np.nan)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    if len(filled):
+        out[filled] = reduce.reduceat(values, offsets[filled])
+    return out
+
+
+def _band_mask(depth, band):
+    if band is None:
+        return np.ones(len(depth), dtype=bool)
+    return (depth >= band[0]) & (depth <= band[1])
+
+
+def _partition_order(store):
+    """Catalog rows sorted by (10° cell, time)."""
+    n_lon = int(round(360 / PARTITION_CELL_DEG))
+    row = np.clip(((store.lat + 90) // PARTITION_CELL_DEG).astype(np.int64), 0, int(180 / PARTITION_CELL_DEG) - 1)
+    col = ((store.lon + 180) // PARTITION_CELL_DEG).astype(np.int64) % n_lon
+    return np.lexsort((np.arange(len(store)), store.times, row * n_lon + col))
+
+
+def build_index(store, directory=None, size=PARTITION_SIZE):
+    """Write per-profile bounds and per-partition summaries for ``store``."""
+    directory = directory or _path(size)
+    order = _partition_order(store)
+    starts = np.append(np.arange(0, len(store), size), len(store)).astype(np.int64)
+    climatology = get_climatology(store, wait=True)
+    anomaly_variables = [v for v in (climatology.variables if climatology else []) if v in VARIABLES]
+
+    profile_bounds = {}
+    for variable in VARIABLES:
+        values = np.asarray(store.levels[variable], dtype=np.float64)
+        profile_bounds[f"{variable}_max"] = segment_reduce(values, store.offsets, np.fmax)[order]
+        profile_bounds[f"{variable}_min"] = segment_reduce(values, store.offsets, np.fmin)[order]
+    for variable in anomaly_variables:
+        bound = np.full(len(store), np.nan)
+        for start in range(0, len(store), BUILD_BLOCK):
+            block = store.subset(np.arange(start, min(start + BUILD_BLOCK, len(store))))
+            departure, ok = climatology.departures(block, variable)
+            bound[start:start + len(block)] = segment_reduce(np.where(ok, np.abs(departure), np.nan),
+                                                             block.offsets, np.fmax)
+        # Rounded up so the float32 copy is still an upper bound
+        profile_bounds[f"{variable}_anomaly"] = np.nextafter(bound[order].astype(np.float32), np.float32(np.inf))
+
+    seconds = store.times.astype("datetime64[s]").astype(np.int64)[order]
+    partitions = {"starts": starts,
+                  "time_min": segment_reduce(seconds.astype(np.float64), starts, np.fmin),
+                  "time_max": segment_reduce(seconds.astype(np.float64), starts, np.fmax)}
+    for name, bound in profile_bounds.items():
+        reduce = np.fmin if name.endswith("_min") else np.fmax
+        partitions[name] = segment_reduce(bound, starts, reduce)
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    np.save(os.path.join(directory, "order.npy"), order.astype(np.int64))
+    for name, bound in profile_bounds.items():
+        np.save(os.path.join(directory, f"{name}.npy"), bound.astype(np.float32))
+    np.savez(os.path.join(directory, "partitions.npz"), **partitions)
+    meta = {"store_version": store.version, "profiles": len(store), "partition_size": size,
+            "partitions": len(starts) - 1, "anomaly_variables": anomaly_variables}
+    # meta.json last: its presence marks a complete index
+    with open(meta_path, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    return ExtremesIndex.open(directory)
+
+
+class ExtremesIndex:
+    """Partition summaries of one catalog snapshot."""
+
+    def __init__(self, directory, meta, order, bounds, partitions):
+        self.directory = directory
+        self.meta = meta
+        self.order = order
+        self.bounds = bounds
+        self.partitions = partitions
+        self.starts = partitions["starts"]
+        self.anomaly_variables = meta["anomaly_variables"]
+        # Partition of each catalog row
+        self.partition_of = np.empty(len(order), dtype=np.int64)
+        self.partition_of[order] = np.repeat(np.arange(len(self.starts) - 1), np.diff(self.starts))
+
+    @classmethod
+    def open(cls, directory):
+        """Open an index written by ``build_index``; per-profile bounds stay memory-mapped."""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        bounds = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".npy") and name != "order.npy":
+                bounds[name[:-4]] = np.load(os.path.join(directory, name), mmap_mode="r")
+        with np.load(os.path.join(directory, "partitions.npz")) as data:
+            partitions = {name: data[name] for name in data.files}
+        return cls(directory, meta, np.load(os.path.join(directory, "order.npy")), bounds, partitions)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def _keys(self, variable, kind):
+        """(per-partition bound, per-profile bound, sign) on the ranking key, larger is better."""
+        name = f"{variable}_{kind}"
+        sign = -1.0 if kind == "min" else 1.0
+        return sign * self.partitions[name], self.bounds[name], sign
+
+    def _exact(self, store, rows, variable, kind, band, climatology):
+        """(ranking key, signed value) of catalog ``rows``."""
+        block = store.subset(rows)
+        depth = block.levels["depth"]
+        if kind == "anomaly":
+            departure, ok = climatology.departures(block, variable)
+            ok &= _band_mask(depth, band)
+            owner = np.repeat(np.arange(len(block)), block.n_levels)
+            total = np.bincount(owner[ok], weights=departure[ok], minlength=len(block))
+            n = np.bincount(owner[ok], minlength=len(block))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = np.where(n > 0, total / n, np.nan)
+            return np.abs(value), value
+        values = np.where(_band_mask(depth, band), block.levels[variable], np.nan).astype(np.float64)
+        value = segment_reduce(values, block.offsets, np.fmax if kind == "max" else np.fmin)
+        return (value if kind == "max" else -value), value
+
+    def top(self, store, variable="temperature", kind="max", k=10, rows=None, period=None, band=None,
+            climatology=None):
+        """Best ``k`` profiles for ``kind`` among catalog ``rows`` (all when None) within ``period``.
+
+        ``period`` is a (first_day, last_day) datetime64[D] pair, ``band`` a
+        (top, bottom) dbar pair. Returns (rows, values, stats).
+        """
+        if variable not in VARIABLES or kind not in KINDS:
+            raise ValueError(f"variable must be one of {', '.join(VARIABLES)} and kind one of {', '.join(KINDS)}")
+        if kind == "anomaly" and (variable not in self.anomaly_variables or climatology is None):
+            raise ValueError(f"anomalies are available for {', '.join(self.anomaly_variables) or 'no variables'}")
+        part_bound, profile_bound, sign = self._keys(variable, kind)
+        candidate = np.isfinite(part_bound)
+        member = None
+        if rows is not None:
+            member = np.zeros(len(self.order), dtype=bool)
+            member[rows] = True
+            touched = np.zeros(len(self), dtype=bool)
+            touched[self.partition_of[rows]] = True
+            candidate &= touched
+        start_s = end_s = None
+        if period is not None:
+            start_s = period[0].astype("datetime64[s]").astype(np.int64)
+            end_s = (period[1] + np.timedelta64(1, "D")).astype("datetime64[s]").astype(np.int64)
+            candidate &= (self.partitions["time_max"] >= start_s) & (self.partitions["time_min"] < end_s)
+        visit = np.flatnonzero(candidate)
+        visit = visit[np.argsort(-part_bound[visit], kind="stable")]
+
+        heap, visited, evaluated = [], 0, 0
+        for p in visit:
+            if len(heap) == k and part_bound[p] <= heap[0][0]:
+                break
+            visited += 1
+            lo, hi = int(self.starts[p]), int(self.starts[p + 1])
+            rows_p = self.order[lo:hi]
+            bound = sign * np.asarray(profile_bound[lo:hi], dtype=np.float64)
+            keep = np.isfinite(bound)
+            if member is not None:
+                keep &= member[rows_p]
+            if period is not None:
+                seconds = store.times[rows_p].astype("datetime64[s]").astype(np.int64)
+                keep &= (seconds >= start_s) & (seconds < end_s)
+            if len(heap) == k:
+                keep &= bound > heap[0][0]
+            rows_p = rows_p[keep]
+            if not len(rows_p):
+                continue
+            evaluated += len(rows_p)
+            if band is None and kind != "anomaly":
+                key = bound[keep]
+                value = sign * key
+            else:
+                key, value = self._exact(store, rows_p, variable, kind, band, climatology)
+            finite = np.flatnonzero(np.isfinite(key))
+            if len(finite) > k:
+                finite = finite[np.argpartition(-key[finite], k - 1)[:k]]
+            for j in finite:
+                item = (float(key[j]), -int(rows_p[j]), float(value[j]))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        best = sorted(heap, reverse=True)
+        stats = {"partitions": len(self), "candidate_partitions": len(visit), "visited_partitions": visited,
+                 "profiles_evaluated": evaluated}
+        return (np.array([-row for _, row, _ in best], dtype=np.int64),
+                np.array([value for _, _, value in best]), stats)
+
+
+def extreme_depth(store, i, variable, kind, band=None):
+    """Depth of profile ``i``'s max or min level value (within ``band``), or None."""
+    s = store.level_slice(i)
+    depth = store.levels["depth"][s]
+    values = np.where(_band_mask(depth, band), store.levels[variable][s], np.nan)
+    if not np.isfinite(values).any():
+        return None
+    j = np.nanargmax(values) if kind == "max" else np.nanargmin(values)
+    return round(float(depth[j]), 1)
+
+
+def region_rows(store, lat, lon, radius_km):
+    """Catalog rows within ``radius_km`` of (lat, lon)."""
+    rows = store.grid.within(lat, lon, radius_km)
+    return rows[haversine_km(lat, lon, store.lat[rows], store.lon[rows]) <= radius_km]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_builds = BackgroundBuild("extremes")
+
+
+def _publish(store):
+    global _engine
+    engine = build_index(store)
+    with _engine_lock:
+        _engine = engine
+
+
+def get_extremes(store=None, wait=False):
+    """ExtremesIndex for the current catalog, or None if no index is available yet.
+
+    A missing or stale index is rebuilt in-process only for catalogs up to
+    FLOATCHAT_EXTREMES_AUTO_BUILD_MAX profiles, on a background thread
+    unless ``wait``; larger ones need ``build``.
+    """
+    global _engine
+    store = store if store is not None else get_store()
+    if store is None:
+        return None
+    engine = _engine
+    if engine is not None and engine.meta.get("store_version") == store.version:
+        return engine
+    with _engine_lock:
+        if _engine is not None and _engine.meta.get("store_version") == store.version:
+            return _engine
+        path = _path()
+        if os.path.exists(os.path.join(path, "meta.json")):
+            engine = ExtremesIndex.open(path)
+            if engine.meta.get("store_version") == store.version:
+                _engine = engine
+                return _engine
+    if not len(store) or len(store) > AUTO_BUILD_MAX:
+        return None
+    _builds.submit(_publish, store, wait)
+    engine = _engine
+    return engine if wait and engine is not None and engine.meta.get("store_version") == store.version else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the extremes index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="write per-partition bounds")
+    build.add_argument("--db", default=DB_PATH)
+    top = sub.add_parser("top", help="top-k extremes or anomalies")
+    top.add_argument("variable", choices=VARIABLES)
+    top.add_argument("--kind", default="max", choices=KINDS)
+    top.add_argument("-k", type=int, default=10)
+    top.add_argument("--lat", type=float)
+    top.add_argument("--lon", type=float)
+    top.add_argument("--radius", type=float, default=1000.0)
+    top.add_argument("--band", help="top,bottom in dbar")
+    top.add_argument("--start", help="first day, YYYY-MM-DD")
+    top.add_argument("--end", help="last day, YYYY-MM-DD")
+    top.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_store(args.db)
+    print(f"🗂️ {len(store):,} profiles loaded in {time.perf_counter() - started:.1f}s")
+    if args.command == "build":
+        started = time.perf_counter()
+        index = build_index(store)
+        print(f"✅ {len(index):,} partitions of {index.meta['partition_size']} profiles "
+              f"(anomalies: {', '.join(index.anomaly_variables) or 'none'}) in {time.perf_counter() - started:.1f}s")
+        print(f"📁 {index.directory}")
+        return
+    index = get_extremes(store, wait=True)
+    if index is None:
+        raise SystemExit("❌ No extremes index for this catalog; run the build command first")
+    rows = region_rows(store, args.lat, args.lon, args.radius) if args.lat is not None else None
+    period = None
+    if args.start or args.end:
+        period = (np.datetime64(args.start or "1900-01-01", "D"), np.datetime64(args.end or "2100-12-31", "D"))
+    band = tuple(float(d) for d in args.band.split(",")) if args.band else None
+    climatology = get_climatology(store, wait=True) if args.kind == "anomaly" else None
+    started = time.perf_counter()
+    found, values, stats = index.top(store, args.variable, args.kind, args.k, rows, period, band, climatology)
+    took = (time.perf_counter() - started) * 1e3
+    for i, value in zip(found, values):
+        print(f"{value:9.3f}  #{store.profile_ids[i]}  {store.lat[i]:8.3f} {store.lon[i]:9.3f}  {store.times[i]}")
+    print(f"⏱️ {took:.2f} ms, {stats['visited_partitions']}/{stats['candidate_partitions']} partitions, "
+          f"{stats['profiles_evaluated']:,} profiles evaluated")
+
+
+if __name__ == "__main__":
+    main()
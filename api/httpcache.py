@@ -0,0 +1,76 @@
+"""
+HTTP validation and caching headers for deterministic responses.
+
+A response body is identified by a strong ETag (a hash of its bytes). The
+ETag last served for each request key is remembered in a small LRU, so a
+conditional request (GET, or POST carrying If-None-Match) whose validator
+still matches gets 304 Not Modified before any profile is generated.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import Counter
+
+MAX_AGE = int(os.getenv("FLOATCHAT_CACHE_MAX_AGE", "300"))
+ETAG_INDEX_SIZE = int(os.getenv("FLOATCHAT_ETAG_INDEX_SIZE", "4096"))
+
+NOT_MODIFIED = Counter("floatchat_not_modified_total", "Conditional requests answered with 304.",
+                       ("endpoint", "validated"))
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """RFC 9110 weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+class ETagIndex:
+    """Bounded LRU of request key -> ETag of the response last served for it."""
+
+    def __init__(self, size=ETAG_INDEX_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+            return etag
+
+    def put(self, key, etag):
+        with self._lock:
+            self._entries[key] = etag
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def cache_headers(response, etag=None, max_age=MAX_AGE, vary=("Accept", "Accept-Encoding")):
+    """Set ETag, Cache-Control and Vary; ``etag=None`` marks the response uncacheable."""
+    if etag is None:
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    if vary:
+        response.headers["Vary"] = ", ".join(vary)
+    return response
@@ -0,0 +1,183 @@
+"""
+Batched vertical interpolation of profiles onto a common pressure grid.
+
+Profiles come in CSR layout like ProfileStore's: the levels of profile
+``i`` are ``offsets[i]`` to ``offsets[i + 1]``, shallowest first. Every
+profile is evaluated at every grid pressure in one vectorized pass. A
+single global sort key (profile, depth) finds each grid pressure's
+bracketing levels, so nothing loops per profile.
+
+Methods:
+
+* ``linear`` - piecewise linear between the bracketing levels
+* ``pchip``  - monotone piecewise cubic Hermite (Fritsch-Carlson). It is
+  smooth, does not overshoot between levels, and keeps a thermocline
+  monotone where linear interpolation would show kinks.
+
+Gaps:
+
+* Missing (NaN) values are skipped per variable, and repeated pressures
+  keep their first value. A level without salinity still contributes
+  temperature.
+* ``max_gap`` (dbar): a grid pressure whose bracketing levels are farther
+  apart than this is NaN rather than bridged.
+* ``extrapolate``: ``"nan"`` (default) leaves pressures above the
+  shallowest or below the deepest level NaN. ``"clamp"`` holds the end
+  values.
+"""
+
+import numpy as np
+
+METHODS = ("linear", "pchip")
+EXTRAPOLATE = ("nan", "clamp")
+# Standard levels (dbar), WOA-style: dense near the surface, sparse at depth
+STANDARD_PRESSURES = np.array([5, 10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500, 600, 700,
+                               800, 900, 1000, 1100, 1200, 1300, 1400, 1500, 1750, 2000], dtype=np.float64)
+
+
+def _compact(depth, values, offsets):
+    """CSR arrays without NaN values or repeated depths (first kept), plus the new offsets."""
+    n = len(offsets) - 1
+    owner = np.repeat(np.arange(n), np.diff(offsets))
+    keep = np.isfinite(values) & np.isfinite(depth)
+    owner_k, depth_k = owner[keep], depth[keep]
+    repeat = np.zeros(len(depth_k), dtype=bool)
+    repeat[1:] = (owner_k[1:] == owner_k[:-1]) & (depth_k[1:] == depth_k[:-1])
+    owner_k = owner_k[~repeat]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(owner_k, minlength=n))]).astype(np.int64)
+    return depth_k[~repeat], values[keep][~repeat], offsets, owner_k
+
+
+def _edge_slope(h0, h1, m0, m1):
+    """Three-point end derivative, limited to keep the end interval monotone."""
+    d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    d = np.where(np.sign(d) != np.sign(m0), 0.0, d)
+    return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > 3 * np.abs(m0)), 3 * m0, d)
+
+
+def pchip_slopes(depth, values, owner):
+    """Fritsch-Carlson derivative at every level of compacted CSR profiles."""
+    nan2 = np.array([np.nan, np.nan])
+    h = np.diff(depth)
+    joined = owner[:-1] == owner[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(joined, np.diff(values) / np.where(joined, h, 1.0), np.nan)
+        # Segment to the left (k - 1) and right (k) of each level, and the next ones out
+        hl, dl, left = np.r_[np.nan, h], np.r_[np.nan, delta], np.r_[False, joined]
+        hr, dr, right = np.r_[h, np.nan], np.r_[delta, np.nan], np.r_[joined, False]
+        hll, dll = np.r_[nan2, h[:-1]], np.r_[nan2, delta[:-1]]
+        hrr, drr = np.r_[h[1:], nan2], np.r_[delta[1:], nan2]
+        left2 = left & np.r_[False, False, joined[:-1]]
+        right2 = right & np.r_[joined[1:], False, False]
+
+        w1, w2 = 2 * hr + hl, hr + 2 * hl
+        interior = np.where(np.sign(dl) * np.sign(dr) > 0, (w1 + w2) / (w1 / dl + w2 / dr), 0.0)
+        first = np.where(right2, _edge_slope(hr, hrr, dr, drr), dr)
+        last = np.where(left2, _edge_slope(hl, hll, dl, dll), dl)
+    return np.select([left & right, right, left], [interior, first, last], 0.0)
+
+
+def interpolate_profiles(depth, values, offsets, pressures=STANDARD_PRESSURES, method="linear",
+                         max_gap=None, extrapolate="nan"):
+    """Values of each CSR profile at ``pressures``: a (profiles x pressures) float64 array."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    if extrapolate not in EXTRAPOLATE:
+        raise ValueError(f"extrapolate must be one of {', '.join(EXTRAPOLATE)}")
+    pressures = np.asarray(pressures, dtype=np.float64)
+    depth, values, offsets, owner = _compact(np.asarray(depth, dtype=np.float64),
+                                             np.asarray(values, dtype=np.float64),
+                                             np.asarray(offsets, dtype=np.int64))
+    n, m = len(offsets) - 1, len(pressures)
+    out = np.full((n, m), np.nan)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    if not len(filled) or not m:
+        return out
+    start, stop = offsets[filled][:, None], offsets[filled + 1][:, None] - 1
+    top, bottom = depth[start], depth[stop]
+    p = np.broadcast_to(pressures[None, :], (len(filled), m))
+
+    base = depth.min()
+    span = float(depth.max() - base) + float(np.ptp(pressures)) + 1.0
+    keys = owner * span + (depth - base)
+    target = np.clip(p, top, bottom)
+    pos = np.searchsorted(keys, filled[:, None] * span + (target - base), side="left")
+    hi = np.clip(pos, np.minimum(start + 1, stop), stop)
+    lo = np.maximum(hi - 1, start)
+    h = depth[hi] - depth[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(h > 0, (target - depth[lo]) / np.where(h > 0, h, 1.0), 1.0)
+    y0, y1 = values[lo], values[hi]
+    if method == "linear":
+        result = y0 + t * (y1 - y0)
+    else:
+        slopes = pchip_slopes(depth, values, owner)
+        t2, t3 = t * t, t * t * t
+        result = ((2 * t3 - 3 * t2 + 1) * y0 + (t3 - 2 * t2 + t) * h * slopes[lo]
+                  + (3 * t2 - 2 * t3) * y1 + (t3 - t2) * h * slopes[hi])
+
+    outside = (p < top) | (p > bottom)
+    if extrapolate == "nan":
+        result = np.where(outside, np.nan, result)
+    if max_gap is not None:
+        bridged = ~outside & (target != depth[lo]) & (target != depth[hi]) & (h > max_gap)
+        result = np.where(bridged, np.nan, result)
+    out[filled] = result
+    return out
+
+
+def interpolate_store(store, pressures=STANDARD_PRESSURES, variables=("temperature", "salinity"), **options):
+    """{variable: (profiles x pressures) array} for every profile of a ProfileStore or subset."""
+    depth = store.levels["depth"]
+    return {
+        variable: interpolate_profiles(depth, store.levels[variable], store.offsets, pressures, **options)
+        for variable in variables
+    }
+
+
+# Keys of the /query ``depth_levels`` layout for each catalog variable
+LEVEL_KEYS = {"depth": "pres", "temperature": "temp", "salinity": "salinity", "oxygen": "oxygen"}
+MAX_PRESSURES = 500
+
+
+def parse_pressures(spec):
+    """Grid from a list or "5,10,20" string (STANDARD_PRESSURES when empty); ValueError if invalid."""
+    if spec is None or spec == "" or spec == []:
+        return STANDARD_PRESSURES
+    items = spec.split(",") if isinstance(spec, str) else spec
+    try:
+        pressures = np.array([float(p) for p in items], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("pressures must be numbers")
+    if not len(pressures) or len(pressures) > MAX_PRESSURES or not np.isfinite(pressures).all():
+        raise ValueError(f"pressures must be 1 to {MAX_PRESSURES} finite numbers")
+    return pressures
+
+
+def levels_to_csr(profiles, variables):
+    """(depth, {variable: values}, offsets) from a list of /query-style ``depth_levels``.
+
+    Each entry is a list of level rows or the columnar dict layout; levels
+    are sorted by pressure within each profile and missing values are NaN.
+    """
+    columns = {key: [] for key in ("depth",) + tuple(variables)}
+    counts = []
+    for levels in profiles:
+        if isinstance(levels, dict):
+            size = len(levels.get(LEVEL_KEYS["depth"]) or [])
+            for key in columns:
+                column = levels.get(LEVEL_KEYS[key]) or [None] * size
+                if len(column) != size:
+                    raise ValueError("columnar depth_levels need equal-length arrays")
+                columns[key].extend(column)
+        else:
+            size = len(levels)
+            for key in columns:
+                columns[key].extend(level.get(LEVEL_KEYS[key]) for level in levels)
+        counts.append(size)
+    arrays = {key: np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+              for key, values in columns.items()}
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((arrays["depth"], owner))
+    return arrays["depth"][order], {v: arrays[v][order] for v in variables}, offsets
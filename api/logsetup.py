@@ -0,0 +1,151 @@
+"""
+Structured, non-blocking logging for the API.
+
+Records are formatted as one JSON object per line and handed to a bounded
+queue; a QueueListener thread does the actual stdout writes, so request
+threads never wait on the stdout lock. When the queue is full records are
+dropped (and counted) instead of blocking. High-volume events logged with
+``extra={"sampled": True}`` are kept with probability
+FLOATCHAT_LOG_SAMPLE_RATE; warnings and errors are always kept.
+
+Per-request fields (query hash, trace id, ...) are bound with ``bind()``
+and attached to every record emitted while handling that request.
+"""
+
+import atexit
+import contextvars
+import copy
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from metrics import Counter
+from tracing import current_trace
+
+LOG_LEVEL = os.getenv("FLOATCHAT_LOG_LEVEL", "INFO").upper()
+SAMPLE_RATE = float(os.getenv("FLOATCHAT_LOG_SAMPLE_RATE", "1.0"))
+QUEUE_SIZE = int(os.getenv("FLOATCHAT_LOG_QUEUE_SIZE", "10000"))
+
+_context = contextvars.ContextVar("floatchat_log_context", default={})
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sampled"}
+
+LOG_DROPPED = Counter("floatchat_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+
+def bind(**fields):
+    """Attach fields to every record logged for the rest of this request."""
+    _context.set({**_context.get(), **fields})
+
+
+def clear_context():
+    _context.set({})
+
+
+def query_hash(query):
+    """Short stable hash of the normalized query, safe to log instead of raw text."""
+    return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()[:12]
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "context", {}))
+        payload.update({k: v for k, v in vars(record).items() if k not in _RESERVED and k != "context"})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the request context (and trace id) onto the record at emit time,
+    while still on the request thread."""
+
+    def filter(self, record):
+        context = dict(_context.get())
+        trace = current_trace()
+        if trace is not None:
+            context.setdefault("trace_id", trace.trace_id)
+        record.context = context
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or erroring when full."""
+
+    def prepare(self, record):
+        # Resolve message args and the traceback on the request thread, but keep
+        # them in separate fields rather than the stock handler's merged text.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+_listener = None
+
+
+def configure_logging():
+    """Route the ``floatchat`` logger through the background JSON pipeline (idempotent)."""
+    global _listener
+    logger = logging.getLogger("floatchat")
+    if _listener is not None:
+        return logger
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=QUEUE_SIZE))
+    handler.addFilter(SamplingFilter(SAMPLE_RATE))
+    handler.addFilter(ContextFilter())
+
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return logger
+
+
+def register_logging(app):
+    """Reset the per-request log context at the start of every request."""
+
+    @app.before_request
+    def _reset_log_context():
+        clear_context()
+
+    return configure_logging()
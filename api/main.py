@@ -3,35 +3,86 @@
 Standalone FloatChat API Server - No External Dependencies
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import random
 import json
+import os
 import re
-from datetime import datetime
+import time
+import hashlib
+import itertools
+import sqlite3
+import threading
+import numpy as np
+from urllib.parse import urlencode
+from datetime import datetime, timezone
+
+from metrics import ERRORS, instrumented, render_metrics, stage
+from profiling import register_profiling
+from tracing import register_tracing
+from logsetup import bind, query_hash, register_logging
+from coalesce import SingleFlight, normalize_query
+from admission import admitted
+from encoding import (JSON, available_media_types, choose_coding, compress, encode_profiles, negotiate,
+                      slim_profile, stream_compress, stream_profiles)
+from httpcache import ETagIndex, NOT_MODIFIED, cache_headers, content_etag, etag_matches
+from pagination import CursorError, decode_cursor, encode_cursor, parse_limit
+from ranking import BASE_WEIGHTS, candidate_set, parse_period_from_query, parse_periods_from_query, parse_weights, rank
+from store import DB_PATH, get_store
+from spatial import haversine_km
+from semantic import DEFAULT_NPROBE, get_search, profile_summaries
+from derived import derive_levels, derive_store, profile_metrics
+from physics import (DETAILED_PRESSURES, STANDARD_PRESSURES, level_salinity, level_temperature, salinity_noise,
+                     surface_conditions, temperature_noise)
+from climatology import FILL_PASSES, MONTH_NAMES, get_climatology
+from interpolate import EXTRAPOLATE, METHODS, interpolate_profiles, interpolate_store, levels_to_csr, parse_pressures
+from shape import DEFAULT_NPROBE as SHAPE_NPROBE, SHAPE_PRESSURES, get_shape_search, levels_vector
+from trends import DEFAULT_RADIUS_KM as TREND_RADIUS_KM, DEFAULT_WINDOW, UNITS, VARIABLES as TREND_VARIABLES, analyse, parse_band
+from compare import (COMPARE_PRESSURES, DEFAULT_RADIUS_KM as COMPARE_RADIUS_KM, MAX_SUBJECTS, align_levels,
+                     composite, differences, evaluate)
+from extremes import KINDS as EXTREME_KINDS, MAX_K as MAX_EXTREMES, VARIABLES as EXTREME_VARIABLES, extreme_depth, get_extremes, region_rows
+from export import FORMATS as EXPORT_FORMATS, available_formats, export_stream, parse_filters, plan_export
 
 app = Flask(__name__)
+register_profiling(app)
+register_tracing(app)
+log = register_logging(app)
 
 # Manual CORS handling
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,traceparent,If-None-Match,X-FloatChat-Profile')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag, Link, Retry-After, X-FloatChat-Profile-Id, X-Next-Cursor, X-Total-Count')
     return response
 
+# Deterministic mode (opt-in): stable profile_id/time so bodies can be validated with ETags.
+# The modelled profile's time then becomes "<UTC day> 00:00:00" instead of the request time.
+DETERMINISTIC = os.getenv("FLOATCHAT_DETERMINISTIC", "0") == "1"
+
+def _stable_hash(*parts) -> int:
+    """64-bit hash that, unlike hash(), is the same in every process."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
 def _build_rng(lat: float, lon: float, query_lower: str) -> random.Random:
     """Create a deterministic RNG so similar queries vary but are stable per query/location."""
-    seed = hash((round(lat, 2), round(lon, 2), query_lower)) & 0xFFFFFFFF
+    seed = _stable_hash(round(lat, 2), round(lon, 2), normalize_query(query_lower)) & 0xFFFFFFFF
     return random.Random(seed)
 
+LAT_PATTERN = r"lat(?:itude)?\s*[:=]?\s*(-?\d{1,2}(?:\.\d+)?)"
+LON_PATTERN = r"lon(?:g(?:itude)?)?\s*[:=]?\s*(-?\d{1,3}(?:\.\d+)?)"
+COMPACT_PATTERN = r"(-?\d{1,2}(?:\.\d+)?)([ns])\s+(-?\d{1,3}(?:\.\d+)?)([ew])"
+
 def _parse_location_from_query(query_lower: str):
     """Try to extract latitude/longitude from the query text.
     Supports patterns like 'lat 12.9 lon 77.6', 'latitude: 12.9, longitude: 77.6',
-    or compact '12.9N 77.6E'. Returns (lat, lon) or None.
+    'lat=12.9, long=77.6' or compact '12.9N 77.6E'. Returns (lat, lon) or None.
     """
     # Pattern 1: lat ... lon ...
-    m1 = re.search(r"lat(?:itude)?\s*[:=]?\s*(-?\d{1,2}(?:\.\d+)?)", query_lower)
-    m2 = re.search(r"lon(?:gitude)?\s*[:=]?\s*(-?\d{1,3}(?:\.\d+)?)", query_lower)
+    m1 = re.search(LAT_PATTERN, query_lower)
+    m2 = re.search(LON_PATTERN, query_lower)
     if m1 and m2:
         try:
             lat = float(m1.group(1))
@@ -42,7 +93,7 @@ def _parse_location_from_query(query_lower: str):
             pass
 
     # Pattern 2: 12.9N 77.6E (or S/W)
-    m3 = re.search(r"(-?\d{1,2}(?:\.\d+)?)([ns])\s+(-?\d{1,3}(?:\.\d+)?)([ew])", query_lower)
+    m3 = re.search(COMPACT_PATTERN, query_lower)
     if m3:
         lat = float(m3.group(1)) * (1 if m3.group(2) == 'n' else -1)
         lon = float(m3.group(3)) * (1 if m3.group(4) == 'e' else -1)
@@ -51,13 +102,66 @@ def _parse_location_from_query(query_lower: str):
 
     return None
 
+# Location mapping - no external calls
+PLACE_COORDINATES = {
+    "mumbai": (19.0760, 72.8777),
+    "india": (19.0760, 72.8777),
+    "equator": (0.0, 78.0),
+    "pacific": (0.0, -140.0),
+    "atlantic": (0.0, -30.0),
+    "arabian": (15.0, 65.0),
+    "indian ocean": (0.0, 78.0)
+}
+
+def _resolve_location(query_lower: str):
+    """Resolve a query to (lat, lon, location_desc): coordinates, then place names,
+    then a random ocean location that is deterministic per query."""
+    coord = _parse_location_from_query(query_lower)
+    if coord:
+        lat, lon = coord
+        return lat, lon, f"at {lat:.3f}°N, {lon:.3f}°E"
+    for place, coords in PLACE_COORDINATES.items():
+        if place in query_lower:
+            return coords[0], coords[1], f"near {place.title()}"
+    rng = _build_rng(0, 0, query_lower)
+    lat = round(rng.uniform(-60, 60), 3)
+    lon = round(rng.uniform(-180, 180), 3)
+    return lat, lon, f"at {lat}°N, {lon}°E"
+
+def _has_explicit_location(query_lower: str) -> bool:
+    """Whether the query names coordinates or a known place (vs. the random fallback)."""
+    return bool(_parse_location_from_query(query_lower)) or any(p in query_lower for p in PLACE_COORDINATES)
+
+def _parse_locations_from_query(query_lower: str):
+    """Every location named in the query, in order of mention, as (lat, lon, location_desc)."""
+    found = []
+    lons = list(re.finditer(LON_PATTERN, query_lower))
+    for m in re.finditer(LAT_PATTERN, query_lower):
+        lon = next((n for n in lons if n.start() > m.start()), None)
+        if lon is not None:
+            found.append((m.start(), float(m.group(1)), float(lon.group(1)), None))
+    for m in re.finditer(COMPACT_PATTERN, query_lower):
+        found.append((m.start(), float(m.group(1)) * (1 if m.group(2) == 'n' else -1),
+                      float(m.group(3)) * (1 if m.group(4) == 'e' else -1), None))
+    for place, coords in PLACE_COORDINATES.items():
+        for m in re.finditer(rf"\b{place}\b", query_lower):
+            found.append((m.start(), coords[0], coords[1], f"near {place.title()}"))
+    locations, seen = [], set()
+    for _, lat, lon, desc in sorted(found, key=lambda item: item[0]):
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (round(lat, 4), round(lon, 4)) in seen:
+            continue
+        seen.add((round(lat, 4), round(lon, 4)))
+        locations.append((lat, lon, desc or f"at {lat:.3f}°N, {lon:.3f}°E"))
+    return locations
+
 def _infer_intent(query_lower: str):
     """Infer user's focus parameter and mode to diversify responses."""
     temp_kw = ["temp", "temperature", "thermocline", "warm", "cold"]
-    sal_kw = ["salinity", "salt", "halocline"]
+    sal_kw = ["salinity", "salt", "halocline", "freshest"]
     oxy_kw = ["oxygen", "o2", "dissolved oxygen"]
     trend_kw = ["trend", "increase", "decrease", "change", "over time", "season", "monthly", "yearly"]
-    extreme_kw = ["max", "min", "peak", "highest", "lowest", "anomaly", "anomalies"]
+    extreme_kw = ["max", "min", "peak", "highest", "lowest", "anomaly", "anomalies",
+                  "warmest", "coldest", "saltiest", "freshest"]
 
     primary = "profile"
     if any(k in query_lower for k in temp_kw):
@@ -80,89 +184,90 @@ def _infer_intent(query_lower: str):
 
     return {"primary": primary, "mode": mode, "detail": detail}
 
-def generate_realistic_profile(lat, lon, query_lower, rng: random.Random = None):
-    """Generate scientifically plausible oceanographic profiles based on location and intent."""
+# Furthest fill level (neighbour passes from observed cells) synthesis will use from the cube
+SYNTHESIS_MAX_SUPPORT = int(os.getenv("FLOATCHAT_CLIM_SYNTHESIS_SUPPORT", "2"))
+
+def _climatological_profile(climatology, lat, lon, month, pressures, rng: random.Random):
+    """Depth levels drawn around the monthly climatology, or None where the cube has no nearby data."""
+    mean, spread = {}, {}
+    for variable in ("temperature", "salinity"):
+        mean[variable], support = climatology.lookup(variable, lat, lon, pressures, month)
+        spread[variable], _ = climatology.lookup(variable, lat, lon, pressures, month, stat="std")
+        if not np.isfinite(mean[variable]).all() or support.max() > SYNTHESIS_MAX_SUPPORT:
+            return None
+    # One anomaly per variable keeps the column coherent; small per-level noise on top
+    temp_anomaly, salinity_anomaly = rng.gauss(0, 0.5), rng.gauss(0, 0.5)
+    depths = []
+    for k, pressure in enumerate(pressures):
+        temp = mean["temperature"][k] + temp_anomaly * np.nan_to_num(spread["temperature"][k])
+        salinity = mean["salinity"][k] + salinity_anomaly * np.nan_to_num(spread["salinity"][k])
+        depths.append({
+            "pres": float(pressure),
+            "temp": round(max(float(temp) + rng.uniform(-0.2, 0.2), -1.9), 2),
+            "salinity": round(max(min(float(salinity) + rng.uniform(-0.03, 0.03), 37.5), 32.0), 2)
+        })
+    return depths
+
+def generate_realistic_profile(lat, lon, query_lower, rng: random.Random = None, climatology=None, month=None):
+    """Generate scientifically plausible oceanographic profiles based on location and intent.
+
+    With a climatology cube and a month, levels come from the cube wherever it is
+    backed by nearby observations; the latitude-band model below is the fallback.
+    """
     if rng is None:
         rng = _build_rng(lat, lon, query_lower)
     
-    # Determine regional oceanographic characteristics
-    if abs(lat) <= 10:  # Tropical
-        surface_temp = rng.uniform(26, 29)
-        surface_salinity = rng.uniform(34.5, 35.5)
-        thermocline_strength = 0.18  # Strong thermocline
-    elif 10 < abs(lat) <= 30:  # Subtropical
-        surface_temp = rng.uniform(22, 27)
-        surface_salinity = rng.uniform(35.0, 36.5)
-        thermocline_strength = 0.14
-    elif 30 < abs(lat) <= 50:  # Temperate
-        surface_temp = rng.uniform(15, 22)
-        surface_salinity = rng.uniform(34.0, 35.5)
-        thermocline_strength = 0.10
-    else:  # Polar/Subpolar
-        surface_temp = rng.uniform(2, 10)
-        surface_salinity = rng.uniform(33.5, 34.5)
-        thermocline_strength = 0.06
+    # Choose depth resolution based on query detail
+    if any(k in query_lower for k in ["detailed", "high-res", "high resolution"]):
+        pressures = DETAILED_PRESSURES
+    else:
+        pressures = STANDARD_PRESSURES
+    
+    if climatology is not None and month is not None:
+        depths = _climatological_profile(climatology, lat, lon, month, pressures, rng)
+        if depths is not None:
+            return depths
     
-    # Regional modifications
-    if "arabian" in query_lower or (50 < lon < 80 and 10 < lat < 25):
-        surface_temp += rng.uniform(0.5, 2.0)  # Warmer Arabian Sea
-        surface_salinity += rng.uniform(0.3, 0.8)  # Higher salinity due to evaporation
-    elif "pacific" in query_lower and -180 < lon < -80:
-        surface_temp += rng.uniform(-1.0, 1.0)  # Pacific variability
-        if lat < 10:  # Equatorial Pacific
-            surface_salinity -= rng.uniform(0.2, 0.5)  # Equatorial freshening
+    # Regional surface conditions (latitude band, Arabian Sea / Pacific adjustments)
+    surface_temp, surface_salinity, thermocline_strength = surface_conditions(
+        lat, lon, rng.uniform, arabian="arabian" in query_lower, pacific="pacific" in query_lower)
     
     # Generate depth levels with realistic oceanographic structure
     depths = []
-    # Choose depth resolution based on query detail
-    if any(k in query_lower for k in ["detailed", "high-res", "high resolution"]):
-        pressures = [5, 10, 15, 25, 35, 50, 65, 80, 100, 125, 150]
-    else:
-        pressures = [5, 15, 30, 50, 75, 100, 125, 150]
     
-    for i, pressure in enumerate(pressures):
+    for pressure in pressures:
         # Temperature: surface mixed layer + thermocline + deep water
-        if pressure <= 20:  # Surface mixed layer
-            temp = surface_temp + rng.uniform(-0.5, 0.5)
-        elif pressure <= 100:  # Main thermocline
-            depth_factor = (pressure - 20) / 80
-            temp_drop = thermocline_strength * 80 * depth_factor
-            temp = surface_temp - temp_drop + rng.uniform(-0.8, 0.8)
-        else:  # Deep water
-            temp = surface_temp - (thermocline_strength * 80) - (pressure - 100) * 0.02
-            temp += rng.uniform(-0.5, 0.5)
-        
-        temp = max(temp, 1.5)  # Ocean minimum temperature
-        
+        width = float(temperature_noise(pressure))
+        temp = level_temperature(surface_temp, thermocline_strength, pressure, rng.uniform(-width, width))
         # Salinity: surface layer + halocline + deep water
-        if pressure <= 30:
-            salinity = surface_salinity + rng.uniform(-0.1, 0.1)
-        elif pressure <= 80:
-            # Subsurface salinity maximum common in many regions
-            salinity = surface_salinity + 0.1 + rng.uniform(-0.15, 0.15)
-        else:
-            # Deep water salinity
-            salinity = surface_salinity - 0.05 + rng.uniform(-0.2, 0.2)
-        
-        salinity = max(min(salinity, 37.5), 32.0)  # Realistic ocean bounds
+        width = float(salinity_noise(pressure))
+        salinity = level_salinity(surface_salinity, pressure, rng.uniform(-width, width))
         
         depths.append({
             "pres": float(pressure),
-            "temp": round(temp, 2),
-            "salinity": round(salinity, 2)
+            "temp": round(float(temp), 2),
+            "salinity": round(float(salinity), 2)
         })
     
     return depths
 
-def generate_detailed_analysis(depths, location_desc, lat, lon, query):
+# Peak N² (s⁻²) above which the water column counts as strongly stratified
+STRATIFIED_N2 = 1e-4
+
+def generate_detailed_analysis(depths, location_desc, lat, lon, query, derived=None, climate=None, trend=None,
+                               extremes=None):
     """Generate sophisticated oceanographic insights"""
     
     surface = depths[0]
     deep = depths[-1]
     mid_depth = depths[len(depths)//2]
     
-    # Calculate gradients and characteristics
-    temp_gradient = (surface['temp'] - deep['temp']) / (deep['pres'] - surface['pres'])
+    # Stratification from the derived-quantity engine (density, MLD, N²)
+    if derived is None:
+        derived = derive_levels(depths, lat, lon)
+    temp_gradient = derived['thermocline_gradient'] or 0.0
+    n2_max = derived['n2_max'] or 0.0
+    stratified = n2_max > STRATIFIED_N2
     salinity_range = max([d['salinity'] for d in depths]) - min([d['salinity'] for d in depths])
     
     # Determine water mass characteristics
@@ -224,6 +329,52 @@ def generate_detailed_analysis(depths, location_desc, lat, lon, query):
     elif "arabian" in query_lower:
         location_context = " The Arabian Sea is known for intense seasonal productivity during monsoon upwelling periods."
     
+    # Baseline from the monthly climatology cube, when it has data near here
+    baseline_note = ""
+    if climate:
+        basis = f"{climate['profiles']} profiles" if climate['profiles'] else "filled from neighbouring cells"
+        baseline_note = (
+            f"\n**Climatology**: The {MONTH_NAMES[climate['month'] - 1]} mean for this {climate['cell_deg']:g}° cell "
+            f"is {climate['surface_temp']:.1f}°C and {climate['surface_salinity']:.2f} PSU near the surface ({basis}), "
+            f"so this profile runs {climate['temp_anomaly']:+.1f}°C against its baseline.\n"
+        )
+
+    # Observed time series of the region, for trend queries
+    trend_note = ""
+    if trend and trend["trend"]:
+        fit, units = trend["trend"], trend["units"]
+        ci = fit["ci95_per_decade"]
+        interval = f" (95% CI {ci[0]:+.2f} to {ci[1]:+.2f})" if ci else ""
+        verdict = "a statistically significant change" if fit["significant"] else "not distinguishable from zero"
+        cycle = [v for v in trend["seasonal_cycle"] if v is not None]
+        peak = MONTH_NAMES[trend["seasonal_cycle"].index(max(cycle))]
+        months = trend["series"]["month"]
+        trend_note = (
+            f"\n**Observed Trend**: {trend['profiles']} profiles within {trend['region']['radius_km']:g} km "
+            f"({months[0]} to {months[-1]}, {trend['months']} months with data) put {trend['variable']} at "
+            f"{trend['band'][0]:g}–{trend['band'][1]:g}m changing by {fit['per_decade']:+.2f} {units}/decade"
+            f"{interval}, {verdict}. The seasonal cycle spans {max(cycle) - min(cycle):.2f} {units} and peaks "
+            f"in {peak}.\n"
+        )
+
+    # Record values from the extremes index, for max/min/anomaly queries
+    extremes_note = ""
+    if extremes and extremes["results"]:
+        units = extremes["units"]
+        label = {"max": "Highest", "min": "Lowest", "anomaly": "Largest anomaly in"}[extremes["kind"]]
+        scope = f"within {extremes['radius_km']:g} km" if extremes["radius_km"] else "across the catalog"
+        if extremes["period"]:
+            scope += f" between {extremes['period'][0]} and {extremes['period'][1]}"
+        if extremes["band"]:
+            scope += f" at {extremes['band'][0]:g}–{extremes['band'][1]:g}m"
+        records = []
+        for hit in extremes["results"][:3]:
+            where = f" at {hit['depth']:g}m" if hit["depth"] is not None else ""
+            away = f", {hit['distance_km']:.0f} km away" if extremes["radius_km"] else ""
+            value = f"{hit['value']:+.2f}" if extremes["kind"] == "anomaly" else f"{hit['value']:.2f}"
+            records.append(f"{value} {units}{where} (profile #{hit['profile_id']}, {hit['time'][:10]}{away})")
+        extremes_note = f"\n**{label} {extremes['variable']} {scope}**: " + "; ".join(records) + ".\n"
+    
     # Construct comprehensive analysis
     analysis = f"""🌊 **Oceanographic Analysis for {location_desc}**
 
@@ -233,90 +384,939 @@ def generate_detailed_analysis(depths, location_desc, lat, lon, query):
 **Temperature Profile**: Surface temperature of {surface['temp']}°C decreasing to {deep['temp']}°C at {deep['pres']}m depth shows a {thermocline}.
 
 **Salinity Characteristics**: {surface['salinity']} PSU at surface - {salinity_note}.
-
-**Vertical Structure**: The temperature gradient of {temp_gradient:.3f}°C/meter indicates {'strong stratification' if temp_gradient > 0.1 else 'moderate mixing'}.{oxygen_note}
+{baseline_note}{trend_note}{extremes_note}
+**Vertical Structure**: The mixed layer extends to about {derived['mld'] or deep['pres']:.0f}m; below it the thermocline peaks near {derived['thermocline_depth'] or mid_depth['pres']:.0f}m with a gradient of {temp_gradient:.3f}°C/meter, and a peak buoyancy frequency N² = {n2_max:.1e} s⁻² indicates {'strong stratification' if stratified else 'moderate mixing'}.{oxygen_note}
 
 {bio_note}
 
-**Research Implications**: This profile suggests {'stable oceanographic conditions' if temp_gradient > 0.1 else 'active mixing processes'}, important for understanding {'thermal stratification and nutrient distribution' if temp_gradient > 0.1 else 'vertical mixing and ecosystem dynamics'}.
+**Research Implications**: This profile suggests {'stable oceanographic conditions' if stratified else 'active mixing processes'}, important for understanding {'thermal stratification and nutrient distribution' if stratified else 'vertical mixing and ecosystem dynamics'}.
 
 {location_context}
 
-📊 **Key Metrics**: ΔT = {surface['temp'] - deep['temp']:.1f}°C, Salinity range = {salinity_range:.2f} PSU"""
+📊 **Key Metrics**: ΔT = {surface['temp'] - deep['temp']:.1f}°C, Salinity range = {salinity_range:.2f} PSU, σ₀ = {derived['sigma0'][0]:.2f}–{derived['sigma0'][-1]:.2f} kg/m³, Heat content = {(derived['heat_content'] or 0.0) / 1e9:.2f} GJ/m²"""
 
     return analysis
 
-@app.route("/query", methods=["POST", "OPTIONS"])
+QUERY_FLIGHTS = SingleFlight("query")
+QUERY_ETAGS = ETagIndex()
+
+def _profile_identity(identity_key):
+    """profile_id and time for a response: stable per query, location and UTC day in
+    deterministic mode, random id and wall-clock time otherwise."""
+    if not DETERMINISTIC:
+        return random.randint(1000, 9999), datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return 1000 + _stable_hash(*identity_key) % 9000, f"{identity_key[-1]} 00:00:00"
+
+def _encoded_response(profiles, media_type, coding):
+    """Serialize profiles in the negotiated representation and content coding."""
+    if media_type == JSON:
+        payload = jsonify(profiles)
+    else:
+        payload = Response(encode_profiles(profiles, media_type), mimetype=media_type)
+    body, applied = compress(payload.get_data(), coding)
+    if applied:
+        payload.set_data(body)
+        payload.headers["Content-Encoding"] = applied
+    return payload
+
+def _compressed(payload):
+    """A JSON response compressed with the coding negotiated from Accept-Encoding."""
+    body, applied = compress(payload.get_data(), choose_coding(request.headers.get("Accept-Encoding")))
+    if applied:
+        payload.set_data(body)
+        payload.headers["Content-Encoding"] = applied
+    return payload
+
+# Pages with more observed profiles than this are streamed instead of built in memory
+STREAM_THRESHOLD = int(os.getenv("FLOATCHAT_STREAM_THRESHOLD", "100"))
+
+def _streamed_response(profiles, count, media_type, coding):
+    """Response whose body is encoded batch by batch as it is sent."""
+    payload = Response(stream_compress(stream_profiles(profiles, count, media_type), coding), mimetype=media_type)
+    if coding:
+        payload.headers["Content-Encoding"] = coding
+    return payload
+
+def _pagination_headers(response, query, limit, next_cursor, total, slim=False):
+    response.headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        params = {"query": query, "limit": limit, "cursor": next_cursor, **({"slim": 1} if slim else {})}
+        next_url = request.base_url + "?" + urlencode(params)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+def _period_month(period):
+    """Calendar month of a period shorter than a month's worth of days, else None."""
+    if period is not None and period[1] - period[0] < np.timedelta64(31, "D"):
+        return int(period[0].astype("datetime64[M]").astype(int) % 12) + 1
+    return None
+
+def _query_month(query_lower):
+    """Calendar month named in the query (with or without a year), else the current UTC month."""
+    month = _period_month(parse_period_from_query(query_lower))
+    if month is not None:
+        return month
+    for number, name in enumerate(MONTH_NAMES, 1):
+        if re.search(rf"\b{name.lower()}\b", query_lower):
+            return number
+    return datetime.now(timezone.utc).month
+
+def _query_band(query_lower, default=None):
+    """Depth band like "0-200m" or "100 to 500 dbar" named in the query, else ``default``."""
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(\d+(?:\.\d+)?)\s*(?:m\b|meters|metres|dbar)", query_lower)
+    if match:
+        top, bottom = sorted(float(d) for d in match.groups())
+        return top, bottom
+    return default
+
+def _trend_context(store, lat, lon, query_lower, intent):
+    """Regional time-series analysis for trend queries, or None."""
+    if intent["mode"] != "trend" or store is None or not len(store):
+        return None
+    variable = intent["primary"] if intent["primary"] in TREND_VARIABLES else "temperature"
+    return analyse(store, lat, lon, TREND_RADIUS_KM, variable, _query_band(query_lower, parse_band(None)))
+
+# Extremes queries search this far around a named location, else the whole catalog
+EXTREMES_RADIUS_KM = float(os.getenv("FLOATCHAT_EXTREMES_RADIUS_KM", "1000"))
+EXTREMES_IN_ANSWER = 5
+MAX_WORDS = re.compile(r"\b(?:max(?:imum|ima)?|highest|peak|warmest|saltiest)\b")
+MIN_WORDS = re.compile(r"\b(?:min(?:imum|ima)?|lowest|coldest|freshest)\b")
+
+def _extreme_kind(query_lower):
+    """Kind of extreme asked for; whole words only, so "determine" or "minutes" is not a minimum."""
+    if "anomal" in query_lower:
+        return "anomaly"
+    if MAX_WORDS.search(query_lower):
+        return "max"
+    if MIN_WORDS.search(query_lower):
+        return "min"
+    return "max"
+
+def _find_extremes(store, index, climatology, variable, kind, k, lat=None, lon=None, radius_km=None,
+                   period=None, band=None):
+    """(catalog rows, values, depths, distances, stats) of the top-k search."""
+    rows = region_rows(store, lat, lon, radius_km) if radius_km is not None else None
+    found, values, stats = index.top(store, variable, kind, k, rows, period, band, climatology)
+    depths = [extreme_depth(store, i, variable, kind, band) if kind != "anomaly" else None for i in found]
+    distances = haversine_km(lat, lon, store.lat[found], store.lon[found]) if lat is not None else [None] * len(found)
+    return found, values, depths, distances, stats
+
+def _extremes_context(store, climatology, lat, lon, located, query_lower, intent):
+    """Top observed extremes for extremes queries, or None."""
+    if intent["mode"] != "extremes" or store is None or not len(store):
+        return None
+    index = get_extremes(store)
+    variable = intent["primary"] if intent["primary"] in EXTREME_VARIABLES else "temperature"
+    kind = _extreme_kind(query_lower)
+    if index is None or (kind == "anomaly" and (climatology is None or variable not in index.anomaly_variables)):
+        return None
+    radius_km = EXTREMES_RADIUS_KM if located else None
+    period = parse_period_from_query(query_lower)
+    band = _query_band(query_lower)
+    found, values, depths, distances, stats = _find_extremes(
+        store, index, climatology, variable, kind, EXTREMES_IN_ANSWER, lat, lon, radius_km, period, band)
+    return {
+        "variable": variable,
+        "kind": kind,
+        "units": UNITS[variable],
+        "radius_km": radius_km,
+        "period": [str(day) for day in period] if period is not None else None,
+        "band": list(band) if band else None,
+        "results": [
+            {"profile_id": int(store.profile_ids[i]), "lat": round(float(store.lat[i]), 4),
+             "lon": round(float(store.lon[i]), 4), "time": str(store.times[i]).replace("T", " "),
+             "value": round(float(value), 3), "depth": depth,
+             "distance_km": round(float(distance), 1) if distance is not None else None}
+            for i, value, depth, distance in zip(found, values, depths, distances)
+        ],
+        "stats": stats,
+    }
+
+def _climate_context(climatology, lat, lon, month, depths):
+    """Surface climatology of the profile's cell and month, or None without nearby data."""
+    if climatology is None:
+        return None
+    surface = depths[0]
+    temp, support = climatology.lookup("temperature", lat, lon, surface["pres"], month)
+    salinity, _ = climatology.lookup("salinity", lat, lon, surface["pres"], month)
+    if not np.isfinite(temp) or support > FILL_PASSES:
+        return None
+    return {
+        "month": month,
+        "cell_deg": climatology.cell_deg,
+        "profiles": climatology.cell_count("temperature", lat, lon, surface["pres"], month),
+        "surface_temp": round(float(temp), 2),
+        "surface_salinity": round(float(salinity), 2),
+        "temp_anomaly": round(surface["temp"] - float(temp), 2),
+    }
+
+def _compute_profile(query, query_lower, lat, lon, location_desc, climatology=None, trend=None, extremes=None):
+    """Profile, analysis text and derived quantities for a resolved query; the shareable part."""
+    month = _query_month(query_lower)
+    # Generate realistic oceanographic depth profile
+    with stage("generate_profile"):
+        rng = _build_rng(lat, lon, query_lower)
+        depths = generate_realistic_profile(lat, lon, query_lower, rng, climatology, month)
+
+    with stage("derived"):
+        derived = derive_levels(depths, lat, lon)
+        climate = _climate_context(climatology, lat, lon, month, depths)
+
+    # Advanced AI analysis with real oceanographic insights
+    with stage("analysis_text"):
+        explanation = generate_detailed_analysis(depths, location_desc, lat, lon, query, derived, climate, trend,
+                                                 extremes)
+    return depths, explanation, derived, climate
+
+@app.route("/query", methods=["GET", "POST", "OPTIONS"])
+@instrumented("query")
+@admitted("query")
 def handle_query():
     """Process oceanographic data queries"""
     if request.method == "OPTIONS":
         return jsonify({"status": "ok"})
         
     try:
-        # Parse request
-        data = request.get_json() or {}
-        query = data.get("query", "ocean data")
-        
-        print(f"📊 Processing: {query}")
-        
-        # Location mapping - no external calls
-        locations = {
-            "mumbai": (19.0760, 72.8777),
-            "india": (19.0760, 72.8777),  
-            "equator": (0.0, 78.0),
-            "pacific": (0.0, -140.0),
-            "atlantic": (0.0, -30.0),
-            "arabian": (15.0, 65.0),
-            "indian ocean": (0.0, 78.0)
-        }
+        # Parse request (GET ?query=... is cacheable by proxies)
+        data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+        query = data.get("query") or request.args.get("query") or request.args.get("q") or "ocean data"
+        try:
+            limit = parse_limit(data.get("limit", request.args.get("limit")))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        cursor = data.get("cursor") or request.args.get("cursor")
+        # Slim rows drop per-profile detail from observed profiles, in every representation
+        slim = str(data.get("slim", request.args.get("slim", ""))).lower() in ("1", "true", "yes")
+        try:
+            weights = parse_weights(data.get("weights") or request.args.get("weights"), BASE_WEIGHTS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        started = time.perf_counter()
+        bind(query_hash=query_hash(query), query_length=len(query))
+        log.info("query.received", extra={"sampled": True})
         
         # Find location: place name or coordinates
         query_lower = query.lower()
-        lat, lon = 0.0, 0.0
-        location_desc = "in the ocean"
+        with stage("parse_location"):
+            lat, lon, location_desc = _resolve_location(query_lower)
 
-        coord = _parse_location_from_query(query_lower)
-        if coord:
-            lat, lon = coord
-            location_desc = f"at {lat:.3f}°N, {lon:.3f}°E"
-        else:
-            for place, coords in locations.items():
-                if place in query_lower:
-                    lat, lon = coords
-                    location_desc = f"near {place.title()}"
-                    break
-            else:
-                # Random ocean location (deterministic per query)
-                rng = _build_rng(0, 0, query_lower)
-                lat = round(rng.uniform(-60, 60), 3)
-                lon = round(rng.uniform(-180, 180), 3)
-                location_desc = f"at {lat}°N, {lon}°E"
-        
-        # Generate realistic oceanographic depth profile
-        rng = _build_rng(lat, lon, query_lower)
-        depths = generate_realistic_profile(lat, lon, query_lower, rng)
+        with stage("infer_intent"):
+            intent = _infer_intent(query_lower)
         
-        # Advanced AI analysis with real oceanographic insights
-        explanation = generate_detailed_analysis(depths, location_desc, lat, lon, query)
+        # Representation: Accept / ?format= and Accept-Encoding
+        media_type = negotiate(request.headers.get("Accept"), request.args.get("format"))
+        if media_type is None:
+            return jsonify({"error": "Not acceptable", "available": available_media_types()}), 406
+        coding = choose_coding(request.headers.get("Accept-Encoding"))
+
+        flight_key = (normalize_query(query), round(lat, 4), round(lon, 4))
+        identity_key = flight_key + (datetime.now(timezone.utc).strftime("%Y-%m-%d"),)
+
+        # Observed profiles: a bounded candidate set (spatial neighbours + semantic hits)
+        # is scored; pages are (offset, limit) windows over its ranking
+        with stage("load_store"):
+            store = get_store()
+            engine = get_search(store) if store is not None else None
+            climatology = get_climatology(store) if store is not None else None
+        with stage("trend"):
+            trend = _trend_context(store, lat, lon, query_lower, intent)
+        located = _has_explicit_location(query_lower)
+        with stage("extremes"):
+            extremes = _extremes_context(store, climatology, lat, lon, located, query_lower, intent)
+        query_vector = engine.embed_query(query) if engine is not None else None
+        candidates = []
+        if store is not None and len(store):
+            with stage("candidates"):
+                candidates = candidate_set(store, lat, lon, located, engine, query_vector)
+        total = len(candidates)
+        version = store.version if store is not None else ""
+        weight_key = tuple(sorted(weights.items()))
+        fingerprint = format(_stable_hash(*flight_key, weight_key), "x")
+        offset = 0
+        if cursor:
+            try:
+                state = decode_cursor(cursor)
+            except CursorError as e:
+                return jsonify({"error": str(e)}), 400
+            if state.get("q") != fingerprint:
+                return jsonify({"error": "cursor was issued for a different query"}), 400
+            if state.get("v") != version:
+                return jsonify({"error": "cursor expired: the profile catalog has changed"}), 410
+            offset = int(state.get("o", 0))
+        page_size = max(0, min(limit, total - offset))
+        next_offset = offset + page_size
+        next_cursor = encode_cursor({"q": fingerprint, "o": next_offset, "v": version}) if next_offset < total else None
+        # Indexes built in the background change the body once ready, so they are part of the key
+        ready = (engine is not None, climatology is not None, extremes is not None)
+        request_key = identity_key + (media_type, coding, limit, offset, version, weight_key, ready, slim)
+
+        # Conditional request whose validator is still current: skip generation
+        if_none_match = request.headers.get("If-None-Match")
+        if DETERMINISTIC and etag_matches(if_none_match, QUERY_ETAGS.get(request_key)):
+            NOT_MODIFIED.inc(endpoint="query", validated="index")
+            log.info("query.not_modified", extra={"sampled": True})
+            not_modified = cache_headers(Response(status=304), QUERY_ETAGS.get(request_key))
+            return _pagination_headers(not_modified, query, limit, next_cursor, total, slim)
+
+        # The first page leads with the modelled profile and its analysis
+        head, depths, shared = [], [], False
+        if offset == 0:
+            # Identical concurrent queries share one computation
+            (depths, explanation, derived, climate), shared = QUERY_FLIGHTS.do(
+                flight_key,
+                lambda: _compute_profile(query, query_lower, lat, lon, location_desc, climatology, trend, extremes)
+            )
+            profile_id, profile_time = _profile_identity(identity_key)
+            head = [{
+                "profile_id": profile_id,
+                "lat": lat,
+                "lon": lon,
+                "time": profile_time,
+                "depth_levels": depths,
+                "derived": derived,
+                "climatology": climate,
+                "trend": trend,
+                "extremes": extremes,
+                "intent": intent,
+                "query_explain": explanation,
+                "source": "model",
+            }]
+
+        observed = iter(())
+        if page_size:
+            with stage("rank"):
+                indices, scores, distances, components = rank(
+                    store, candidates, lat, lon, intent, query_lower, offset, page_size,
+                    weights, located, engine, query_vector,
+                )
+            with stage("derived"):
+                page = store.subset(indices)
+                page_derived = derive_store(page)
+                anomalies = {v: climatology.anomalies(page, v) for v in climatology.variables} if climatology else {}
+            observed = (
+                store.profile(
+                    i,
+                    rank=offset + n + 1,
+                    score=round(float(scores[n]), 4),
+                    distance_km=round(float(distances[n]), 1),
+                    score_components={name: round(float(values[n]), 4) for name, values in components.items()},
+                    derived=profile_metrics(page_derived, n, page.offsets),
+                    climatology_anomaly={
+                        v: round(float(a[n]), 3) if np.isfinite(a[n]) else None for v, a in anomalies.items()
+                    } or None,
+                )
+                for n, i in enumerate(indices)
+            )
+            if slim:
+                observed = map(slim_profile, observed)
         
-        # Response format
-        response = [{
-            "profile_id": random.randint(1000, 9999),
+        with stage("serialize"):
+            if page_size > STREAM_THRESHOLD:
+                payload = _streamed_response(itertools.chain(head, observed), len(head) + page_size,
+                                             media_type, coding)
+                # Body isn't buffered, so validate on what determines it instead of its bytes
+                etag = f'W/"{_stable_hash(*request_key):016x}"' if DETERMINISTIC else None
+            else:
+                payload = _encoded_response(head + list(observed), media_type, coding)
+                etag = content_etag(payload.get_data()) if DETERMINISTIC else None
+            if etag:
+                QUERY_ETAGS.put(request_key, etag)
+            cache_headers(payload, etag)
+            _pagination_headers(payload, query, limit, next_cursor, total, slim)
+        if etag_matches(if_none_match, etag):
+            NOT_MODIFIED.inc(endpoint="query", validated="content")
+            return _pagination_headers(cache_headers(Response(status=304), etag), query, limit, next_cursor, total, slim)
+        log.info("query.completed", extra={
+            "sampled": True,
             "lat": lat,
             "lon": lon,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "depth_levels": depths,
-            "query_explain": explanation
-        }]
-        
-        print(f"✅ Returning profile with {len(depths)} depth levels")
-        return jsonify(response)
+            "mode": intent["mode"],
+            "depth_levels": len(depths),
+            "results": len(head) + page_size,
+            "offset": offset,
+            "streamed": payload.is_streamed,
+            "coalesced": shared,
+            "media_type": media_type,
+            "result_bytes": payload.content_length,
+            "latency_ms": round((time.perf_counter() - started) * 1e3, 3),
+        })
+        return payload
         
     except Exception as e:
+        ERRORS.inc(endpoint="query", exception=type(e).__name__)
         error_msg = f"Query processing error: {str(e)}"
-        print(f"❌ {error_msg}")
+        log.exception("query.failed", extra={"exception": type(e).__name__})
         return jsonify({"error": error_msg}), 500
 
+@app.route("/search", methods=["GET", "POST", "OPTIONS"])
+@instrumented("search")
+@admitted("search")
+def semantic_search():
+    """Semantic top-k search over observed profile summaries"""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    query = data.get("query") or request.args.get("query") or request.args.get("q")
+    if not query:
+        return jsonify({"error": "query is required"}), 400
+    try:
+        k = parse_limit(data.get("k", request.args.get("k")), name="k")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        nprobe = int(data.get("nprobe", request.args.get("nprobe", DEFAULT_NPROBE)))
+    except (TypeError, ValueError):
+        return jsonify({"error": "nprobe must be an integer"}), 400
+
+    started = time.perf_counter()
+    with stage("load_store"):
+        store = get_store()
+        engine = get_search(store)
+    if engine is None:
+        return jsonify({"error": "Semantic index unavailable (small catalogs build it in the background); "
+                                 "build it with: python api/semantic.py build"}), 503
+
+    with stage("semantic_search"):
+        ids, scores = engine.search(query, k, nprobe)
+    indices = [store.index_of(pid) for pid in ids]
+    summaries = profile_summaries(store.subset(indices))
+    results = [
+        {
+            "rank": n + 1,
+            "profile_id": int(pid),
+            "score": round(float(score), 4),
+            "lat": round(float(store.lat[i]), 4),
+            "lon": round(float(store.lon[i]), 4),
+            "time": str(store.times[i]).replace("T", " "),
+            "summary": summary,
+        }
+        for n, (pid, score, i, summary) in enumerate(zip(ids, scores, indices, summaries))
+    ]
+    took_ms = round((time.perf_counter() - started) * 1e3, 3)
+    log.info("search.completed", extra={"sampled": True, "results": len(results), "latency_ms": took_ms})
+    return jsonify({
+        "query": query,
+        "embedder": engine.embedder.name,
+        "nprobe": nprobe,
+        "took_ms": took_ms,
+        "results": results,
+    })
+
+@app.route("/profiles/similar", methods=["GET", "POST", "OPTIONS"])
+@instrumented("similar")
+@admitted("similar")
+def similar_profiles():
+    """Observed profiles whose temperature/salinity shape is closest to a reference profile.
+
+    The reference is a catalog ``profile_id``, explicit ``depth_levels`` (the
+    /query layout) or a ``query``, whose modelled profile is used.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    profile_id = data.get("profile_id", request.args.get("profile_id"))
+    depth_levels = data.get("depth_levels")
+    query = data.get("query") or request.args.get("query") or request.args.get("q")
+    try:
+        k = parse_limit(data.get("k", request.args.get("k")), name="k")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        nprobe = int(data.get("nprobe", request.args.get("nprobe", SHAPE_NPROBE)))
+        profile_id = int(profile_id) if profile_id is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "profile_id and nprobe must be integers"}), 400
+    if profile_id is None and not depth_levels and not query:
+        return jsonify({"error": "one of profile_id, depth_levels or query is required"}), 400
+
+    started = time.perf_counter()
+    with stage("load_store"):
+        store = get_store()
+        engine = get_shape_search(store)
+    if engine is None:
+        return jsonify({"error": "Shape index unavailable (small catalogs build it in the background); "
+                                 "build it with: python api/shape.py build"}), 503
+
+    if profile_id is not None:
+        vector = engine.vector_of(profile_id)
+        if vector is None:
+            return jsonify({"error": f"profile {profile_id} is not in the shape index"}), 404
+        reference = {"source": "observed", "profile_id": profile_id}
+    else:
+        if not depth_levels:
+            query_lower = query.lower()
+            lat, lon, location_desc = _resolve_location(query_lower)
+            with stage("generate_profile"):
+                depth_levels = generate_realistic_profile(lat, lon, query_lower, _build_rng(lat, lon, query_lower))
+            reference = {"source": "model", "query": query, "lat": lat, "lon": lon, "location": location_desc}
+        else:
+            reference = {"source": "request"}
+        try:
+            vector = levels_vector(depth_levels)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"error": f"invalid depth_levels: {e}"}), 400
+        reference["depth_levels"] = depth_levels
+
+    with stage("shape_search"):
+        ids, distances = engine.similar(vector, k, nprobe, exclude=profile_id)
+    results = [
+        store.profile(store.index_of(pid), rank=n + 1, distance=round(float(distance), 4))
+        for n, (pid, distance) in enumerate(zip(ids, distances))
+    ]
+    took_ms = round((time.perf_counter() - started) * 1e3, 3)
+    log.info("similar.completed", extra={"sampled": True, "results": len(results), "latency_ms": took_ms})
+    return jsonify({
+        "reference": reference,
+        "pressures": SHAPE_PRESSURES.tolist(),
+        "nprobe": nprobe,
+        "took_ms": took_ms,
+        "results": results,
+    })
+
+# Most profiles one /profiles/interpolate request may resample
+MAX_INTERPOLATE_PROFILES = int(os.getenv("FLOATCHAT_INTERPOLATE_MAX_PROFILES", "5000"))
+INTERPOLATE_VARIABLES = ("temperature", "salinity", "oxygen")
+
+def _id_list(value):
+    """Profile ids from a JSON list or a comma-separated string."""
+    items = value.split(",") if isinstance(value, str) else value
+    return [int(item) for item in items if str(item).strip()]
+
+def _json_grid(values, digits=4):
+    """Rows of a 2-D array as lists, NaN as null."""
+    grid = np.round(values, digits).astype(object)
+    grid[~np.isfinite(values)] = None
+    return grid.tolist()
+
+@app.route("/profiles/interpolate", methods=["GET", "POST", "OPTIONS"])
+@instrumented("interpolate")
+@admitted("interpolate")
+def interpolate_profiles_route():
+    """Profiles resampled onto one pressure grid, as aligned (profiles x pressures) arrays.
+
+    Profiles are catalog ``profile_ids``, caller-supplied ``profiles`` (each
+    with /query-style ``depth_levels``), or the catalog profiles within
+    ``radius_km`` of ``lat``/``lon``, oldest first.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+
+    def arg(name, default=None):
+        return data.get(name, request.args.get(name, default))
+
+    method = arg("method", "linear")
+    extrapolate = arg("extrapolate", "nan")
+    if method not in METHODS or extrapolate not in EXTRAPOLATE:
+        return jsonify({"error": f"method must be one of {list(METHODS)} "
+                                 f"and extrapolate one of {list(EXTRAPOLATE)}"}), 400
+    try:
+        variables = arg("variables", "temperature,salinity")
+        if not isinstance(variables, (str, list)):
+            raise TypeError("variables must be a comma-separated string or a list")
+        variables = [str(v).strip() for v in (variables.split(",") if isinstance(variables, str) else variables)]
+        pressures = parse_pressures(arg("pressures"))
+        max_gap = arg("max_gap")
+        max_gap = float(max_gap) if max_gap not in (None, "") else None
+        profile_ids = _id_list(arg("profile_ids") or [])
+        near = [float(arg(name)) for name in ("lat", "lon", "radius_km") if arg(name) not in (None, "")]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"invalid parameter: {e}"}), 400
+    if not variables or any(v not in INTERPOLATE_VARIABLES for v in variables):
+        return jsonify({"error": f"variables must be among {list(INTERPOLATE_VARIABLES)}"}), 400
+    supplied = data.get("profiles") or []
+    if not profile_ids and not supplied and len(near) != 3:
+        return jsonify({"error": "one of profile_ids, profiles or lat/lon/radius_km is required"}), 400
+    options = {"method": method, "max_gap": max_gap, "extrapolate": extrapolate}
+
+    started = time.perf_counter()
+    if supplied:
+        if len(supplied) > MAX_INTERPOLATE_PROFILES:
+            return jsonify({"error": f"at most {MAX_INTERPOLATE_PROFILES} profiles per request"}), 400
+        try:
+            depth, columns, offsets = levels_to_csr([p.get("depth_levels") or [] for p in supplied], variables)
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({"error": f"invalid profiles: {e}"}), 400
+        with stage("interpolate"):
+            grids = {v: interpolate_profiles(depth, columns[v], offsets, pressures, **options) for v in variables}
+        described = [{key: p.get(key) for key in ("profile_id", "lat", "lon", "time") if key in p} for p in supplied]
+    else:
+        with stage("load_store"):
+            store = get_store()
+        if store is None:
+            return jsonify({"error": "Profile catalog unavailable"}), 503
+        if profile_ids:
+            indices = store.indices_of(profile_ids)
+            missing = [pid for pid, i in zip(profile_ids, indices) if i < 0]
+            if missing:
+                return jsonify({"error": f"unknown profile_ids: {missing[:10]}"}), 404
+        else:
+            lat, lon, radius_km = near
+            indices = store.grid.within(lat, lon, radius_km)
+            indices = indices[haversine_km(lat, lon, store.lat[indices], store.lon[indices]) <= radius_km]
+            indices = indices[np.lexsort((indices, store.times[indices]))]
+        if len(indices) > MAX_INTERPOLATE_PROFILES:
+            return jsonify({"error": f"{len(indices)} profiles selected; at most {MAX_INTERPOLATE_PROFILES} "
+                                     "per request"}), 400
+        page = store.subset(indices)
+        with stage("interpolate"):
+            grids = interpolate_store(page, pressures, variables, **options)
+        described = [
+            {"profile_id": int(page.profile_ids[n]), "lat": round(float(page.lat[n]), 4),
+             "lon": round(float(page.lon[n]), 4), "time": str(page.times[n]).replace("T", " ")}
+            for n in range(len(page))
+        ]
+
+    with stage("serialize"):
+        took_ms = round((time.perf_counter() - started) * 1e3, 3)
+        payload = _compressed(jsonify({
+            "pressures": pressures.tolist(),
+            **options,
+            "profiles": described,
+            "values": {v: _json_grid(grid) for v, grid in grids.items()},
+            "took_ms": took_ms,
+        }))
+    log.info("interpolate.completed", extra={"sampled": True, "profiles": len(described), "latency_ms": took_ms})
+    return payload
+
+@app.route("/trends", methods=["GET", "POST", "OPTIONS"])
+@instrumented("trends")
+@admitted("trends")
+def trends_route():
+    """Monthly series, running mean, trend with 95% interval and seasonal decomposition
+    of ``variable`` averaged over a depth ``band`` within ``radius_km`` of ``lat``/``lon``
+    (or of the place a ``query`` names)."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+
+    def arg(name, default=None):
+        return data.get(name, request.args.get(name, default))
+
+    query_lower = (arg("query") or "").lower()
+    variable = arg("variable")
+    if not variable:
+        primary = _infer_intent(query_lower)["primary"]
+        variable = primary if primary in TREND_VARIABLES else "temperature"
+    if variable not in TREND_VARIABLES:
+        return jsonify({"error": f"variable must be one of {list(TREND_VARIABLES)}"}), 400
+    try:
+        if arg("lat") not in (None, "") and arg("lon") not in (None, ""):
+            lat, lon = float(arg("lat")), float(arg("lon"))
+        elif query_lower:
+            lat, lon, _ = _resolve_location(query_lower)
+        else:
+            return jsonify({"error": "lat/lon or query is required"}), 400
+        radius_km = float(arg("radius_km") or TREND_RADIUS_KM)
+        band = parse_band(arg("band")) if arg("band") or not query_lower else _query_band(query_lower, parse_band(None))
+        window = int(arg("window") or DEFAULT_WINDOW)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"invalid parameter: {e}"}), 400
+    if not (-90 <= lat <= 90) or radius_km <= 0 or window < 1:
+        return jsonify({"error": "lat must be within ±90, radius_km and window positive"}), 400
+
+    with stage("load_store"):
+        store = get_store()
+    if store is None:
+        return jsonify({"error": "Profile catalog unavailable"}), 503
+    started = time.perf_counter()
+    with stage("trend"):
+        result = analyse(store, lat, lon, radius_km, variable, band, window)
+    took_ms = round((time.perf_counter() - started) * 1e3, 3)
+    with stage("serialize"):
+        payload = _compressed(jsonify({**result, "took_ms": took_ms}))
+    log.info("trends.completed", extra={"sampled": True, "profiles": result["profiles"], "latency_ms": took_ms})
+    return payload
+
+@app.route("/extremes", methods=["GET", "POST", "OPTIONS"])
+@instrumented("extremes")
+@admitted("extremes")
+def extremes_route():
+    """Top-k highest (``kind=max``), lowest (``min``) or most anomalous (``anomaly``) observed
+    profiles for ``variable``, optionally within ``radius_km`` of ``lat``/``lon``, between
+    ``start`` and ``end`` days and inside a depth ``band``."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+
+    def arg(name, default=None):
+        return data.get(name, request.args.get(name, default))
+
+    variable = arg("variable", "temperature")
+    kind = arg("kind", "max")
+    if variable not in EXTREME_VARIABLES or kind not in EXTREME_KINDS:
+        return jsonify({"error": f"variable must be one of {list(EXTREME_VARIABLES)} "
+                                 f"and kind one of {list(EXTREME_KINDS)}"}), 400
+    try:
+        k = int(arg("k", 10))
+        lat, lon, radius_km = None, None, None
+        if arg("lat") not in (None, "") and arg("lon") not in (None, ""):
+            lat, lon = float(arg("lat")), float(arg("lon"))
+            radius_km = float(arg("radius_km") or EXTREMES_RADIUS_KM)
+        period = None
+        if arg("start") or arg("end"):
+            period = (np.datetime64(arg("start") or "1900-01-01", "D"), np.datetime64(arg("end") or "2100-12-31", "D"))
+        band = parse_band(arg("band")) if arg("band") else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"invalid parameter: {e}"}), 400
+    if not 1 <= k <= MAX_EXTREMES:
+        return jsonify({"error": f"k must be between 1 and {MAX_EXTREMES}"}), 400
+
+    with stage("load_store"):
+        store = get_store()
+        index = get_extremes(store) if store is not None else None
+        climatology = get_climatology(store) if store is not None and kind == "anomaly" else None
+    if index is None:
+        return jsonify({"error": "Extremes index unavailable (small catalogs build it in the background); "
+                                 "build it with: python api/extremes.py build"}), 503
+    started = time.perf_counter()
+    try:
+        with stage("extremes"):
+            found, values, depths, distances, stats = _find_extremes(
+                store, index, climatology, variable, kind, k, lat, lon, radius_km, period, band)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    took_ms = round((time.perf_counter() - started) * 1e3, 3)
+    with stage("serialize"):
+        payload = _compressed(jsonify({
+            "variable": variable,
+            "kind": kind,
+            "units": UNITS[variable],
+            "period": [str(day) for day in period] if period is not None else None,
+            "band": list(band) if band else None,
+            "stats": stats,
+            "took_ms": took_ms,
+            "results": [
+                store.profile(i, rank=n + 1, value=round(float(value), 3), depth=depth,
+                              distance_km=round(float(distance), 1) if distance is not None else None)
+                for n, (i, value, depth, distance) in enumerate(zip(found, values, depths, distances))
+            ],
+        }))
+    log.info("extremes.completed", extra={"sampled": True, "kind": kind, "latency_ms": took_ms, **stats})
+    return payload
+
+def _period_label(period):
+    first, last = period
+    if first == last:
+        return str(first)
+    if _period_month(period) is not None:
+        return f"{MONTH_NAMES[_period_month(period) - 1]} {str(first)[:4]}"
+    if str(first)[5:] == "01-01" and str(last)[5:] == "12-31" and str(first)[:4] == str(last)[:4]:
+        return str(first)[:4]
+    return f"{first} to {last}"
+
+def _compare_subjects(query_lower):
+    """Subjects of a comparison query: two or more locations (sharing any one period named),
+    or one location across two or more periods. Each is {label, lat, lon, period}."""
+    locations = _parse_locations_from_query(query_lower)
+    periods = parse_periods_from_query(query_lower)
+    if len(locations) >= 2:
+        period = periods[0] if len(periods) == 1 else None
+        return [{"label": desc, "lat": lat, "lon": lon, "period": period} for lat, lon, desc in locations]
+    if len(periods) >= 2:
+        lat, lon, desc = locations[0] if locations else _resolve_location(query_lower)
+        return [{"label": f"{desc}, {_period_label(period)}", "lat": lat, "lon": lon, "period": period}
+                for period in periods]
+    return []
+
+def _compare_one(subject, query_lower, store, climatology, radius_km):
+    """Modelled profile, observed composite and aligned values of one comparison subject."""
+    lat, lon, period = subject["lat"], subject["lon"], subject["period"]
+    month = _period_month(period) or _query_month(query_lower)
+    with stage("generate_profile"):
+        # One seed per location: subjects at the same place share the modelled noise
+        rng = _build_rng(lat, lon, query_lower)
+        depths = generate_realistic_profile(lat, lon, query_lower, rng, climatology, month)
+        derived = derive_levels(depths, lat, lon)
+    with stage("composite"):
+        observed = composite(store, lat, lon, radius_km, period) if store is not None and len(store) else None
+    return {
+        "label": subject["label"],
+        "lat": lat,
+        "lon": lon,
+        "period": [str(day) for day in period] if period is not None else None,
+        "observed_profiles": observed["profiles"] if observed else 0,
+        "depth_levels": depths,
+        "derived": derived,
+        "model": align_levels(depths),
+        "observed": {"mean": observed["mean"], "std": observed["std"]} if observed else None,
+    }
+
+def _comparison_summary(results, diffs, basis, radius_km):
+    """Markdown summary of a comparison against its first subject."""
+    reference = results[0]
+    lines = [f"🌊 **Comparison: {' vs '.join(r['label'] for r in results)}**", ""]
+    for r in results:
+        lines.append(f"* **{r['label']}**: {r['observed_profiles']} observed profiles within {radius_km:g} km")
+    lines.append("")
+    if basis == "observed":
+        lines.append("Differences use the mean observed profiles.")
+    elif diffs:
+        lines.append("Not every subject has nearby observations, so differences use the modelled profiles.")
+    else:
+        lines.append("No observations for every time window at this location; the modelled profiles do "
+                     "not change between periods, so no differences are reported.")
+    lines.append("")
+    for diff in diffs:
+        subject = results[diff["subject"]]
+        parts = []
+        for variable, units in (("temperature", "°C"), ("salinity", "PSU")):
+            d = diff[variable]
+            if d:
+                parts.append(f"{variable} {d['mean']:+.2f} {units} on average (RMS {d['rms']:.2f}, largest "
+                             f"{d['max_abs']:+.2f} {units} at {d['max_abs_pressure']:g} dbar)")
+        mld, ref_mld = subject["derived"].get("mld"), reference["derived"].get("mld")
+        if mld is not None and ref_mld is not None:
+            parts.append(f"modelled mixed layer {round(mld - ref_mld):+d} m")
+        lines.append(f"**{subject['label']}** vs **{reference['label']}**: "
+                     + ("; ".join(parts) if parts else "no overlapping levels") + ".")
+    return "\n".join(lines)
+
+@app.route("/compare", methods=["GET", "POST", "OPTIONS"])
+@instrumented("compare")
+@admitted("compare")
+def compare_route():
+    """Two or more locations or time windows evaluated concurrently and aligned on one
+    pressure grid, with differences against the first.
+
+    Subjects come from a ``query`` ("Compare lat=10, lon=60 and lat=-43, long=130",
+    "Mumbai in 2019 vs 2023") or an explicit ``subjects`` list of
+    {lat, lon, label?, start?, end?}.
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    query = data.get("query") or request.args.get("query") or request.args.get("q") or ""
+    query_lower = query.lower()
+    try:
+        radius_km = float(data.get("radius_km", request.args.get("radius_km")) or COMPARE_RADIUS_KM)
+        if data.get("subjects"):
+            subjects = []
+            for n, item in enumerate(data["subjects"]):
+                lat, lon = float(item["lat"]), float(item["lon"])
+                period = None
+                if item.get("start") or item.get("end"):
+                    period = (np.datetime64(item.get("start") or "1900-01-01", "D"),
+                              np.datetime64(item.get("end") or "2100-12-31", "D"))
+                label = item.get("label") or f"at {lat:.3f}°N, {lon:.3f}°E" + (
+                    f", {_period_label(period)}" if period is not None else "")
+                subjects.append({"label": label, "lat": lat, "lon": lon, "period": period})
+        else:
+            subjects = _compare_subjects(query_lower)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"invalid parameter: {e}"}), 400
+    if len(subjects) < 2:
+        return jsonify({"error": "name at least two locations or time windows to compare"}), 400
+    if len(subjects) > MAX_SUBJECTS or radius_km <= 0:
+        return jsonify({"error": f"at most {MAX_SUBJECTS} subjects and a positive radius_km"}), 400
+    if any(not (-90 <= s["lat"] <= 90) for s in subjects):
+        return jsonify({"error": "lat must be within ±90"}), 400
+
+    started = time.perf_counter()
+    with stage("load_store"):
+        store = get_store()
+        climatology = get_climatology(store) if store is not None else None
+    with stage("evaluate"):
+        results = evaluate(lambda subject: _compare_one(subject, query_lower, store, climatology, radius_km),
+                           subjects)
+    # Like for like: observed means only when every subject has observations
+    basis = "observed" if all(r["observed"] for r in results) else "model"
+    # Time windows at one place differ only in what was observed; without observations
+    # the modelled profiles would only compare climatology months and noise
+    same_place = len({(s["lat"], s["lon"]) for s in subjects}) == 1
+    if basis == "model" and same_place:
+        diffs = []
+    else:
+        diffs = differences([r["observed"]["mean"] if basis == "observed" else r["model"] for r in results])
+    with stage("serialize"):
+        for r in results:
+            r["model"] = {v: _json_grid(values) for v, values in r["model"].items()}
+            if r["observed"]:
+                r["observed"] = {stat: {v: _json_grid(values) for v, values in grids.items()}
+                                 for stat, grids in r["observed"].items()}
+        took_ms = round((time.perf_counter() - started) * 1e3, 3)
+        payload = _compressed(jsonify({
+            "pressures": COMPARE_PRESSURES.tolist(),
+            "radius_km": radius_km,
+            "basis": basis,
+            "subjects": results,
+            "differences": diffs,
+            "summary": _comparison_summary(results, diffs, basis, radius_km),
+            "took_ms": took_ms,
+        }))
+    log.info("compare.completed", extra={"sampled": True, "subjects": len(results), "latency_ms": took_ms})
+    return payload
+
+@app.route("/export", methods=["GET", "POST", "OPTIONS"])
+@instrumented("export")
+@admitted("export")
+def export_route():
+    """Rows of the profiles table matching ``start``/``end``, ``depth_min``/``depth_max``,
+    ``float_ids``, a ``lat_min``..``lon_max`` box or ``lat``/``lon``/``radius_km``, streamed
+    as ``format`` = csv, parquet or netcdf in constant memory."""
+    if request.method == "OPTIONS":
+        return jsonify({"status": "ok"})
+
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+
+    def arg(name, default=None):
+        return data.get(name, request.args.get(name, default))
+
+    fmt = arg("format", "csv")
+    if fmt not in available_formats():
+        return jsonify({"error": f"format must be one of {available_formats()}"}), 400
+    if not os.path.exists(DB_PATH):
+        return jsonify({"error": "no observed catalog to export"}), 503
+    try:
+        filters = parse_filters(arg)
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            plan = plan_export(conn, filters)
+        finally:
+            conn.close()
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"invalid parameter: {e}"}), 400
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    # Parquet is compressed per column chunk already
+    coding = choose_coding(request.headers.get("Accept-Encoding")) if fmt != "parquet" else None
+    log.info("export.started", extra={"format": fmt, "columns": len(plan["columns"]), "where": plan["where"]})
+    payload = Response(stream_compress(export_stream(DB_PATH, fmt, plan), coding), mimetype=media_type)
+    if coding:
+        payload.headers["Content-Encoding"] = coding
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    payload.headers["Content-Disposition"] = f'attachment; filename="floatchat-{stamp}.{extension}"'
+    return payload
+
+@app.route("/export/formats", methods=["GET"])
+def export_formats_route():
+    """Export formats this deployment can write (Parquet needs pyarrow)."""
+    return jsonify({"formats": available_formats()})
+
+def _warm_up():
+    """Load the catalog and open or build its indexes before the first request needs them."""
+    store = get_store()
+    if store is None:
+        return
+    for name, get_index in (("climatology", get_climatology), ("extremes", get_extremes),
+                            ("semantic", get_search), ("shape", get_shape_search)):
+        started = time.perf_counter()
+        ready = get_index(store, wait=True) is not None
+        log.info("warmup.index", extra={"index": name, "ready": ready,
+                                        "latency_ms": round((time.perf_counter() - started) * 1e3, 1)})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/", methods=["GET"])
 def health_check():
     """API health status"""
@@ -330,6 +1330,12 @@ if __name__ == "__main__":
     print("🌊 FloatChat Oceanographic API")
     print("🚀 Starting server at http://localhost:5000")
     print("📊 Ready for ocean data queries!")
+    print(f"🗂️ Loading observed profiles from {DB_PATH}")
+    threading.Thread(target=_warm_up, name="warmup", daemon=True).start()
+    print(f"🧊 Deterministic responses: {'on (ETag/304)' if DETERMINISTIC else 'off'}")
+    print(f"🚦 Admission control: {handle_query.limiter.limit} concurrent, queue {handle_query.limiter.max_queue}")
+    if app.wsgi_app.__class__.__name__ == "ProfilingMiddleware":
+        print("🔬 Request profiling enabled: /debug/profiles")
     print()
     
     # Start server
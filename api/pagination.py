@@ -0,0 +1,72 @@
+"""
+Opaque, tamper-evident cursors for paginated results.
+
+A cursor is URL-safe base64 of a small JSON document plus an HMAC over
+it, so clients can only hand back cursors the server issued. The key is
+FLOATCHAT_CURSOR_SECRET; without it a per-process key is generated and
+cursors are valid only against the process that issued them.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+
+DEFAULT_LIMIT = int(os.getenv("FLOATCHAT_DEFAULT_LIMIT", "10"))
+MAX_LIMIT = int(os.getenv("FLOATCHAT_MAX_LIMIT", "1000"))
+
+_SECRET = (os.getenv("FLOATCHAT_CURSOR_SECRET") or secrets.token_hex(32)).encode("utf-8")
+_SIG_BYTES = 12
+
+
+class CursorError(ValueError):
+    """A cursor that is malformed, forged or issued for another query."""
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def encode_cursor(state):
+    body = json.dumps(state, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    sig = hmac.new(_SECRET, body, hashlib.sha256).digest()[:_SIG_BYTES]
+    return _b64(sig + body)
+
+
+def decode_cursor(token):
+    try:
+        raw = _unb64(token)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("malformed cursor") from exc
+    sig, body = raw[:_SIG_BYTES], raw[_SIG_BYTES:]
+    if not hmac.compare_digest(sig, hmac.new(_SECRET, body, hashlib.sha256).digest()[:_SIG_BYTES]):
+        raise CursorError("invalid cursor")
+    try:
+        return json.loads(body)
+    except ValueError as exc:
+        raise CursorError("malformed cursor") from exc
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, name="limit"):
+    """Requested page size, capped at MAX_LIMIT; ``default`` when not given.
+
+    Raises ValueError for anything but a positive integer.
+    """
+    if value is None or value == "":
+        return default
+    error = ValueError(f"{name} must be a positive integer")
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise error
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise error from None
+    if limit < 1:
+        raise error
+    return min(limit, MAX_LIMIT)
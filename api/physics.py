@@ -0,0 +1,100 @@
+"""
+Regional ocean model behind the modelled profiles.
+
+Shared by ``generate_realistic_profile`` in main.py, one profile at a
+time, and the synthetic dataset generator (ingestion/synthetic.py),
+vectorized over millions of profiles. Every function takes scalars or
+NumPy arrays.
+
+Surface temperature, salinity and thermocline strength come from the
+latitude band. The Arabian Sea is warmer and saltier from evaporation.
+Pacific variability and equatorial freshening apply only when asked for,
+as a query naming the Pacific does. Below the surface the column has a
+mixed layer, a thermocline and deep water.
+"""
+
+import numpy as np
+
+STANDARD_PRESSURES = [5, 15, 30, 50, 75, 100, 125, 150]
+DETAILED_PRESSURES = [5, 10, 15, 25, 35, 50, 65, 80, 100, 125, 150]
+
+# Upper |lat|, surface temperature range (°C), surface salinity range (PSU), thermocline strength
+LATITUDE_BANDS = [
+    (10, 26, 29, 34.5, 35.5, 0.18),  # Tropical: strong thermocline
+    (30, 22, 27, 35.0, 36.5, 0.14),  # Subtropical
+    (50, 15, 22, 34.0, 35.5, 0.10),  # Temperate
+    (90, 2, 10, 33.5, 34.5, 0.06),  # Polar/Subpolar
+]
+
+MIXED_LAYER_BASE = 20  # dbar
+THERMOCLINE_BASE = 100  # dbar
+DEEP_LAPSE = 0.02  # °C per dbar below the thermocline
+MIN_TEMPERATURE = 1.5
+SALINITY_BOUNDS = (32.0, 37.5)
+
+
+def in_arabian_sea(lat, lon):
+    return (50 < lon) & (lon < 80) & (10 < lat) & (lat < 25)
+
+
+def in_pacific(lon):
+    return (-180 < lon) & (lon < -80)
+
+
+def _band(abs_lat, column):
+    conditions = [abs_lat <= band[0] for band in LATITUDE_BANDS[:-1]]
+    values = [band[column] for band in LATITUDE_BANDS]
+    return np.select(conditions, values[:-1], values[-1])
+
+
+def surface_conditions(lat, lon, uniform, arabian=False, pacific=False):
+    """(surface temperature, surface salinity, thermocline strength).
+
+    ``uniform(lo, hi)`` draws the noise: one value, or one per profile.
+    ``arabian`` / ``pacific`` apply those adjustments regardless of
+    position (a query naming the sea); the Arabian Sea box always gets its
+    own, the Pacific only within ``pacific``.
+    """
+    abs_lat = np.abs(lat)
+    surface_temp = uniform(_band(abs_lat, 1), _band(abs_lat, 2))
+    surface_salinity = uniform(_band(abs_lat, 3), _band(abs_lat, 4))
+    strength = _band(abs_lat, 5)
+
+    arabian = arabian | in_arabian_sea(lat, lon)
+    if np.any(arabian):
+        surface_temp = surface_temp + arabian * uniform(0.5, 2.0)
+        surface_salinity = surface_salinity + arabian * uniform(0.3, 0.8)
+    pacific = pacific & np.logical_not(arabian) & in_pacific(lon)
+    if np.any(pacific):
+        surface_temp = surface_temp + pacific * uniform(-1.0, 1.0)
+        equatorial = pacific & (lat < 10)
+        if np.any(equatorial):
+            surface_salinity = surface_salinity - equatorial * uniform(0.2, 0.5)
+    return surface_temp, surface_salinity, strength
+
+
+def temperature_noise(pressure):
+    """Half-width of the level temperature noise."""
+    return np.where(pressure <= MIXED_LAYER_BASE, 0.5, np.where(pressure <= THERMOCLINE_BASE, 0.8, 0.5))
+
+
+def salinity_noise(pressure):
+    """Half-width of the level salinity noise."""
+    return np.where(pressure <= 30, 0.1, np.where(pressure <= 80, 0.15, 0.2))
+
+
+def level_temperature(surface_temp, strength, pressure, noise):
+    """Mixed layer, thermocline and deep water, floored at MIN_TEMPERATURE."""
+    thermocline_drop = strength * (THERMOCLINE_BASE - MIXED_LAYER_BASE)
+    temp = np.where(
+        pressure <= MIXED_LAYER_BASE, surface_temp,
+        np.where(pressure <= THERMOCLINE_BASE,
+                 surface_temp - thermocline_drop * (pressure - MIXED_LAYER_BASE) / (THERMOCLINE_BASE - MIXED_LAYER_BASE),
+                 surface_temp - thermocline_drop - (pressure - THERMOCLINE_BASE) * DEEP_LAPSE))
+    return np.maximum(temp + noise, MIN_TEMPERATURE)
+
+
+def level_salinity(surface_salinity, pressure, noise):
+    """Surface layer, subsurface maximum and deep water, within SALINITY_BOUNDS."""
+    offset = np.where(pressure <= 30, 0.0, np.where(pressure <= 80, 0.1, -0.05))
+    return np.clip(surface_salinity + offset + noise, *SALINITY_BOUNDS)
@@ -0,0 +1,174 @@
+"""
+Opt-in request profiling.
+
+Enabled with FLOATCHAT_PROFILING=1 (profile requests that send an
+``X-FloatChat-Profile: 1`` header) and/or FLOATCHAT_PROFILE_SAMPLE_RATE
+(fraction of all requests to profile). Profiled requests run under
+cProfile; the pstats dumps are kept in a bounded directory and can be
+listed and downloaded from /debug/profiles. When neither setting is on
+nothing is registered, so the normal request path is untouched.
+
+Open a profile with ``python -m pstats <file>`` or ``snakeviz <file>``.
+"""
+
+import cProfile
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+from flask import abort, jsonify, send_from_directory
+
+PROFILE_HEADER = "X-FloatChat-Profile"
+PROFILE_DIR = os.getenv("FLOATCHAT_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+MAX_PROFILES = int(os.getenv("FLOATCHAT_PROFILE_KEEP", "50"))
+SAMPLE_RATE = float(os.getenv("FLOATCHAT_PROFILE_SAMPLE_RATE", "0"))
+ON_DEMAND = os.getenv("FLOATCHAT_PROFILING", "0") == "1"
+
+_SAFE = re.compile(r"[^a-zA-Z0-9_.-]+")
+_SEQUENCE = itertools.count(1)
+_PROFILER_BUSY = threading.Lock()
+
+
+class ProfiledBody:
+    """Response iterable that keeps profiling until the server closes it, so
+    streamed bodies are measured and the wrapped iterable is still closed."""
+
+    def __init__(self, body, finish):
+        self._body = body
+        self._finish = finish
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._finish()
+
+
+class ProfilingMiddleware:
+    """WSGI middleware running selected requests under cProfile."""
+
+    def __init__(self, wsgi_app, directory=PROFILE_DIR, keep=MAX_PROFILES, sample_rate=SAMPLE_RATE,
+                 on_demand=ON_DEMAND):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.on_demand = on_demand
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _wanted(self, environ):
+        if self.on_demand and environ.get("HTTP_X_FLOATCHAT_PROFILE") == "1":
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path.startswith("/debug/profiles") or not self._wanted(environ):
+            return self.wsgi_app(environ, start_response)
+
+        name = "{}-{:06d}-{}-{}.prof".format(
+            time.strftime("%Y%m%dT%H%M%S"), next(_SEQUENCE), environ.get("REQUEST_METHOD", "GET"),
+            _SAFE.sub("_", path.strip("/")) or "root",
+        )
+
+        def profiled_start_response(status, headers, exc_info=None):
+            headers.append(("X-FloatChat-Profile-Id", name))
+            return start_response(status, headers, exc_info)
+
+        # cProfile allows one active profiler per process (3.12+ raises ValueError
+        # otherwise), so a request arriving while another is profiled runs unprofiled.
+        if not _PROFILER_BUSY.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            _PROFILER_BUSY.release()
+            return self.wsgi_app(environ, start_response)
+
+        def finish():
+            try:
+                profiler.disable()
+                self._save(profiler, name, (time.perf_counter() - started) * 1e3)
+            finally:
+                _PROFILER_BUSY.release()
+
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            finish()
+            raise
+        return ProfiledBody(body, finish)
+
+    def _save(self, profiler, filename, elapsed_ms):
+        path = os.path.join(self.directory, filename)
+        profiler.dump_stats(path)
+        # pstats dumps carry no wall time, so keep it in a sidecar for the listing.
+        with open(path + ".ms", "w") as fh:
+            fh.write(f"{elapsed_ms:.3f}")
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            # Names start with a timestamp and sequence number, so they sort by age.
+            profiles = sorted(f for f in os.listdir(self.directory) if f.endswith(".prof"))
+            for stale in profiles[:-self.keep] if self.keep else profiles:
+                for suffix in ("", ".ms"):
+                    try:
+                        os.remove(os.path.join(self.directory, stale + suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+def list_profiles(directory=PROFILE_DIR):
+    """Newest-first metadata for stored profiles."""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for filename in os.listdir(directory):
+        if not filename.endswith(".prof"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path + ".ms") as fh:
+                elapsed_ms = float(fh.read())
+        except (OSError, ValueError):
+            elapsed_ms = None
+        entries.append({
+            "name": filename,
+            "bytes": os.path.getsize(path),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(path))),
+            "elapsed_ms": elapsed_ms,
+        })
+    return sorted(entries, key=lambda e: e["name"], reverse=True)
+
+
+def register_profiling(app):
+    """Install the middleware and /debug/profiles routes if profiling is enabled."""
+    if not (ON_DEMAND or SAMPLE_RATE > 0):
+        return False
+
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+
+    @app.route("/debug/profiles", methods=["GET"])
+    def debug_profiles():
+        """List recent request profiles"""
+        return jsonify(list_profiles())
+
+    @app.route("/debug/profiles/<name>", methods=["GET"])
+    def debug_profile_download(name):
+        """Download one pstats dump"""
+        if not name.endswith(".prof") or _SAFE.sub("", name) != name:
+            abort(404)
+        return send_from_directory(PROFILE_DIR, name, as_attachment=True)
+
+    return True
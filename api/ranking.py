@@ -0,0 +1,199 @@
+"""
+Hybrid ranking of observed profiles against a parsed query.
+
+Ranking runs in two stages:
+
+1. Candidates. The ``CANDIDATES`` profiles nearest the resolved location
+   (from the store's spatial grid), plus the ``SEMANTIC_CANDIDATES`` best
+   semantic matches when a semantic index is available. Only this bounded
+   set is scored, however large the catalog is.
+2. Scoring. Each candidate gets a weighted sum of components in [0, 1]:
+
+   * ``semantic``  - cosine similarity of the query and profile summary
+     embeddings (see semantic.py), clipped at 0
+   * ``spatial``   - exp(-distance_km / SPATIAL_SCALE_KM)
+   * ``temporal``  - 1 inside the period named in the query ("in 2025",
+     "march 2024", "2024-03-15"), decaying with days outside it; recency
+     against the newest profile when no period is named
+   * ``variables`` - share of levels with a value for the asked-about
+     variable, blended with level count for "detailed" queries
+
+Weights default to DEFAULT_WEIGHTS, can be overridden with
+FLOATCHAT_RANK_WEIGHTS ("semantic=0.4,spatial=0.3,...") or per request, and
+are renormalized over the components that are available (no semantic
+index, or no location in the query, drops that component).
+
+Only the top ``offset + limit`` candidates are ordered (argpartition).
+"""
+
+import os
+import re
+
+import numpy as np
+
+from spatial import haversine_km
+
+SPATIAL_SCALE_KM = 500.0
+TEMPORAL_SCALE_DAYS = 90.0
+RECENCY_SCALE_DAYS = 365.0
+CANDIDATES = int(os.getenv("FLOATCHAT_RANK_CANDIDATES", "5000"))
+SEMANTIC_CANDIDATES = int(os.getenv("FLOATCHAT_RANK_SEMANTIC_CANDIDATES", "1000"))
+COMPONENTS = ("semantic", "spatial", "temporal", "variables")
+DEFAULT_WEIGHTS = {"semantic": 0.3, "spatial": 0.4, "temporal": 0.15, "variables": 0.15}
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+VARIABLE_COLUMNS = {"temperature": "temperature", "salinity": "salinity", "oxygen": "oxygen"}
+
+
+def parse_weights(spec, base=None):
+    """Weights from a "name=value,..." string or a dict, on top of ``base``; unknown names ignored."""
+    weights = dict(base or DEFAULT_WEIGHTS)
+    if not spec:
+        return weights
+    items = spec.items() if isinstance(spec, dict) else (
+        part.replace(":", "=").split("=", 1) for part in str(spec).split(",") if "=" in part or ":" in part)
+    for name, value in items:
+        name = str(name).strip().lower()
+        if name in COMPONENTS:
+            try:
+                weights[name] = max(0.0, float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid weight for {name!r}: {value!r}")
+    return weights
+
+
+BASE_WEIGHTS = parse_weights(os.getenv("FLOATCHAT_RANK_WEIGHTS"))
+
+
+def parse_period_from_query(query_lower):
+    """Period named in the query as (first_day, last_day) datetime64[D], or None."""
+    m = re.search(r"\b((?:19|20)\d{2})-(\d{2})-(\d{2})\b", query_lower)
+    if m:
+        try:
+            day = np.datetime64(m.group(0), "D")
+            return day, day
+        except ValueError:
+            pass
+    year = re.search(r"\b((?:19|20)\d{2})\b", query_lower)
+    if not year:
+        return None
+    month = next((i for i, name in enumerate(MONTHS, 1)
+                  if re.search(rf"\b{name}\b|\b{name[:3]}\b", query_lower)), None)
+    if month:
+        first = np.datetime64(f"{year.group(1)}-{month:02d}", "M")
+    else:
+        first = np.datetime64(year.group(1), "Y").astype("datetime64[M]")
+    last = first + (1 if month else 12)
+    return first.astype("datetime64[D]"), last.astype("datetime64[D]") - 1
+
+
+def parse_periods_from_query(query_lower):
+    """Every period named in the query, in order: ISO dates, else "[month] year" mentions."""
+    days = []
+    for m in re.finditer(r"\b((?:19|20)\d{2})-(\d{2})-(\d{2})\b", query_lower):
+        try:
+            day = np.datetime64(m.group(0), "D")
+        except ValueError:
+            continue
+        days.append((day, day))
+    if days:
+        return days
+    names = "|".join(MONTHS + [name[:3] for name in MONTHS])
+    periods = []
+    for m in re.finditer(rf"(?:\b({names})\s+)?\b((?:19|20)\d{{2}})\b", query_lower):
+        month = next((i for i, name in enumerate(MONTHS, 1) if m.group(1) in (name, name[:3])), None)
+        if month:
+            first = np.datetime64(f"{m.group(2)}-{month:02d}", "M")
+        else:
+            first = np.datetime64(m.group(2), "Y").astype("datetime64[M]")
+        last = first + (1 if month else 12)
+        periods.append((first.astype("datetime64[D]"), last.astype("datetime64[D]") - 1))
+    return periods
+
+
+def candidate_set(store, lat, lon, located=True, semantic=None, query_vector=None):
+    """Sorted catalog indices to score: spatial neighbours (if located) plus semantic hits."""
+    parts = []
+    if located or semantic is None:
+        parts.append(store.grid.nearest(lat, lon, min(CANDIDATES, len(store))))
+    if semantic is not None and query_vector is not None:
+        ids, _ = semantic.index.search(query_vector, SEMANTIC_CANDIDATES)
+        hits = store.indices_of(ids)
+        parts.append(hits[hits >= 0])
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts))
+
+
+def _variable_coverage(sub, column):
+    """Fraction of levels with a value for ``column``, per profile of ``sub``."""
+    present = np.concatenate([[0], np.cumsum(~np.isnan(sub.levels[column]))])
+    return np.diff(present[sub.offsets]) / np.maximum(sub.n_levels, 1)
+
+
+def score_candidates(store, candidates, lat, lon, intent, target_period=None, weights=None,
+                     located=True, semantic=None, query_vector=None):
+    """(scores, distances_km, components) for the given candidate indices."""
+    weights = dict(weights or BASE_WEIGHTS)
+    sub = store.subset(candidates)
+    components = {}
+
+    distance = haversine_km(lat, lon, sub.lat, sub.lon)
+    components["spatial"] = np.exp(-distance / SPATIAL_SCALE_KM)
+    if not located:
+        weights["spatial"] = 0.0
+
+    days = sub.times.astype("datetime64[s]").astype(np.int64) / 86400.0
+    if target_period is not None:
+        first, last = (t.astype("datetime64[s]").astype(np.int64) / 86400.0 for t in target_period)
+        outside = np.maximum(first - days, 0.0) + np.maximum(days - (last + 1.0), 0.0)
+        components["temporal"] = np.exp(-outside / TEMPORAL_SCALE_DAYS)
+    else:
+        newest = store.times.max().astype("datetime64[s]").astype(np.int64) / 86400.0 if len(store) else 0.0
+        components["temporal"] = np.exp(-(newest - days) / RECENCY_SCALE_DAYS)
+
+    column = VARIABLE_COLUMNS.get(intent.get("primary"))
+    variables = _variable_coverage(sub, column) if column else np.ones(len(sub))
+    if intent.get("detail") == "detailed":
+        levels = sub.n_levels
+        variables = 0.5 * variables + 0.5 * levels / max(int(levels.max(initial=1)), 1)
+    components["variables"] = variables
+
+    if semantic is not None and query_vector is not None:
+        rows = semantic.index.rows_for_ids(sub.profile_ids)
+        similarity = np.zeros(len(sub), dtype=np.float32)
+        known = rows >= 0
+        if known.any():
+            similarity[known] = semantic.index.reconstruct(rows[known]) @ query_vector
+        components["semantic"] = np.clip(similarity, 0.0, 1.0)
+    else:
+        components["semantic"] = np.zeros(len(sub))
+        weights["semantic"] = 0.0
+
+    total = sum(weights.values()) or 1.0
+    score = sum((weights[name] / total) * components[name] for name in COMPONENTS)
+    return score, distance, components
+
+
+def top_k(scores, offset, limit):
+    """Positions of ranks ``offset`` .. ``offset + limit`` by descending score (ties by position)."""
+    n = len(scores)
+    end = min(n, offset + limit)
+    if offset >= end:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, end - 1)[:end] if end < n else np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][offset:end]
+
+
+def rank(store, candidates, lat, lon, intent, query_lower, offset=0, limit=10, weights=None,
+         located=True, semantic=None, query_vector=None):
+    """One page of ranked candidates: (catalog indices, scores, distances, components)."""
+    scores, distance, components = score_candidates(
+        store, candidates, lat, lon, intent, parse_period_from_query(query_lower), weights,
+        located, semantic, query_vector,
+    )
+    page = top_k(scores, offset, limit)
+    return (candidates[page], scores[page], distance[page],
+            {name: values[page] for name, values in components.items()})
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Semantic search over observed profiles.
+
+Every profile in the catalog (see store.py) gets a short text summary -
+region, climate band, season, surface temperature and salinity classes,
+thermocline strength, oxygen and depth coverage - which is embedded and
+kept in a memory-mapped ``VectorIndex`` (int8 or float16, IVF). Queries
+are embedded the same way and answered with an inner-product top-k;
+query embeddings are cached in an LRU.
+
+Embedders are chosen with FLOATCHAT_EMBEDDER:
+
+* ``hashing`` (default) - signed feature hashing of words and word
+  bigrams. No model files, no network: works on air-gapped hosts.
+* ``static:/path/vectors.npz`` - averaged static word vectors from an
+  ``.npz`` with ``vocab`` (str array) and ``vectors`` (float32 V x D),
+  e.g. GloVe converted offline.
+* ``sentence-transformers[:model]`` - the ``all-MiniLM-L6-v2`` model the
+  README describes (optional dependency, needs the model available).
+
+Identical summaries are embedded once, so building is proportional to the
+number of distinct summaries rather than profiles. Build ahead of time
+for large catalogs:
+
+    python api/semantic.py build --db dummy.db
+    python api/semantic.py search "warm salty water in the arabian sea in summer"
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache, partial
+
+import numpy as np
+
+from builds import BackgroundBuild
+from store import DB_PATH, get_store, load_store
+from vecindex import VectorIndex
+
+EMBEDDER = os.getenv("FLOATCHAT_EMBEDDER", "hashing")
+EMBED_DTYPE = os.getenv("FLOATCHAT_EMBED_DTYPE", "int8")
+INDEX_DIR = os.getenv(
+    "FLOATCHAT_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"),
+)
+HASHING_DIMS = 256
+AUTO_BUILD_MAX = int(os.getenv("FLOATCHAT_SEMANTIC_AUTO_BUILD_MAX", "5000"))
+DEFAULT_NPROBE = int(os.getenv("FLOATCHAT_SEMANTIC_NPROBE", "16"))
+QUERY_CACHE_SIZE = 2048
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are at by for from give in is it me near of on or profile profiles show the to what "
+    "where which with water data ocean sea".split()
+)
+
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords; "ocean"/"sea" only add signal inside names."""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams, sublinear tf, L2-normalized."""
+
+    def __init__(self, dims=HASHING_DIMS):
+        self.dims = dims
+        self.name = f"hashing-{dims}"
+
+    def _slot(self, feature):
+        # Hashed per call rather than memoized: query text is unbounded
+        h = zlib.crc32(feature.encode("utf-8"))
+        return h % self.dims, 1.0 if (h >> 31) & 1 else -1.0
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            counts = {}
+            for feature in tokens + [a + "_" + b for a, b in zip(tokens, tokens[1:])]:
+                counts[feature] = counts.get(feature, 0) + 1
+            for feature, tf in counts.items():
+                index, sign = self._slot(feature)
+                out[row, index] += sign * (1.0 + np.log(tf))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class StaticEmbedder:
+    """Mean of pretrained static word vectors, L2-normalized."""
+
+    def __init__(self, path):
+        data = np.load(path, allow_pickle=False)
+        self.vectors = data["vectors"].astype(np.float32)
+        self.vocab = {word: i for i, word in enumerate(data["vocab"].tolist())}
+        self.dims = self.vectors.shape[1]
+        self.name = f"static-{os.path.basename(path)}"
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            ids = [self.vocab[t] for t in tokenize(text) if t in self.vocab]
+            if ids:
+                out[row] = self.vectors[ids].mean(axis=0)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer  # optional dependency
+
+        self.model = SentenceTransformer(model_name)
+        self.dims = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts):
+        return self.model.encode(list(texts), batch_size=256, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def make_embedder(spec=EMBEDDER):
+    kind, _, arg = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(arg) if arg else HASHING_DIMS)
+    if kind == "static":
+        return StaticEmbedder(arg)
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(arg or "all-MiniLM-L6-v2")
+    raise ValueError(f"unknown embedder {spec!r}")
+
+
+# Named boxes checked in order: (name, lat_min, lat_max, lon_min, lon_max)
+REGIONS = [
+    ("arabian sea", 0, 25, 50, 78),
+    ("bay of bengal", 5, 23, 78, 100),
+    ("mediterranean sea", 30, 46, -6, 36),
+    ("southern ocean", -90, -50, -180, 180),
+    ("arctic ocean", 66, 90, -180, 180),
+    ("indian ocean", -50, 30, 20, 120),
+    ("pacific ocean", -50, 66, 120, 180),
+    ("pacific ocean", -50, 66, -180, -70),
+    ("atlantic ocean", -50, 66, -70, 20),
+]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+NORTHERN_SEASONS = ["winter", "winter", "spring", "spring", "spring", "summer",
+                    "summer", "summer", "autumn", "autumn", "autumn", "winter"]
+OPPOSITE_SEASON = {"winter": "summer", "summer": "winter", "spring": "autumn", "autumn": "spring"}
+
+
+def _region_names(lat, lon):
+    names = np.full(len(lat), "open ocean", dtype=object)
+    unset = np.ones(len(lat), dtype=bool)
+    for name, lat0, lat1, lon0, lon1 in REGIONS:
+        hit = unset & (lat >= lat0) & (lat <= lat1) & (lon >= lon0) & (lon <= lon1)
+        names[hit] = name
+        unset &= ~hit
+    return names
+
+
+def _first_last(store, column):
+    values = store.levels[column]
+    if not len(values):
+        return np.zeros(0, np.float32), np.zeros(0, np.float32)
+    return values[store.offsets[:-1]], values[store.offsets[1:] - 1]
+
+
+def profile_summaries(store):
+    """One descriptive sentence per catalog profile, built from vectorized features."""
+    n = len(store)
+    if not n:
+        return []
+    lat, lon = store.lat, store.lon
+    abs_lat = np.abs(lat)
+    band = np.select([abs_lat < 10, abs_lat < 23.5, abs_lat < 35, abs_lat < 55],
+                     ["equatorial tropical", "tropical", "subtropical", "temperate"], "polar")
+    hemisphere = np.where(lat >= 0, "northern", "southern")
+    month = store.times.astype("datetime64[M]").astype(np.int64) % 12
+    year = store.times.astype("datetime64[Y]").astype(np.int64) + 1970
+    north_season = np.array(NORTHERN_SEASONS, dtype=object)[month]
+    season = np.where(lat >= 0, north_season, [OPPOSITE_SEASON[s] for s in north_season])
+
+    t_top, t_bottom = _first_last(store, "temperature")
+    s_top, _ = _first_last(store, "salinity")
+    depth_top, depth_bottom = _first_last(store, "depth")
+    warmth = np.select([t_top < 10, t_top < 18, t_top < 24, t_top < 28],
+                       ["cold", "cool", "mild", "warm"], "hot")
+    saltiness = np.select([s_top < 34, s_top < 35.5, s_top < 36.5], ["fresh", "moderately salty", "salty"],
+                          "very salty")
+    drop = t_top - t_bottom
+    thermocline = np.select([store.n_levels < 2, drop > 8, drop > 3],
+                            ["single level", "strong thermocline", "moderate thermocline"], "weak thermocline well mixed")
+    oxygen = store.levels["oxygen"]
+    ox_sum = np.add.reduceat(np.nan_to_num(oxygen), store.offsets[:-1])
+    ox_n = np.add.reduceat(~np.isnan(oxygen), store.offsets[:-1])
+    ox_mean = np.where(ox_n > 0, ox_sum / np.maximum(ox_n, 1), np.nan)
+    oxy = np.select([np.isnan(ox_mean), ox_mean < 150, ox_mean > 220],
+                    ["", "low oxygen hypoxic", "oxygen rich well oxygenated"], "moderate oxygen")
+    coverage = np.select([store.n_levels >= 20, depth_bottom >= 500], ["detailed high resolution", "deep"],
+                         "upper ocean")
+    regions = _region_names(lat, lon)
+
+    return [
+        f"{regions[i]} {band[i]} {hemisphere[i]} hemisphere {season[i]} {MONTHS[month[i]]} {year[i]} "
+        f"{warmth[i]} surface water temperature {saltiness[i]} salinity {thermocline[i]} {oxy[i]} "
+        f"{coverage[i]} profile to {depth_bottom[i]:.0f} dbar"
+        for i in range(n)
+    ]
+
+
+def _index_path(embedder):
+    return os.path.join(INDEX_DIR, f"semantic-{embedder.name}")
+
+
+def build_index(store, embedder, dtype=EMBED_DTYPE, nlist=None, directory=None):
+    """Embed every profile summary and write a VectorIndex for ``store``."""
+    summaries = profile_summaries(store)
+    unique, inverse = np.unique(np.array(summaries, dtype=object), return_inverse=True)
+    vectors = embedder.embed(unique.tolist())[inverse] if len(unique) else np.zeros((0, embedder.dims), np.float32)
+    return VectorIndex.build(directory or _index_path(embedder), vectors, store.profile_ids, dtype=dtype,
+                             metric="ip", nlist=nlist,
+                             meta={"embedder": embedder.name, "store_version": store.version,
+                                   "distinct_summaries": int(len(unique))})
+
+
+class SemanticSearch:
+    """Embedder + index for the current catalog, with a query-embedding LRU."""
+
+    def __init__(self, embedder, index):
+        self.embedder = embedder
+        self.index = index
+        self._embed_cached = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._embed_query)
+
+    def _embed_query(self, normalized):
+        vector = self.embedder.embed([normalized])[0]
+        vector.flags.writeable = False
+        return vector
+
+    def embed_query(self, text):
+        return self._embed_cached(" ".join(text.lower().split()))
+
+    def search(self, text, k=10, nprobe=DEFAULT_NPROBE):
+        return self.index.search(self.embed_query(text), k, nprobe)
+
+    def cache_info(self):
+        return self._embed_cached.cache_info()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_builds = BackgroundBuild("semantic")
+
+
+def _publish(store, embedder):
+    global _engine
+    engine = SemanticSearch(embedder, build_index(store, embedder))
+    with _engine_lock:
+        _engine = engine
+
+
+def get_search(store=None, wait=False):
+    """SemanticSearch for the current catalog, or None if no index is available yet.
+
+    A missing or stale index is rebuilt in-process only for catalogs up to
+    FLOATCHAT_SEMANTIC_AUTO_BUILD_MAX profiles, on a background thread
+    unless ``wait``; larger ones need ``build``.
+    """
+    global _engine
+    store = store if store is not None else get_store()
+    if store is None:
+        return None
+    engine = _engine
+    if engine is not None and engine.index.meta.get("store_version") == store.version:
+        return engine
+    with _engine_lock:
+        if _engine is not None and _engine.index.meta.get("store_version") == store.version:
+            return _engine
+        embedder = _engine.embedder if _engine is not None else make_embedder()
+        path = _index_path(embedder)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            index = VectorIndex.open(path)
+            if index.meta.get("store_version") == store.version:
+                _engine = SemanticSearch(embedder, index)
+                return _engine
+    if len(store) > AUTO_BUILD_MAX:
+        return None
+    _builds.submit(partial(_publish, embedder=embedder), store, wait)
+    engine = _engine
+    return engine if wait and engine is not None and engine.index.meta.get("store_version") == store.version else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the semantic profile index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="embed all profiles and write the index")
+    build.add_argument("--db", default=DB_PATH)
+    build.add_argument("--embedder", default=EMBEDDER)
+    build.add_argument("--dtype", default=EMBED_DTYPE, choices=["int8", "float16"])
+    build.add_argument("--nlist", type=int, default=None)
+    search = sub.add_parser("search", help="query an existing index")
+    search.add_argument("query")
+    search.add_argument("--db", default=DB_PATH)
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_store(args.db)
+    print(f"🗂️ {len(store):,} profiles loaded in {time.perf_counter() - started:.1f}s")
+    if args.command == "build":
+        started = time.perf_counter()
+        index = build_index(store, make_embedder(args.embedder), args.dtype, args.nlist)
+        print(f"✅ Indexed {len(index):,} profiles ({index.meta['distinct_summaries']:,} distinct summaries, "
+              f"nlist={index.nlist}, {index.meta['dtype']}) in {time.perf_counter() - started:.1f}s")
+        print(f"📁 {index.directory}")
+    else:
+        engine = get_search(store, wait=True)
+        if engine is None:
+            raise SystemExit("❌ No index for this catalog; run the build command first")
+        started = time.perf_counter()
+        ids, scores = engine.search(args.query, args.k, args.nprobe)
+        took = (time.perf_counter() - started) * 1e3
+        summaries = profile_summaries(store.subset([store.index_of(pid) for pid in ids]))
+        for pid, score, summary in zip(ids, scores, summaries):
+            print(f"{score:6.3f}  #{pid}  {summary}")
+        print(f"⏱️ {took:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Profile-shape similarity: "find observed profiles like this one".
+
+Every catalog profile is resampled by linear interpolation (interpolate.py)
+onto the fixed pressure grid ``SHAPE_PRESSURES``. Values above the
+shallowest or below the deepest level are held at the end value. Temperature and salinity on
+that grid, centred on ``FEATURE_CENTERS`` (keeping float16 storage
+precise) and divided by ``FEATURE_SCALES`` so one unit means a comparable
+difference in either variable, form the shape vector. The vectors are
+kept in a memory-mapped L2 ``VectorIndex`` (float16, IVF), so a k-nearest
+query scans only ``nprobe`` lists however large the catalog.
+
+Profiles without a finite value for a variable are left out of the index.
+
+    python api/shape.py build --db dummy.db
+    python api/shape.py similar 12345 -k 5
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from builds import BackgroundBuild
+from interpolate import interpolate_profiles
+from semantic import INDEX_DIR
+from store import DB_PATH, get_store, load_store
+from vecindex import VectorIndex
+
+SHAPE_PRESSURES = np.array(
+    [float(p) for p in os.getenv("FLOATCHAT_SHAPE_PRESSURES", "5,10,20,30,50,75,100,125,150").split(",")],
+    dtype=np.float64,
+)
+FEATURE_CENTERS = {"temperature": 15.0, "salinity": 35.0}
+# Roughly the spread of each variable within one water mass
+FEATURE_SCALES = {"temperature": 1.0, "salinity": 0.2}
+SHAPE_DTYPE = os.getenv("FLOATCHAT_SHAPE_DTYPE", "float16")
+AUTO_BUILD_MAX = int(os.getenv("FLOATCHAT_SHAPE_AUTO_BUILD_MAX", "20000"))
+DEFAULT_NPROBE = int(os.getenv("FLOATCHAT_SHAPE_NPROBE", "16"))
+
+
+def resample(depth, values, offsets, pressures=SHAPE_PRESSURES):
+    """Linear interpolation onto ``pressures``, holding end values beyond the sampled range."""
+    return interpolate_profiles(depth, values, offsets, pressures, extrapolate="clamp")
+
+
+def shape_vectors(depth, temperature, salinity, offsets, pressures=SHAPE_PRESSURES):
+    """Scaled [temperature | salinity] shape vectors (profiles x 2 * len(pressures))."""
+    return np.hstack([
+        (resample(depth, temperature, offsets, pressures) - FEATURE_CENTERS["temperature"])
+        / FEATURE_SCALES["temperature"],
+        (resample(depth, salinity, offsets, pressures) - FEATURE_CENTERS["salinity"])
+        / FEATURE_SCALES["salinity"],
+    ])
+
+
+def levels_vector(depth_levels, pressures=SHAPE_PRESSURES):
+    """Shape vector of one profile given as /query ``depth_levels`` ({pres, temp, salinity})."""
+    rows = sorted((float(level["pres"]), float(level["temp"]), float(level["salinity"]))
+                  for level in depth_levels)
+    if not rows:
+        raise ValueError("depth_levels is empty")
+    depth, temp, sal = (np.array(column) for column in zip(*rows))
+    vector = shape_vectors(depth, temp, sal, [0, len(rows)], pressures)[0]
+    if not np.isfinite(vector).all():
+        raise ValueError("depth_levels need numeric pres, temp and salinity")
+    return vector
+
+
+def store_vectors(store, pressures=SHAPE_PRESSURES):
+    levels = store.levels
+    return shape_vectors(levels["depth"], levels["temperature"], levels["salinity"], store.offsets, pressures)
+
+
+def _grid_key(pressures):
+    return "-".join(f"{p:g}" for p in pressures)
+
+
+def _index_path(pressures=SHAPE_PRESSURES):
+    return os.path.join(INDEX_DIR, f"shape-{_grid_key(pressures)}")
+
+
+def build_index(store, dtype=SHAPE_DTYPE, nlist=None, directory=None, pressures=SHAPE_PRESSURES):
+    """Resample every profile and write an L2 VectorIndex of shape vectors for ``store``."""
+    vectors = store_vectors(store, pressures)
+    keep = np.isfinite(vectors).all(axis=1)
+    return VectorIndex.build(directory or _index_path(pressures), vectors[keep], store.profile_ids[keep],
+                             dtype=dtype, metric="l2", nlist=nlist,
+                             meta={"store_version": store.version, "pressures": pressures.tolist(),
+                                   "centers": FEATURE_CENTERS, "scales": FEATURE_SCALES,
+                                   "skipped": int((~keep).sum())})
+
+
+class ShapeSearch:
+    """Shape index for one catalog snapshot."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def vector_of(self, profile_id):
+        """Indexed shape vector of a catalog profile, or None."""
+        row = int(self.index.rows_for_ids([profile_id])[0])
+        return None if row < 0 else self.index.reconstruct([row])[0]
+
+    def similar(self, vector, k=10, nprobe=DEFAULT_NPROBE, exclude=None):
+        """(ids, distances) of the k nearest shapes, leaving out the ``exclude`` id."""
+        ids, distances = self.index.search(vector, k + (exclude is not None), nprobe)
+        if exclude is not None:
+            keep = ids != exclude
+            ids, distances = ids[keep][:k], distances[keep][:k]
+        return ids, distances
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_builds = BackgroundBuild("shape")
+
+
+def _publish(store):
+    global _engine
+    engine = ShapeSearch(build_index(store))
+    with _engine_lock:
+        _engine = engine
+
+
+def get_shape_search(store=None, wait=False):
+    """ShapeSearch for the current catalog, or None if no index is available yet.
+
+    A missing or stale index is rebuilt in-process only for catalogs up to
+    FLOATCHAT_SHAPE_AUTO_BUILD_MAX profiles, on a background thread unless
+    ``wait``; larger ones need ``build``.
+    """
+    global _engine
+    store = store if store is not None else get_store()
+    if store is None:
+        return None
+    engine = _engine
+    if engine is not None and engine.index.meta.get("store_version") == store.version:
+        return engine
+    with _engine_lock:
+        if _engine is not None and _engine.index.meta.get("store_version") == store.version:
+            return _engine
+        path = _index_path()
+        if os.path.exists(os.path.join(path, "meta.json")):
+            index = VectorIndex.open(path)
+            if index.meta.get("store_version") == store.version:
+                _engine = ShapeSearch(index)
+                return _engine
+    if len(store) > AUTO_BUILD_MAX:
+        return None
+    _builds.submit(_publish, store, wait)
+    engine = _engine
+    return engine if wait and engine is not None and engine.index.meta.get("store_version") == store.version else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the profile-shape index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="resample all profiles and write the index")
+    build.add_argument("--db", default=DB_PATH)
+    build.add_argument("--dtype", default=SHAPE_DTYPE, choices=["int8", "float16"])
+    build.add_argument("--nlist", type=int, default=None)
+    similar = sub.add_parser("similar", help="profiles shaped like a catalog profile")
+    similar.add_argument("profile_id", type=int)
+    similar.add_argument("--db", default=DB_PATH)
+    similar.add_argument("-k", type=int, default=10)
+    similar.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_store(args.db)
+    print(f"🗂️ {len(store):,} profiles loaded in {time.perf_counter() - started:.1f}s")
+    if args.command == "build":
+        started = time.perf_counter()
+        index = build_index(store, args.dtype, args.nlist)
+        print(f"✅ Indexed {len(index):,} profile shapes ({index.meta['skipped']:,} skipped, "
+              f"nlist={index.nlist}, {index.meta['dtype']}) in {time.perf_counter() - started:.1f}s")
+        print(f"📁 {index.directory}")
+    else:
+        engine = get_shape_search(store, wait=True)
+        if engine is None:
+            raise SystemExit("❌ No shape index for this catalog; run the build command first")
+        vector = engine.vector_of(args.profile_id)
+        if vector is None:
+            raise SystemExit(f"❌ Profile {args.profile_id} is not in the shape index")
+        started = time.perf_counter()
+        ids, distances = engine.similar(vector, args.k, args.nprobe, exclude=args.profile_id)
+        took = (time.perf_counter() - started) * 1e3
+        for pid, distance in zip(ids, distances):
+            i = store.index_of(pid)
+            print(f"{distance:7.3f}  #{pid}  {store.lat[i]:8.3f} {store.lon[i]:9.3f}  {store.times[i]}")
+        print(f"⏱️ {took:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
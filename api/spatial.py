@@ -0,0 +1,80 @@
+"""
+Uniform lat/lon grid over catalog positions for candidate prefiltering.
+
+Profiles are bucketed into ``cell_deg`` x ``cell_deg`` cells stored in CSR
+form (cell keys sorted, one contiguous run of profile indices per cell),
+so looking up everything within a radius touches only the cells that
+intersect it. Longitude wraps at the antimeridian.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    def __init__(self, lat, lon, cell_deg=2.0):
+        self.lat = lat
+        self.lon = lon
+        self.cell_deg = cell_deg
+        self.n_rows = int(np.ceil(180.0 / cell_deg))
+        self.n_cols = int(np.ceil(360.0 / cell_deg))
+        keys = self._row(lat) * self.n_cols + self._col(lon)
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_keys, self.cell_starts = np.unique(keys[self.order], return_index=True)
+        self.cell_stops = np.append(self.cell_starts[1:], len(keys))
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90.0) // self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return ((np.asarray(lon) + 180.0) // self.cell_deg).astype(np.int64) % self.n_cols
+
+    def _cells_within(self, lat, lon, radius_km):
+        """Keys of every cell intersecting the circle's lat/lon bounding box."""
+        dlat = radius_km / KM_PER_DEGREE
+        rows = np.arange(self._row(max(-90.0, lat - dlat)), self._row(min(90.0, lat + dlat)) + 1)
+        # Longitude half-width is widest at the most poleward latitude the circle reaches
+        poleward = min(90.0, abs(lat) + dlat)
+        if poleward >= 89.9:
+            cols = np.arange(self.n_cols)
+        else:
+            dlon = dlat / np.cos(np.radians(poleward))
+            if dlon >= 180.0:
+                cols = np.arange(self.n_cols)
+            else:
+                lo, hi = int(self._col(lon - dlon)), int(self._col(lon + dlon))
+                cols = np.arange(lo, hi + 1) if lo <= hi else np.concatenate(
+                    [np.arange(lo, self.n_cols), np.arange(0, hi + 1)])
+        return (rows[:, None] * self.n_cols + cols[None, :]).ravel()
+
+    def within(self, lat, lon, radius_km):
+        """Indices of points in cells intersecting the radius (a superset of the circle)."""
+        keys = self._cells_within(lat, lon, radius_km)
+        pos = np.searchsorted(self.cell_keys, keys)
+        hit = pos < len(self.cell_keys)
+        hit[hit] = self.cell_keys[pos[hit]] == keys[hit]
+        runs = [self.order[self.cell_starts[p]:self.cell_stops[p]] for p in pos[hit]]
+        return np.concatenate(runs) if runs else np.zeros(0, dtype=np.int64)
+
+    def nearest(self, lat, lon, count, start_km=250.0, max_km=20000.0):
+        """Up to ``count`` point indices nearest to (lat, lon), widening the search radius as needed."""
+        radius = start_km
+        while True:
+            found = self.within(lat, lon, radius)
+            if len(found) >= count or radius >= max_km:
+                break
+            radius *= 2
+        if len(found) > count:
+            distance = haversine_km(lat, lon, self.lat[found], self.lon[found])
+            found = found[np.argpartition(distance, count - 1)[:count]]
+        return np.sort(found)
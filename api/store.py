@@ -0,0 +1,210 @@
+"""
+Read-only, in-memory catalog of observed profiles from the ``profiles`` table.
+
+Rows are one observation per level. They are grouped into profiles - by
+(float_id, cycle) when the table has those columns (see
+ingestion/synthetic.py), else by (time, latitude, longitude) - and held
+as NumPy arrays: one entry per profile for the metadata, and the level
+values of all profiles concatenated in CSR layout (``offsets[i]`` to
+``offsets[i + 1]`` are the levels of profile ``i``, shallowest first).
+
+The database is FLOATCHAT_DB (default: dummy.db at the repository root).
+The catalog is loaded on first use and reloaded when the file changes;
+``ProfileStore.version`` identifies the snapshot a result was ranked on.
+"""
+
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from spatial import GridIndex
+
+DB_PATH = os.getenv(
+    "FLOATCHAT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dummy.db"),
+)
+LEVEL_COLUMNS = ["depth", "temperature", "salinity", "oxygen"]
+CHUNK_ROWS = 500_000
+
+
+def numeric_column(series):
+    """Float column from SQLite values, decoding integers stored as 8-byte blobs.
+
+    Shared with the frontend loader (frontend/dataset.py), which reads the same table.
+    """
+    if series.dtype == object:
+        series = series.map(lambda v: int.from_bytes(v, "little", signed=True) if isinstance(v, bytes) else v)
+    return pd.to_numeric(series, errors="coerce")
+
+
+class ProfileStore:
+    def __init__(self, profile_ids, times, lat, lon, offsets, levels, version):
+        self.profile_ids = profile_ids  # int64, first row id of each profile
+        self.times = times  # datetime64[s]
+        self.lat = lat  # float64
+        self.lon = lon  # float64
+        self.offsets = offsets  # int64, len(profiles) + 1
+        self.levels = levels  # {"depth"|"temperature"|"salinity"|"oxygen": float32 array}
+        self.version = version
+        self._id_order = None
+        self._grid = None
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    @property
+    def n_levels(self):
+        return np.diff(self.offsets)
+
+    def level_slice(self, i):
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def indices_of(self, profile_ids):
+        """Catalog positions of profile ids (-1 where unknown)."""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.profile_ids, kind="stable")
+        ids = np.asarray(profile_ids, dtype=np.int64)
+        if not len(self.profile_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        sorted_ids = self.profile_ids[self._id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == ids, self._id_order[pos], -1)
+
+    def index_of(self, profile_id):
+        """Catalog position of a profile id, or None."""
+        i = int(self.indices_of([profile_id])[0])
+        return None if i < 0 else i
+
+    @property
+    def grid(self):
+        """Spatial grid over profile positions, built on first use."""
+        if self._grid is None:
+            self._grid = GridIndex(self.lat, self.lon)
+        return self._grid
+
+    def subset(self, indices):
+        """A ProfileStore holding only the given catalog entries, in that order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts, stops = self.offsets[indices], self.offsets[indices + 1]
+        lengths = stops - starts
+        rows = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+        return ProfileStore(
+            profile_ids=self.profile_ids[indices],
+            times=self.times[indices],
+            lat=self.lat[indices],
+            lon=self.lon[indices],
+            offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            levels={col: values[rows] for col, values in self.levels.items()},
+            version=self.version,
+        )
+
+    def profile(self, i, **extra):
+        """Response dict for catalog entry ``i`` in the /query profile layout."""
+        s = self.level_slice(i)
+        pres = self.levels["depth"][s]
+        temp = self.levels["temperature"][s]
+        sal = self.levels["salinity"][s]
+        depth_levels = [
+            {"pres": round(float(p), 1), "temp": round(float(t), 2), "salinity": round(float(v), 2)}
+            for p, t, v in zip(pres, temp, sal)
+        ]
+        return {
+            "profile_id": int(self.profile_ids[i]),
+            "lat": round(float(self.lat[i]), 4),
+            "lon": round(float(self.lon[i]), 4),
+            "time": str(self.times[i]).replace("T", " "),
+            "depth_levels": depth_levels,
+            "source": "observed",
+            **extra,
+        }
+
+
+def _snapshot_version(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def table_columns(conn):
+    return [row[1] for row in conn.execute("PRAGMA table_info(profiles)")]
+
+
+def read_rows(conn, columns, where="", params=(), chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of the ``profiles`` rows matching ``where``, ``chunk_rows`` at a time.
+
+    Numeric columns are decoded (see ``numeric_column``) and ``time`` parsed, so
+    callers never hold more than one chunk of raw rows.
+    """
+    sql = f"SELECT {', '.join(columns)} FROM profiles" + (f" WHERE {where}" if where else "")
+    for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows):
+        for col in chunk.columns:
+            if col != "time":
+                chunk[col] = numeric_column(chunk[col])
+        if "time" in chunk:
+            chunk["time"] = pd.to_datetime(chunk["time"], errors="coerce")
+        yield chunk
+
+
+def load_store(path=DB_PATH):
+    """Build a ProfileStore from the profiles table at ``path``."""
+    version = _snapshot_version(path)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        available = set(table_columns(conn))
+        grouped_by_float = {"float_id", "cycle"} <= available
+        columns = ["id", "time", "latitude", "longitude"] + [c for c in LEVEL_COLUMNS if c in available]
+        if grouped_by_float:
+            columns += ["float_id", "cycle"]
+        chunks = list(read_rows(conn, columns))
+    finally:
+        conn.close()
+
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    df = df.dropna(subset=["time", "latitude", "longitude", "depth"])
+    keys = ["float_id", "cycle"] if grouped_by_float else ["time", "latitude", "longitude"]
+    df = df.sort_values(keys + ["depth"], kind="stable").reset_index(drop=True)
+
+    n = len(df)
+    if n:
+        key_values = df[keys].to_numpy()
+        changed = np.any(key_values[1:] != key_values[:-1], axis=1)
+        starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+
+    ids = df["id"].to_numpy(dtype=np.int64)
+    levels = {
+        col: (df[col].to_numpy(dtype=np.float32) if col in df else np.full(n, np.nan, dtype=np.float32))
+        for col in LEVEL_COLUMNS
+    }
+    return ProfileStore(
+        profile_ids=np.minimum.reduceat(ids, starts) if n else ids,
+        times=df["time"].to_numpy(dtype="datetime64[s]")[starts],
+        lat=df["latitude"].to_numpy(dtype=np.float64)[starts],
+        lon=df["longitude"].to_numpy(dtype=np.float64)[starts],
+        offsets=np.append(starts, n).astype(np.int64),
+        levels=levels,
+        version=version,
+    )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=DB_PATH):
+    """The current catalog, (re)loaded when the database file has changed; None if absent."""
+    global _store
+    try:
+        version = _snapshot_version(path)
+    except OSError:
+        return None
+    store = _store
+    if store is not None and store.version == version:
+        return store
+    with _store_lock:
+        if _store is None or _store.version != version:
+            _store = load_store(path)
+        return _store
@@ -0,0 +1,215 @@
+"""
+Request tracing with W3C trace context and an OTLP/JSON file exporter.
+
+The chat UI sends a ``traceparent`` header; each traced request records a
+server span plus one child span per stage (see ``metrics.stage``). Finished
+traces are appended by a background thread, one OTLP/JSON
+``ExportTraceServiceRequest`` per line, to FLOATCHAT_TRACE_FILE - the same
+layout the OpenTelemetry Collector file exporter writes and its file
+receiver reads. Stage timings are also returned in a ``Server-Timing``
+header so the UI can show a breakdown without reading the file.
+
+Requests without a ``traceparent`` are only traced when
+FLOATCHAT_TRACE_ALL=1; otherwise ``span`` is a no-op.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+
+TRACE_FILE = os.getenv(
+    "FLOATCHAT_TRACE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces", "otlp-traces.jsonl"),
+)
+TRACE_ALL = os.getenv("FLOATCHAT_TRACE_ALL", "0") == "1"
+SERVICE_NAME = "floatchat-api"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_current = contextvars.ContextVar("floatchat_trace", default=None)
+
+
+class Trace:
+    """Spans collected for one request."""
+
+    def __init__(self, trace_id, parent_span_id, sampled):
+        self.trace_id = trace_id
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.spans = []
+
+    def add_span(self, name, start_ns, end_ns, attributes=None):
+        self.spans.append({
+            "traceId": self.trace_id,
+            "spanId": secrets.token_hex(8),
+            "parentSpanId": self.span_id,
+            "name": name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": _attributes(attributes or {}),
+        })
+
+    def server_timing(self):
+        """Server-Timing header value: one entry per stage plus the total."""
+        entries = [
+            "{};dur={:.3f}".format(s["name"], (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6)
+            for s in self.spans
+        ]
+        entries.append("total;dur={:.3f}".format((time.time_ns() - self.start_ns) / 1e6))
+        return ", ".join(entries)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def _attributes(values):
+    out = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        out.append({"key": key, "value": typed})
+    return out
+
+
+def start_trace(traceparent_header):
+    """Begin tracing the current request if it carries trace context (or TRACE_ALL is set)."""
+    match = _TRACEPARENT.match((traceparent_header or "").strip().lower())
+    if match:
+        trace = Trace(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+    elif TRACE_ALL:
+        trace = Trace(secrets.token_hex(16), "", True)
+    else:
+        trace = None
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def finish_trace(name, attributes=None):
+    """Close the server span, queue the trace for export and clear the context."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    if trace.sampled:
+        root = {
+            "traceId": trace.trace_id,
+            "spanId": trace.span_id,
+            "name": name,
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": _attributes(attributes or {}),
+        }
+        if trace.parent_span_id:
+            root["parentSpanId"] = trace.parent_span_id
+        _exporter.submit([root] + trace.spans)
+    return trace
+
+
+@contextmanager
+def span(name, **attributes):
+    """Record a child span on the active trace; a no-op when the request is not traced."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start_ns = time.time_ns()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start_ns, time.time_ns(), attributes)
+
+
+class FileExporter:
+    """Appends OTLP/JSON trace batches to a file from a background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue(maxsize=10_000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            pass  # drop rather than block a request
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with open(self.path, "a", encoding="utf-8") as fh:
+                for spans in batch:
+                    fh.write(json.dumps(_export_request(spans), separators=(",", ":")) + "\n")
+
+    def flush(self, timeout=2.0):
+        deadline = time.time() + timeout
+        while not self._queue.empty() and time.time() < deadline:
+            time.sleep(0.01)
+
+
+def _export_request(spans):
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "floatchat.api"}, "spans": spans}],
+        }]
+    }
+
+
+_exporter = FileExporter(TRACE_FILE)
+atexit.register(_exporter.flush)
+
+
+def register_tracing(app):
+    """Start/finish traces around every request and add trace response headers."""
+    @app.before_request
+    def _start_request_trace():
+        start_trace(request.headers.get("traceparent"))
+
+    @app.after_request
+    def _finish_request_trace(response):
+        trace = finish_trace(f"{request.method} {request.path}", {
+            "http.method": request.method,
+            "http.route": request.path,
+            "http.status_code": response.status_code,
+        })
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            response.headers["traceresponse"] = trace.traceparent()
+            exposed = response.headers.get("Access-Control-Expose-Headers")
+            response.headers["Access-Control-Expose-Headers"] = ", ".join(
+                filter(None, [exposed, "Server-Timing, traceresponse"]))
+        return response
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Time-series analytics for a region and depth band of the profile catalog.
+
+Each profile is reduced to one value: the mean of its levels inside the
+depth band. These band means are computed for the whole catalog in one
+``bincount`` pass and cached per (catalog version, variable, band), so a
+region query only selects rows (grid index plus an exact haversine
+filter) and groups them by month.
+
+From the monthly series:
+
+* ``annual``   - calendar-year means of the monthly means
+* ``rolling``  - centred ``window``-month running mean, gaps skipped
+* ``trend``    - least-squares slope fitted jointly with a calendar-month
+  seasonal cycle, so an uneven spread of months cannot alias into it.
+  The 95% interval uses Student's t with the sample size reduced for
+  lag-1 autocorrelation of the residuals (Santer et al. 2000).
+* ``seasonal`` / ``trend_component`` / ``residual`` - additive
+  decomposition: the fitted cycle, the running mean of the deseasonalized
+  series, and what is left over
+
+Finished results are kept in an LRU keyed by catalog version, region,
+variable, band and window.
+
+    python api/trends.py series 15 65 --radius 500 --variable temperature --band 0,100
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from statistics import NormalDist
+
+import numpy as np
+
+from spatial import haversine_km
+from store import DB_PATH, load_store
+
+VARIABLES = ("temperature", "salinity", "oxygen")
+UNITS = {"temperature": "°C", "salinity": "PSU", "oxygen": "µmol/kg"}
+DEFAULT_RADIUS_KM = float(os.getenv("FLOATCHAT_TREND_RADIUS_KM", "500"))
+DEFAULT_BAND = tuple(float(d) for d in os.getenv("FLOATCHAT_TREND_BAND", "0,100").split(","))
+DEFAULT_WINDOW = 12  # months
+MIN_MONTHS = 6  # fewer monthly means than this get no trend fit
+CACHE_SIZE = int(os.getenv("FLOATCHAT_TREND_CACHE", "256"))
+BAND_CACHE_SIZE = 8
+
+
+class _LRU:
+    """Small thread-safe LRU of computed results."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+_bands = _LRU(BAND_CACHE_SIZE)
+_results = _LRU(CACHE_SIZE)
+
+
+def parse_band(spec):
+    """(top, bottom) dbar from "0,100" or a pair (DEFAULT_BAND when empty); ValueError if invalid."""
+    if spec is None or spec == "" or spec == []:
+        return DEFAULT_BAND
+    items = spec.split(",") if isinstance(spec, str) else spec
+    try:
+        top, bottom = (float(d) for d in items)
+    except (TypeError, ValueError):
+        raise ValueError("band must be two depths, e.g. 0,100")
+    if not (np.isfinite(top) and np.isfinite(bottom)) or bottom < top:
+        raise ValueError("band must be finite with top <= bottom")
+    return top, bottom
+
+
+def band_means(depth, values, offsets, band):
+    """Mean of each CSR profile's finite values with top <= depth <= bottom; NaN where there are none."""
+    n = len(offsets) - 1
+    owner = np.repeat(np.arange(n), np.diff(offsets))
+    inside = (depth >= band[0]) & (depth <= band[1]) & np.isfinite(values)
+    totals = np.bincount(owner[inside], weights=values[inside], minlength=n)
+    counts = np.bincount(owner[inside], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+
+def store_band_means(store, variable, band):
+    """Band means of every catalog profile, cached per catalog version."""
+    key = (store.version, len(store), variable, band)
+    means = _bands.get(key)
+    if means is None:
+        levels = store.levels
+        means = band_means(levels["depth"], levels[variable], store.offsets, band)
+        _bands.put(key, means)
+    return means
+
+
+def region_indices(store, lat, lon, radius_km):
+    """Catalog rows within ``radius_km`` of (lat, lon)."""
+    indices = store.grid.within(lat, lon, radius_km)
+    return indices[haversine_km(lat, lon, store.lat[indices], store.lon[indices]) <= radius_km]
+
+
+def monthly_series(times, values):
+    """(first month as months since 1970-01, monthly means, profile counts) over the covered span."""
+    keep = np.isfinite(values)
+    months = times[keep].astype("datetime64[M]").astype(np.int64)
+    values = values[keep]
+    if not len(months):
+        return None, np.zeros(0), np.zeros(0, dtype=np.int64)
+    first = int(months.min())
+    slot = months - first
+    counts = np.bincount(slot)
+    totals = np.bincount(slot, weights=values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return first, np.where(counts > 0, totals / np.maximum(counts, 1), np.nan), counts
+
+
+def rolling_mean(series, window=DEFAULT_WINDOW, min_periods=None):
+    """Centred running mean that skips NaN gaps; NaN where fewer than ``min_periods`` values."""
+    min_periods = max(1, window // 2) if min_periods is None else min_periods
+    present = np.isfinite(series)
+    totals = np.concatenate([[0.0], np.cumsum(np.where(present, series, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    index = np.arange(len(series))
+    lo = np.clip(index - window // 2, 0, len(series))
+    hi = np.clip(index + (window - window // 2), 0, len(series))
+    n = counts[hi] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n >= min_periods, (totals[hi] - totals[lo]) / np.maximum(n, 1), np.nan)
+
+
+def t_quantile(p, dof):
+    """Student's t quantile: exact for 1 and 2 degrees of freedom, Cornish-Fisher beyond."""
+    if dof <= 1:
+        return float(np.tan(np.pi * (p - 0.5)))
+    if dof < 3:
+        return float((2 * p - 1) / np.sqrt(2 * p * (1 - p)))
+    z = NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def fit_trend(first_month, series, confidence=0.95):
+    """Slope per year fitted with a calendar-month cycle: (fit dict or None, 12 seasonal offsets)."""
+    seasonal = np.full(12, np.nan)
+    present = np.flatnonzero(np.isfinite(series))
+    if len(present) < MIN_MONTHS:
+        return None, seasonal
+    calendar = (first_month + present) % 12
+    seen = np.unique(calendar)
+    years = present / 12.0
+    # Columns: time, then one intercept per calendar month that has data
+    design = np.column_stack([years - years.mean()] + [(calendar == m).astype(np.float64) for m in seen])
+    y = series[present]
+    coef, _, rank, _ = np.linalg.lstsq(design, y, rcond=None)
+    if rank < design.shape[1]:
+        return None, seasonal
+    residual = y - design @ coef
+    cycle = coef[1:]
+    seasonal[seen] = cycle - cycle.mean()
+
+    n, k = len(y), design.shape[1]
+    # Lag-1 autocorrelation over consecutive months only
+    pairs = np.flatnonzero(np.diff(present) == 1)
+    r1 = 0.0
+    if len(pairs) > 2 and residual.var() > 0:
+        r1 = float(np.corrcoef(residual[pairs], residual[pairs + 1])[0, 1])
+        r1 = min(max(r1, 0.0), 0.99) if np.isfinite(r1) else 0.0
+    n_eff = n * (1 - r1) / (1 + r1)
+    dof = n_eff - k
+    slope = float(coef[0])
+    fit = {"slope": slope, "stderr": None, "ci": None, "r1": r1, "months": n, "effective_n": n_eff}
+    if dof >= 1:
+        xtx_inv = np.linalg.inv(design.T @ design)
+        stderr = float(np.sqrt(residual @ residual / dof * xtx_inv[0, 0]))
+        half = t_quantile(0.5 + confidence / 2, dof) * stderr
+        fit.update(stderr=stderr, ci=(slope - half, slope + half))
+    return fit, seasonal
+
+
+def _month_label(month):
+    return str(np.datetime64(int(month), "M"))
+
+
+def _rounded_list(values, digits):
+    return [round(float(v), digits) if np.isfinite(v) else None for v in values]
+
+
+def _rounded(value, digits):
+    return round(float(value), digits) if value is not None and np.isfinite(value) else None
+
+
+def analyse(store, lat, lon, radius_km=DEFAULT_RADIUS_KM, variable="temperature", band=DEFAULT_BAND,
+            window=DEFAULT_WINDOW):
+    """JSON-ready time-series analysis of ``variable`` in ``band`` within ``radius_km`` of (lat, lon)."""
+    if variable not in VARIABLES:
+        raise ValueError(f"variable must be one of {', '.join(VARIABLES)}")
+    band = tuple(float(d) for d in band)
+    key = (store.version, len(store), round(float(lat), 4), round(float(lon), 4), float(radius_km),
+           variable, band, int(window))
+    cached = _results.get(key)
+    if cached is not None:
+        return cached
+
+    indices = region_indices(store, lat, lon, radius_km)
+    values = store_band_means(store, variable, band)[indices]
+    first, series, counts = monthly_series(store.times[indices], values)
+    result = {
+        "region": {"lat": round(float(lat), 4), "lon": round(float(lon), 4), "radius_km": float(radius_km)},
+        "variable": variable,
+        "units": UNITS[variable],
+        "band": list(band),
+        "window": int(window),
+        "profiles": int(counts.sum()),
+        "months": int(np.isfinite(series).sum()),
+        "series": None,
+        "annual": None,
+        "trend": None,
+        "seasonal_cycle": None,
+    }
+    if first is None:
+        _results.put(key, result)
+        return result
+
+    month_index = first + np.arange(len(series))
+    fit, seasonal = fit_trend(first, series)
+    cycle = seasonal[month_index % 12]
+    deseasonalized = series - np.nan_to_num(cycle)
+    trend_component = rolling_mean(deseasonalized, window)
+    years = month_index // 12 + 1970
+    year_slot = years - years[0]
+    present = np.isfinite(series)
+    year_totals = np.bincount(year_slot[present], weights=series[present], minlength=year_slot[-1] + 1)
+    year_months = np.bincount(year_slot[present], minlength=year_slot[-1] + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        annual = np.where(year_months > 0, year_totals / np.maximum(year_months, 1), np.nan)
+
+    result["series"] = {
+        "month": [_month_label(m) for m in month_index],
+        "mean": _rounded_list(series, 4),
+        "count": counts.tolist(),
+        "rolling": _rounded_list(rolling_mean(series, window), 4),
+        "seasonal": _rounded_list(cycle, 4),
+        "trend_component": _rounded_list(trend_component, 4),
+        "residual": _rounded_list(deseasonalized - trend_component, 4),
+    }
+    result["annual"] = {
+        "year": list(range(int(years[0]), int(years[-1]) + 1)),
+        "mean": _rounded_list(annual, 4),
+        "months": year_months.tolist(),
+    }
+    if fit is not None:
+        ci = fit["ci"]
+        result["trend"] = {
+            "per_decade": _rounded(fit["slope"] * 10, 4),
+            "ci95_per_decade": [_rounded(ci[0] * 10, 4), _rounded(ci[1] * 10, 4)] if ci else None,
+            "stderr_per_decade": _rounded(fit["stderr"] * 10 if fit["stderr"] is not None else None, 4),
+            "significant": bool(ci and (ci[0] > 0 or ci[1] < 0)),
+            "lag1_autocorrelation": _rounded(fit["r1"], 3),
+            "effective_n": _rounded(fit["effective_n"], 1),
+            "months": fit["months"],
+        }
+        result["seasonal_cycle"] = _rounded_list(seasonal, 4)
+    _results.put(key, result)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-series analysis of a region and depth band")
+    sub = parser.add_subparsers(dest="command", required=True)
+    series = sub.add_parser("series", help="monthly series, trend and seasonal cycle")
+    series.add_argument("lat", type=float)
+    series.add_argument("lon", type=float)
+    series.add_argument("--db", default=DB_PATH)
+    series.add_argument("--radius", type=float, default=DEFAULT_RADIUS_KM)
+    series.add_argument("--variable", default="temperature", choices=VARIABLES)
+    series.add_argument("--band", default=",".join(f"{d:g}" for d in DEFAULT_BAND))
+    series.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_store(args.db)
+    print(f"🗂️ {len(store):,} profiles loaded in {time.perf_counter() - started:.1f}s")
+    band = parse_band(args.band)
+    for label in ("cold", "cached"):
+        started = time.perf_counter()
+        result = analyse(store, args.lat, args.lon, args.radius, args.variable, band, args.window)
+        print(f"⏱️ {label}: {(time.perf_counter() - started) * 1e3:.2f} ms")
+    print(f"📈 {result['profiles']:,} profiles over {result['months']} months, "
+          f"{args.variable} {band[0]:g}-{band[1]:g} dbar")
+    if result["annual"]:
+        for year, mean, months in zip(*result["annual"].values()):
+            print(f"   {year}  {'—' if mean is None else f'{mean:8.3f}'}  ({months} months)")
+    trend = result["trend"]
+    if trend:
+        ci = trend["ci95_per_decade"]
+        interval = f" [{ci[0]:+.3f}, {ci[1]:+.3f}]" if ci else ""
+        print(f"📉 Trend {trend['per_decade']:+.3f} {result['units']}/decade{interval} "
+              f"(r1={trend['lag1_autocorrelation']}, n_eff={trend['effective_n']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Memory-mapped vector index with exact and IVF (inverted file) search.
+
+Vectors are stored quantized - int8 with a per-row scale, or float16 - in
+``.npy`` files opened with ``mmap_mode="r"``, so an index over millions
+of rows costs page cache rather than heap and opens instantly.
+
+At build time a coarse k-means quantizer splits the rows into ``nlist``
+lists and the rows are written grouped by list, so every list is one
+contiguous slice of the matrix. A search scores the query against the
+centroids, scans only the ``nprobe`` closest lists and keeps the top k;
+``nprobe >= nlist`` (or ``nprobe=0``) is an exact scan of every row.
+
+Two metrics are supported: ``"ip"`` (inner product; cosine for unit
+vectors, higher is better) and ``"l2"`` (Euclidean distance, lower is
+better).
+
+Layout of an index directory::
+
+    meta.json        dims, count, dtype, metric, nlist, caller metadata
+    vectors.npy      int8 or float16, rows grouped by list
+    scales.npy       float32 per-row dequantization scale (int8 only)
+    sqnorms.npy      float32 squared row norms (l2 only)
+    ids.npy          int64 caller ids, in row order
+    centroids.npy    float32 (nlist, dims)
+    list_offsets.npy int64 (nlist + 1), row range of each list
+"""
+
+import json
+import os
+
+import numpy as np
+
+BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 12
+KMEANS_SAMPLE_PER_LIST = 64
+
+
+def default_nlist(count):
+    """About 4 * sqrt(N) lists; small collections are left as one flat list."""
+    if count < 4096:
+        return 1
+    return int(min(4096, 4 * np.sqrt(count)))
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _assign(x, centroids, metric):
+    """Index of the best centroid for each row of ``x``."""
+    dots = x @ centroids.T
+    if metric == "ip":
+        return np.argmax(dots, axis=1)
+    return np.argmin((centroids * centroids).sum(axis=1)[None, :] - 2 * dots, axis=1)
+
+
+def train_kmeans(sample, nlist, metric, seed=0, iterations=KMEANS_ITERATIONS):
+    """Lloyd's k-means (spherical for ``ip``) on a sample of rows."""
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(sample, centroids, metric)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty lists from random rows so no list is wasted
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        if metric == "ip":
+            centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+def _quantize(block, dtype):
+    if dtype == "int8":
+        scale = np.abs(block).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(block / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+    return block.astype(np.float16), None
+
+
+class VectorIndex:
+    def __init__(self, directory, meta, vectors, scales, sqnorms, ids, centroids, list_offsets):
+        self.directory = directory
+        self.meta = meta
+        self.metric = meta["metric"]
+        self.vectors = vectors
+        self.scales = scales
+        self.sqnorms = sqnorms
+        self.ids = ids
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self._id_order = None
+
+    def __len__(self):
+        return int(self.meta["count"])
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, directory, vectors, ids, dtype="int8", metric="ip", nlist=None, seed=0, meta=None):
+        """Quantize ``vectors`` (float32, N x D), cluster them and write the index to ``directory``."""
+        if dtype not in ("int8", "float16"):
+            raise ValueError("dtype must be 'int8' or 'float16'")
+        if metric not in ("ip", "l2"):
+            raise ValueError("metric must be 'ip' or 'l2'")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        count, dims = vectors.shape
+        nlist = max(1, min(nlist or default_nlist(count), count))
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        rng = np.random.default_rng(seed)
+        if nlist > 1:
+            sample_size = min(count, nlist * KMEANS_SAMPLE_PER_LIST)
+            sample = vectors[np.sort(rng.choice(count, sample_size, replace=False))]
+            centroids = train_kmeans(sample, nlist, metric, seed)
+            assign = np.concatenate([
+                _assign(vectors[start:start + BLOCK_ROWS], centroids, metric)
+                for start in range(0, count, BLOCK_ROWS)
+            ]) if count else np.zeros(0, dtype=np.int64)
+        else:
+            centroids = vectors.mean(axis=0, keepdims=True) if count else np.zeros((1, dims), np.float32)
+            assign = np.zeros(count, dtype=np.int64)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+        out = np.lib.format.open_memmap(os.path.join(directory, "vectors.npy"), mode="w+",
+                                        dtype=np.int8 if dtype == "int8" else np.float16, shape=(count, dims))
+        scales = np.ones(count, dtype=np.float32)
+        sqnorms = np.zeros(count, dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            block = vectors[order[start:start + BLOCK_ROWS]]
+            quantized, scale = _quantize(block, dtype)
+            out[start:start + len(block)] = quantized
+            restored = quantized.astype(np.float32)
+            if scale is not None:
+                scales[start:start + len(block)] = scale
+                restored *= scale[:, None]
+            sqnorms[start:start + len(block)] = (restored * restored).sum(axis=1)
+        out.flush()
+        del out
+
+        if dtype == "int8":
+            np.save(os.path.join(directory, "scales.npy"), scales)
+        if metric == "l2":
+            np.save(os.path.join(directory, "sqnorms.npy"), sqnorms)
+        np.save(os.path.join(directory, "ids.npy"), ids[order])
+        np.save(os.path.join(directory, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(directory, "list_offsets.npy"), list_offsets)
+        full_meta = {"count": count, "dims": dims, "dtype": dtype, "metric": metric, "nlist": nlist,
+                     **(meta or {})}
+        # meta.json last: its presence marks a complete index
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump(full_meta, fh, indent=2)
+        return cls.open(directory)
+
+    @classmethod
+    def open(cls, directory):
+        """Open an index built by ``build``; vectors stay memory-mapped."""
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+
+        def load(name, mmap=False):
+            path = os.path.join(directory, name)
+            return np.load(path, mmap_mode="r" if mmap else None) if os.path.exists(path) else None
+
+        return cls(directory, meta, load("vectors.npy", mmap=True), load("scales.npy"), load("sqnorms.npy"),
+                   load("ids.npy"), load("centroids.npy"), load("list_offsets.npy"))
+
+    def rows_for_ids(self, ids):
+        """Row numbers of the given caller ids (-1 where absent)."""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        sorted_ids = self.ids[self._id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == ids, self._id_order[pos], -1)
+
+    def reconstruct(self, rows):
+        """Dequantized float32 vectors of the given rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def _scan(self, start, stop, query):
+        """Scores of rows [start, stop) against one query (higher is better)."""
+        scores = np.empty(stop - start, dtype=np.float32)
+        for lo in range(start, stop, BLOCK_ROWS):
+            hi = min(stop, lo + BLOCK_ROWS)
+            dots = self.vectors[lo:hi].astype(np.float32) @ query
+            if self.scales is not None:
+                dots *= self.scales[lo:hi]
+            if self.metric == "l2":
+                dots = 2 * dots - self.sqnorms[lo:hi]
+            scores[lo - start:hi - start] = dots
+        return scores
+
+    def probe_lists(self, query, nprobe):
+        """The ``nprobe`` lists closest to the query (all lists when nprobe is 0 or >= nlist)."""
+        if not nprobe or nprobe >= self.nlist:
+            return np.arange(self.nlist)
+        dots = self.centroids @ query
+        if self.metric == "l2":
+            dots = 2 * dots - (self.centroids * self.centroids).sum(axis=1)
+        return np.argpartition(-dots, nprobe - 1)[:nprobe]
+
+    def search(self, query, k=10, nprobe=16):
+        """(ids, scores) of the k best rows; scores are inner products or L2 distances."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        chunks, rows = [], []
+        for lst in self.probe_lists(query, nprobe):
+            start, stop = int(self.list_offsets[lst]), int(self.list_offsets[lst + 1])
+            if stop > start:
+                chunks.append(self._scan(start, stop, query))
+                rows.append(np.arange(start, stop))
+        if not chunks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.concatenate(chunks)
+        rows = np.concatenate(rows)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.lexsort((rows[best], -scores[best]))]
+        result = scores[best]
+        if self.metric == "l2":
+            result = np.sqrt(np.maximum(float(query @ query) - result, 0.0))
+        return self.ids[rows[best]], result
@@ -0,0 +1,103 @@
+"""
+Store benchmark results as JSON baselines and compare runs against them.
+
+Result files look like ``{"meta": {...}, "results": {name: {metric: value}}}``.
+All compared metrics are lower-is-better (seconds, bytes, milliseconds).
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def environment():
+    """Metadata recorded with every result file."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or "unknown",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def resolve_path(name_or_path):
+    """Accept either a file path or a bare baseline name under baselines/."""
+    if os.path.exists(name_or_path) or name_or_path.endswith(".json") or os.sep in name_or_path:
+        return name_or_path
+    return os.path.join(BASELINE_DIR, f"{name_or_path}.json")
+
+
+def save_results(results, name_or_path, meta=None):
+    path = resolve_path(name_or_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {"meta": {**environment(), **(meta or {})}, "results": results}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(name_or_path):
+    with open(resolve_path(name_or_path), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare(baseline, current, metric, threshold):
+    """Rows of (name, baseline, current, ratio, status) for benchmarks in both runs.
+
+    ``status`` is "regressed" when current/baseline exceeds 1 + threshold,
+    "improved" when it is below 1 - threshold, and "ok" otherwise.
+    """
+    rows = []
+    base_results = baseline["results"]
+    for name, values in sorted(current["results"].items()):
+        if name not in base_results or metric not in values or metric not in base_results[name]:
+            continue
+        old, new = base_results[name][metric], values[metric]
+        ratio = new / old if old else float("inf")
+        if ratio > 1 + threshold:
+            status = "regressed"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, old, new, ratio, status))
+    return rows
+
+
+def print_comparison(rows, metric, threshold):
+    """Print a comparison table; returns 1 if anything regressed, else 0."""
+    width = max([len(r[0]) for r in rows] + [9])
+    print(f"{'benchmark':<{width}}  {'baseline':>12}  {'current':>12}  {'ratio':>7}  status")
+    for name, old, new, ratio, status in rows:
+        marker = {"regressed": "❌", "improved": "✅"}.get(status, "  ")
+        print(f"{name:<{width}}  {old:>12.6g}  {new:>12.6g}  {ratio:>7.2f}  {marker} {status}")
+    regressed = [r for r in rows if r[4] == "regressed"]
+    print()
+    print(f"{len(rows)} compared on '{metric}', {len(regressed)} regressed beyond {threshold:.0%}")
+    return 1 if regressed else 0
+
+
+def add_compare_arguments(parser, default_metric):
+    parser.add_argument("baseline", help="baseline name (under benchmarks/baselines) or JSON path")
+    parser.add_argument("current", help="result name or JSON path to check against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (default 0.10)")
+    parser.add_argument("--metric", default=default_metric, help=f"metric to compare (default {default_metric})")
+
+
+def run_compare(args):
+    rows = compare(load_results(args.baseline), load_results(args.current), args.metric, args.threshold)
+    sys.exit(print_comparison(rows, args.metric, args.threshold))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the API hot paths.
+
+Times location parsing, intent inference, profile generation, analysis
+text and the full ``/query`` round trip through the Flask test client
+against the fixed corpus in corpus.py.
+
+    python benchmarks/bench_api.py run --save main          # record a baseline
+    python benchmarks/bench_api.py run --save current
+    python benchmarks/bench_api.py compare main current --threshold 0.10
+
+baselines/main.json is a reference run against dummy.db; its "meta" block
+records the commit and machine. Timings only compare on the same machine,
+so re-record ``main`` locally (first command above) before comparing, and
+commit it again when an intended change moves the numbers.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "api"))
+# Keep per-request log lines out of the benchmark output.
+os.environ.setdefault("FLOATCHAT_LOG_LEVEL", "WARNING")
+
+import main as api  # noqa: E402
+from baseline import add_compare_arguments, run_compare, save_results  # noqa: E402
+from corpus import QUERIES  # noqa: E402
+
+
+def _resolved(query):
+    """(lat, lon, location_desc) for a query, as handle_query resolves it."""
+    return api._resolve_location(query.lower())
+
+
+def bench_parse_location():
+    lowered = [q.lower() for q in QUERIES]
+
+    def run():
+        for q in lowered:
+            api._parse_location_from_query(q)
+    return run
+
+
+def bench_infer_intent():
+    lowered = [q.lower() for q in QUERIES]
+
+    def run():
+        for q in lowered:
+            api._infer_intent(q)
+    return run
+
+
+def bench_generate_profile():
+    cases = [(q.lower(),) + _resolved(q)[:2] for q in QUERIES]
+
+    def run():
+        for q, lat, lon in cases:
+            api.generate_realistic_profile(lat, lon, q)
+    return run
+
+
+def bench_generate_analysis():
+    cases = []
+    for q in QUERIES:
+        lat, lon, desc = _resolved(q)
+        cases.append((api.generate_realistic_profile(lat, lon, q.lower()), desc, lat, lon, q))
+
+    def run():
+        for depths, desc, lat, lon, q in cases:
+            api.generate_detailed_analysis(depths, desc, lat, lon, q)
+    return run
+
+
+def bench_handle_query():
+    client = api.app.test_client()
+
+    def run():
+        for q in QUERIES:
+            response = client.post("/query", json={"query": q})
+            assert response.status_code == 200, response.data
+    return run
+
+
+BENCHMARKS = {
+    "parse_location": bench_parse_location,
+    "infer_intent": bench_infer_intent,
+    "generate_realistic_profile": bench_generate_profile,
+    "generate_detailed_analysis": bench_generate_analysis,
+    "handle_query_roundtrip": bench_handle_query,
+}
+
+
+def measure(run, rounds, min_round_time):
+    """Per-corpus-pass timings: calibrate loops per round, then collect ``rounds`` samples."""
+    run()  # warm-up
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - started) / loops)
+    per_query = len(QUERIES)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "per_query_median": statistics.median(samples) / per_query,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def run_benchmarks(args):
+    selected = args.only or list(BENCHMARKS)
+    results = {}
+    print(f"📊 {len(selected)} benchmarks over {len(QUERIES)} queries")
+    for name in selected:
+        stats = measure(BENCHMARKS[name](), args.rounds, args.min_round_time)
+        results[name] = stats
+        print(f"  {name:<28} median {stats['median'] * 1e3:9.3f} ms/pass  "
+              f"({stats['per_query_median'] * 1e6:8.1f} µs/query, ±{stats['stdev'] * 1e3:.3f} ms)")
+    if args.save:
+        path = save_results(results, args.save, {"suite": "api", "corpus_size": len(QUERIES)})
+        print(f"✅ Saved results to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FloatChat API benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmarks")
+    run.add_argument("--rounds", type=int, default=15)
+    run.add_argument("--min-round-time", type=float, default=0.05, help="seconds per timed round")
+    run.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    run.add_argument("--save", help="baseline name (under benchmarks/baselines) or JSON path")
+
+    cmp = sub.add_parser("compare", help="flag regressions against a stored baseline")
+    add_compare_arguments(cmp, default_metric="median")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_benchmarks(args)
+    else:
+        run_compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Scale benchmarks for the frontend data paths, run headless (no Streamlit).
+
+Covers the profiles loader behind ``load_data``, the depth-time
+filter and pivot, ``compute_cumulative_distance`` and ``find_nearest`` on
+synthetic datasets from 10^3 up to 10^7 rows. Each (function, size) records
+wall time, tracemalloc peak and RSS growth, and the log-log slope between
+sizes is reported so superlinear (e.g. quadratic) scaling stands out.
+
+    python benchmarks/bench_frontend.py run --max-rows 1000000 --save frontend-main
+    python benchmarks/bench_frontend.py compare frontend-main frontend-current
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "frontend"))
+sys.path.insert(0, os.path.join(HERE, "..", "ingestion"))
+
+from baseline import add_compare_arguments, run_compare, save_results  # noqa: E402
+from dataset import depth_time_grid, filter_depth_time, load_profiles  # noqa: E402
+from synthetic import STANDARD_PRESSURES, generate_batches, write_sqlite  # noqa: E402
+from trajectories import compute_cumulative_distance, find_nearest  # noqa: E402
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+SUPERLINEAR_SLOPE = 1.3  # log-log slope above which scaling is flagged
+
+
+def _rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _batches(rows, seed=7):
+    profiles = -(-rows // len(STANDARD_PRESSURES))
+    floats = max(5, profiles // 50)
+    return generate_batches(profiles, floats, STANDARD_PRESSURES, "2015-01-01", 10, seed, 200_000)
+
+
+def synthetic_frame(rows):
+    """Exactly ``rows`` synthetic observations with the map/depth-time page columns."""
+    frames = [pd.DataFrame(batch) for batch in _batches(rows)]
+    df = pd.concat(frames, ignore_index=True).iloc[:rows]
+    df["time"] = pd.to_datetime(df["time"])
+    return df.sort_values(["float_id", "time"], kind="stable").reset_index(drop=True)
+
+
+def synthetic_database(rows, directory):
+    path = os.path.join(directory, f"profiles_{rows}.db")
+    if not os.path.exists(path):
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_sqlite(path, _batches(rows))
+    return path
+
+
+def setup_load_data(df, rows, workdir):
+    conn = sqlite3.connect(synthetic_database(rows, workdir))
+    columns = ["salinity", "temperature", "air_temp", "oxygen"]
+    return lambda: load_profiles(conn, columns)
+
+
+def setup_depth_time_filter(df, rows, workdir):
+    first = df.iloc[0]
+    time_from, time_to = df["time"].min().date(), df["time"].max().date()
+    depth_from, depth_to = df["depth"].min(), df["depth"].max()
+    indexed = df.set_index("time").sort_index(kind="stable")
+    return lambda: filter_depth_time(indexed, time_from, time_to, depth_from, depth_to,
+                                     first["latitude"], first["longitude"])
+
+
+def setup_depth_time_pivot(df, rows, workdir):
+    # Worst case for the heatmap: a location box wide enough to keep every row.
+    indexed = df.set_index("time").sort_index(kind="stable")
+    return lambda: depth_time_grid(indexed, "salinity")
+
+
+def setup_cumulative_distance(df, rows, workdir):
+    frame = df[["float_id", "time", "latitude", "longitude"]]
+    return lambda: compute_cumulative_distance(frame)
+
+
+def setup_find_nearest(df, rows, workdir):
+    return lambda: find_nearest(df, 15.0, 82.0)
+
+
+BENCHMARKS = {
+    "load_data": setup_load_data,
+    "depth_time_filter": setup_depth_time_filter,
+    "depth_time_pivot": setup_depth_time_pivot,
+    "cumulative_distance": setup_cumulative_distance,
+    "find_nearest": setup_find_nearest,
+}
+
+
+def measure(fn, trace_memory):
+    """Wall time of an untraced call, then tracemalloc peak and RSS growth of a traced call."""
+    gc.collect()
+    started = time.perf_counter()
+    fn()
+    wall = time.perf_counter() - started
+    result = {"wall_s": wall}
+    if trace_memory:
+        gc.collect()
+        rss_before = _rss_bytes()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mb"] = peak / 2**20
+        result["rss_delta_mb"] = max(_rss_bytes() - rss_before, 0) / 2**20
+    return result
+
+
+def scaling_slopes(results, name, sizes):
+    """Log-log slopes of wall time between consecutive measured sizes."""
+    points = [(n, results[f"{name}@{n}"]["wall_s"]) for n in sizes if f"{name}@{n}" in results]
+    slopes = []
+    for (n1, t1), (n2, t2) in zip(points, points[1:]):
+        if t1 > 0 and t2 > 0:
+            slopes.append((n2, math.log(t2 / t1) / math.log(n2 / n1)))
+    return slopes
+
+
+def run_benchmarks(args):
+    sizes = sorted(n for n in (args.sizes or DEFAULT_SIZES) if n <= args.max_rows)
+    selected = args.only or list(BENCHMARKS)
+    last_wall = {}
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="floatchat-bench-") as workdir:
+        previous_rows = None
+        for rows in sizes:
+            print(f"📊 {rows:,} rows")
+            df = synthetic_frame(rows)
+            for name in selected:
+                # Linear projection from the previous size; superlinear code only gets slower.
+                if name in last_wall and last_wall[name] * rows / previous_rows > args.budget:
+                    print(f"  {name:<22} skipped (projected beyond the {args.budget:.0f}s budget)")
+                    continue
+                stats = measure(BENCHMARKS[name](df, rows, workdir), not args.no_memory)
+                stats["rows"] = rows
+                results[f"{name}@{rows}"] = stats
+                memory = (f"  peak {stats['peak_mb']:9.1f} MB  rss +{stats['rss_delta_mb']:8.1f} MB"
+                          if "peak_mb" in stats else "")
+                print(f"  {name:<22} {stats['wall_s'] * 1e3:11.1f} ms{memory}")
+                last_wall[name] = stats["wall_s"]
+            previous_rows = rows
+            del df
+
+    print()
+    print("Scaling (log-log slope of wall time; 1.0 = linear, 2.0 = quadratic)")
+    for name in selected:
+        slopes = scaling_slopes(results, name, sizes)
+        if not slopes:
+            continue
+        text = ", ".join(f"{s:.2f}@{n:.0e}" for n, s in slopes)
+        worst = max(s for _, s in slopes)
+        flag = "  ⚠️ superlinear" if worst > SUPERLINEAR_SLOPE else ""
+        print(f"  {name:<22} {text}{flag}")
+
+    if args.save:
+        path = save_results(results, args.save, {"suite": "frontend", "sizes": sizes})
+        print(f"✅ Saved results to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FloatChat frontend scale benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the scale benchmarks")
+    run.add_argument("--sizes", type=int, nargs="+", help="row counts (default 1e3..1e7)")
+    run.add_argument("--max-rows", type=int, default=10**6, help="skip sizes above this (default 1e6)")
+    run.add_argument("--budget", type=float, default=30.0,
+                     help="skip sizes where a benchmark is projected to take longer than this many seconds")
+    run.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    run.add_argument("--no-memory", action="store_true", help="skip the traced memory pass")
+    run.add_argument("--save", help="baseline name (under benchmarks/baselines) or JSON path")
+
+    cmp = sub.add_parser("compare", help="flag regressions against a stored baseline")
+    add_compare_arguments(cmp, default_metric="wall_s")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_benchmarks(args)
+    else:
+        run_compare(args)
+
+
+if __name__ == "__main__":
+    main()
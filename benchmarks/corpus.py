@@ -0,0 +1,33 @@
+"""
+Fixed query corpus shared by the benchmarks and the load generator.
+
+The mix covers every branch of the request path: explicit coordinates in
+both supported notations, named places, unresolved text (random ocean
+location), and the temperature/salinity/oxygen, trend and extremes intents.
+"""
+
+QUERIES = [
+    # Coordinates
+    "Show temperature profile at lat 12.9 lon 77.6",
+    "latitude: -43.037, longitude: 130 salinity profile",
+    "ocean data at 15.5N 65.2E",
+    "detailed temperature structure at 10S 140W",
+    # Place names
+    "Find temperature data near Mumbai",
+    "Show salinity profiles near the equator",
+    "What's the salinity trend in the Pacific Ocean?",
+    "Arabian sea oxygen levels",
+    "atlantic thermocline depth",
+    "indian ocean high-resolution profile",
+    # Intents
+    "monthly temperature change over time near india",
+    "yearly salinity increase in the arabian sea",
+    "highest temperature anomaly at lat 5 lon 80",
+    "lowest dissolved oxygen peak in the pacific",
+    # Unresolved locations
+    "show me an ocean profile",
+    "sea water pressure and conductivity",
+]
+
+# Relative weights used by the load generator to replay a realistic mix.
+WEIGHTS = [4, 2, 2, 1, 5, 4, 3, 3, 2, 1, 2, 1, 1, 1, 2, 1]
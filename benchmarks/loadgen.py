@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Load generator for the /query endpoint.
+
+Replays the weighted query mix from corpus.py against a running (or
+locally started) API at a fixed concurrency, either closed-loop (each
+worker sends as fast as responses come back) or open-loop at a target
+request rate. Latency is measured from the scheduled send time, so a
+saturated server shows up as queueing delay instead of being hidden.
+
+    python benchmarks/loadgen.py run --start-server --concurrency 16 --rate 200 --duration 30 \
+        --server-mode threaded --save load-threaded
+    python benchmarks/loadgen.py compare load-threaded load-current --metric p95_ms
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from baseline import add_compare_arguments, run_compare, save_results  # noqa: E402
+from corpus import QUERIES, WEIGHTS  # noqa: E402
+
+API_MAIN = os.path.join(HERE, "..", "api", "main.py")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles (ms) and error rates for a list of samples."""
+    latencies = sorted(s["latency"] * 1e3 for s in samples)
+    errors = [s for s in samples if s["error"]]
+    return {
+        "requests": len(samples),
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else float("nan"),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else float("nan"),
+        "mean_bytes": sum(s["bytes"] for s in samples) / len(samples) if samples else 0.0,
+        "error_rate": len(errors) / len(samples) if samples else 0.0,
+        "status_codes": dict(Counter(str(s["status"]) for s in samples)),
+        "error_types": dict(Counter(s["error"] for s in errors)),
+    }
+
+
+class Worker(threading.Thread):
+    """One persistent HTTP connection issuing requests from a shared schedule."""
+
+    def __init__(self, target, next_slot, stop_at, samples, lock, seed, timeout, headers=None):
+        super().__init__(daemon=True)
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.target = target
+        self.next_slot = next_slot
+        self.stop_at = stop_at
+        self.samples = samples
+        self.lock = lock
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.conn = None
+
+    def _connect(self):
+        self.conn = http.client.HTTPConnection(self.target.hostname, self.target.port or 80, timeout=self.timeout)
+
+    def _send(self, query):
+        if self.conn is None:
+            self._connect()
+        body = json.dumps({"query": query})
+        self.conn.request("POST", self.target.path or "/query", body=body, headers=self.headers)
+        response = self.conn.getresponse()
+        return response.status, len(response.read())
+
+    def run(self):
+        while True:
+            scheduled = self.next_slot()
+            if scheduled is None or scheduled > self.stop_at:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            query = self.rng.choices(QUERIES, WEIGHTS)[0]
+            status, size, error = 0, 0, ""
+            try:
+                status, size = self._send(query)
+                if status >= 400:
+                    error = f"HTTP {status}"
+            except (OSError, http.client.HTTPException) as exc:
+                error = type(exc).__name__
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+            finished = time.perf_counter()
+            with self.lock:
+                self.samples.append({
+                    "query": query,
+                    "status": status,
+                    "error": error,
+                    "bytes": size,
+                    "latency": finished - scheduled,
+                })
+        if self.conn is not None:
+            self.conn.close()
+
+
+def make_schedule(rate, max_requests, start):
+    """Thread-safe slot dispenser: fixed-interval send times (open loop) or 'now' (closed loop)."""
+    lock = threading.Lock()
+    issued = [0]
+
+    def next_slot():
+        with lock:
+            if max_requests and issued[0] >= max_requests:
+                return None
+            n = issued[0]
+            issued[0] += 1
+        return start + n / rate if rate else time.perf_counter()
+    return next_slot
+
+
+def wait_for_server(url, timeout=20.0):
+    target = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=1)
+        try:
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.2)
+    return False
+
+
+def run_load(args):
+    server = None
+    if args.start_server:
+        server = subprocess.Popen([sys.executable, API_MAIN], stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL, cwd=os.path.dirname(API_MAIN))
+        if not wait_for_server(args.url):
+            server.terminate()
+            raise SystemExit("❌ API did not start; run it manually and drop --start-server")
+
+    try:
+        samples, lock = [], threading.Lock()
+        start = time.perf_counter() + 0.1
+        stop_at = start + args.duration
+        schedule = make_schedule(args.rate, args.requests, start)
+        target = urlsplit(args.url)
+        headers = {"Accept": args.accept}
+        if args.accept_encoding:
+            headers["Accept-Encoding"] = args.accept_encoding
+        workers = [Worker(target, schedule, stop_at, samples, lock, args.seed + i, args.timeout, headers)
+                   for i in range(args.concurrency)]
+        mode = f"open loop at {args.rate:g} req/s" if args.rate else "closed loop"
+        print(f"🚀 {args.concurrency} workers, {mode}, {args.duration:g}s against {args.url}")
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    overall = summarize(samples, elapsed)
+    results = {"all": overall}
+    for query in QUERIES:
+        subset = [s for s in samples if s["query"] == query]
+        if subset:
+            results[f"query:{query}"] = summarize(subset, elapsed)
+
+    print(f"  requests     {overall['requests']:,}")
+    print(f"  throughput   {overall['throughput_rps']:.1f} req/s")
+    print(f"  latency ms   p50 {overall['p50_ms']:.1f}  p95 {overall['p95_ms']:.1f}  "
+          f"p99 {overall['p99_ms']:.1f}  max {overall['max_ms']:.1f}")
+    print(f"  body bytes   {overall['mean_bytes']:.0f} mean ({args.accept}"
+          f"{', ' + args.accept_encoding if args.accept_encoding else ''})")
+    print(f"  errors       {overall['error_rate']:.2%} {overall['error_types'] or ''}")
+
+    if args.save:
+        meta = {
+            "suite": "load",
+            "server_mode": args.server_mode,
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "accept": args.accept,
+            "accept_encoding": args.accept_encoding,
+        }
+        path = save_results(results, args.save, meta)
+        print(f"✅ Saved report to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FloatChat /query load generator")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="generate load and report latency percentiles")
+    run.add_argument("--url", default=os.getenv("QUERY_API", "http://127.0.0.1:5000/query"))
+    run.add_argument("--start-server", action="store_true", help="launch api/main.py for the run")
+    run.add_argument("--server-mode", default="threaded", help="label recorded in the report")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--rate", type=float, default=0.0, help="target req/s; 0 = closed loop")
+    run.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    run.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no cap)")
+    run.add_argument("--timeout", type=float, default=30.0)
+    run.add_argument("--accept", default="application/json", help="Accept header, e.g. application/msgpack")
+    run.add_argument("--accept-encoding", default="", help="Accept-Encoding header, e.g. gzip")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--save", help="report name (under benchmarks/baselines) or JSON path")
+
+    cmp = sub.add_parser("compare", help="compare two load reports")
+    add_compare_arguments(cmp, default_metric="p95_ms")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_load(args)
+    else:
+        run_compare(args)
+
+
+if __name__ == "__main__":
+    main()
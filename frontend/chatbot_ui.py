@@ -5,8 +5,24 @@ import json
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+import secrets
 from dotenv import load_dotenv
 
+try:
+    import msgpack
+except ImportError:  # optional: fall back to columnar JSON
+    msgpack = None
+
+COLUMNAR_JSON = "application/vnd.floatchat.columnar+json"
+MSGPACK = "application/msgpack"
+# Compact columnar layouts first; the row JSON layout is still accepted.
+ACCEPT = ", ".join(
+    ([MSGPACK] if msgpack is not None else []) + [f"{COLUMNAR_JSON};q=0.9", "application/json;q=0.5"]
+)
+
+# Observed profiles fetched alongside the modelled answer
+MATCH_LIMIT = int(os.getenv("FLOATCHAT_MATCH_LIMIT", "5"))
+
 def is_ocean_data_query(user_input):
     """Check if the user input is related to ocean data."""
     keywords = [
@@ -25,21 +41,78 @@ def fall_back_query(user_input):
     )
 
 
-def query_backend(user_query):
-    """Query the backend API at http://127.0.0.1:5000/query"""
+def parse_server_timing(header):
+    """Parse a Server-Timing header into {name: milliseconds}."""
+    timings = {}
+    for entry in (header or "").split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        if not parts[0]:
+            continue
+        for param in parts[1:]:
+            if param.startswith("dur="):
+                try:
+                    timings[parts[0]] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+
+def decode_response(response):
+    """Decode a /query body according to its Content-Type."""
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+    if content_type == MSGPACK and msgpack is not None:
+        return msgpack.unpackb(response.content, raw=False)
+    return response.json()
+
+
+def query_backend(user_query, timing=None):
+    """Query the backend API at http://127.0.0.1:5000/query
+
+    Each call starts a new trace and sends it as a W3C ``traceparent`` header.
+    If ``timing`` is given it is filled with the trace id, the client-side
+    round trip and the server's per-stage Server-Timing breakdown (ms).
+    Responses carrying an ETag are kept for the session and revalidated with
+    If-None-Match, so repeated questions are answered by a 304.
+    """
     load_dotenv()
+    trace_id = secrets.token_hex(16)
+    if timing is not None:
+        timing["trace_id"] = trace_id
+    cache = st.session_state.setdefault("response_cache", {})
+    cache_key = " ".join(user_query.lower().split())
+    cached = cache.get(cache_key)
     try:
         query_api = os.getenv("QUERY_API", default="http://127.0.0.1:5000/query")
 
+        started = time.perf_counter()
         response = requests.post(
             query_api, 
-            json={"query": user_query},
-            headers={"Content-Type": "application/json"},
+            json={"query": user_query, "limit": MATCH_LIMIT},
+            headers={
+                "Content-Type": "application/json",
+                "Accept": ACCEPT,
+                "traceparent": f"00-{trace_id}-{secrets.token_hex(8)}-01",
+                **({"If-None-Match": cached[0]} if cached else {}),
+            },
             timeout=30
         )
+        if timing is not None:
+            timing["round_trip_ms"] = (time.perf_counter() - started) * 1e3
+            timing["server"] = parse_server_timing(response.headers.get("Server-Timing"))
         
-        if response.status_code == 200:
-            return response.json()
+        if response.status_code == 304 and cached:
+            if timing is not None:
+                timing["not_modified"] = True
+            return cached[1]
+        elif response.status_code == 200:
+            data = decode_response(response)
+            if response.headers.get("ETag"):
+                cache[cache_key] = (response.headers["ETag"], data)
+            return data
+        elif response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After", "a few")
+            st.warning(f"The ocean data service is busy right now. Please try again in {retry_after} seconds.")
+            return None
         else:
             st.error(f"Backend error: {response.status_code}")
             return None
@@ -52,19 +125,97 @@ def query_backend(user_query):
         st.error(f"Error: {str(e)}")
         return None
 
-def create_ocean_data_charts(depth_data):
+def is_compare_query(user_input):
+    """Comparisons ("compare ...", "... vs ...") go to /compare first."""
+    lower = f" {user_input.lower()} "
+    return "compare" in lower or " vs " in lower or " vs. " in lower or " versus " in lower
+
+
+def compare_backend(user_query):
+    """Ask /compare to evaluate the locations or periods in the question.
+
+    Returns the comparison, or None when the question names fewer than two
+    subjects (the caller then answers it as a normal query).
+    """
+    load_dotenv()
+    query_api = os.getenv("QUERY_API", default="http://127.0.0.1:5000/query")
+    compare_api = os.getenv("COMPARE_API", default=query_api.rsplit("/", 1)[0] + "/compare")
+    try:
+        response = requests.post(compare_api, json={"query": user_query}, timeout=30)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code in (429, 503):
+        retry_after = response.headers.get("Retry-After", "a few")
+        st.warning(f"The ocean data service is busy right now. Please try again in {retry_after} seconds.")
+    return None
+
+
+COMPARE_COLORS = ['#ff6b6b', '#4ecdc4', '#ffd166', '#a29bfe', '#fd79a8', '#55efc4']
+
+def create_comparison_chart(comparison):
+    """Overlaid temperature and salinity profiles of every compared subject."""
+    if not comparison or not comparison.get("subjects"):
+        return None
+    pressures = comparison["pressures"]
+    fig = make_subplots(rows=1, cols=2, subplot_titles=['Temperature vs Depth', 'Salinity vs Depth'])
+    for n, subject in enumerate(comparison["subjects"]):
+        color = COMPARE_COLORS[n % len(COMPARE_COLORS)]
+        observed = subject.get("observed") if comparison.get("basis") == "observed" else None
+        for col, (variable, units) in enumerate((("temperature", "°C"), ("salinity", "PSU")), start=1):
+            values = observed["mean"][variable] if observed else subject["model"][variable]
+            spread = observed["std"][variable] if observed else None
+            fig.add_trace(
+                go.Scatter(
+                    x=values,
+                    y=pressures,
+                    error_x=dict(type='data', array=spread, visible=True, thickness=1) if spread else None,
+                    mode='lines+markers',
+                    name=subject["label"],
+                    legendgroup=subject["label"],
+                    showlegend=col == 1,
+                    line=dict(color=color, width=3),
+                    marker=dict(size=6, color=color),
+                    hovertemplate=f'<b>{subject["label"]}</b><br>%{{x:.2f}} {units}<br>Depth: %{{y:.1f}} dbar<extra></extra>'
+                ),
+                row=1, col=col
+            )
+    fig.update_layout(
+        title=dict(text='Profile Comparison', font=dict(size=20, color='black'), x=0.5),
+        height=450,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        legend=dict(orientation="h", y=-0.2)
+    )
+    fig.update_xaxes(title_text="Temperature (°C)", gridcolor='rgba(255,255,255,0.1)', row=1, col=1)
+    fig.update_xaxes(title_text="Salinity (PSU)", gridcolor='rgba(255,255,255,0.1)', row=1, col=2)
+    fig.update_yaxes(title_text="Pressure (dbar)", autorange="reversed", gridcolor='rgba(255,255,255,0.1)')
+    return fig
+
+def create_ocean_data_charts(depth_data, derived=None):
     """Create beautiful charts for ocean data visualization"""
     if not depth_data:
         return None
-    
-    pressures = [d["pres"] for d in depth_data]
-    temperatures = [d["temp"] for d in depth_data]
-    salinities = [d["salinity"] for d in depth_data]
-    
+    # Server-side derived quantities add a density panel and the mixed-layer depth
+    density = derived.get("sigma0") if derived else None
+    
+    if isinstance(depth_data, dict):
+        # Columnar layout: one array per variable
+        pressures = depth_data["pres"]
+        temperatures = depth_data["temp"]
+        salinities = depth_data["salinity"]
+    else:
+        pressures = [d["pres"] for d in depth_data]
+        temperatures = [d["temp"] for d in depth_data]
+        salinities = [d["salinity"] for d in depth_data]
+    
+    titles = ['Temperature vs Depth', 'Salinity vs Depth'] + (['Density (σ₀) vs Depth'] if density else [])
     fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=('Temperature vs Depth', 'Salinity vs Depth'),
-        specs=[[{"secondary_y": False}, {"secondary_y": False}]]
+        rows=1, cols=len(titles),
+        subplot_titles=titles,
+        specs=[[{"secondary_y": False}] * len(titles)]
     )
     
     fig.add_trace(
@@ -93,6 +244,31 @@ def create_ocean_data_charts(depth_data):
         row=1, col=2
     )
     
+    if density:
+        n2 = derived.get("n2") or [None] * len(density)
+        fig.add_trace(
+            go.Scatter(
+                x=density,
+                y=pressures,
+                customdata=[[v if v is not None else float("nan")] for v in n2],
+                mode='lines+markers',
+                name='Density',
+                line=dict(color='#ffd166', width=3),
+                marker=dict(size=6, color='#ffd166'),
+                hovertemplate='<b>Density</b><br>σ₀: %{x:.3f} kg/m³<br>N²: %{customdata[0]:.2e} s⁻²<br>Depth: %{y:.1f} dbar<extra></extra>'
+            ),
+            row=1, col=3
+        )
+        fig.update_xaxes(title_text="σ₀ (kg/m³)", gridcolor='rgba(255,255,255,0.1)', row=1, col=3)
+        fig.update_yaxes(title_text="Pressure (dbar)", autorange="reversed",
+                         gridcolor='rgba(255,255,255,0.1)', row=1, col=3)
+    
+    if derived and derived.get("mld") is not None:
+        fig.add_hline(
+            y=derived["mld"], line_dash="dash", line_color="rgba(255,255,255,0.6)",
+            annotation_text=f"MLD {derived['mld']:.0f} m", annotation_position="bottom right",
+            row="all", col="all"
+        )
     
     fig.update_layout(
         title=dict(
@@ -132,6 +308,45 @@ def create_ocean_data_charts(depth_data):
     
     return fig
 
+def create_trend_chart(trend):
+    """Monthly series of a trend query: monthly means, running mean and deseasonalized trend."""
+    if not trend or not trend.get("series"):
+        return None
+    series, units = trend["series"], trend["units"]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=series["month"], y=series["mean"], customdata=series["count"],
+        mode='markers', name='Monthly mean',
+        marker=dict(size=6, color='#4ecdc4'),
+        hovertemplate=f'%{{x}}<br>%{{y:.3f}} {units}<br>%{{customdata}} profiles<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        x=series["month"], y=series["rolling"], mode='lines', name=f"{trend['window']}-month mean",
+        line=dict(color='#ff6b6b', width=3), connectgaps=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=series["month"], y=series["trend_component"], mode='lines', name='Deseasonalized',
+        line=dict(color='#ffd166', width=2, dash='dash'), connectgaps=False
+    ))
+    title = f"{trend['variable'].title()} {trend['band'][0]:g}–{trend['band'][1]:g} m"
+    fit = trend.get("trend")
+    if fit:
+        ci = fit.get("ci95_per_decade")
+        title += f": {fit['per_decade']:+.2f} {units}/decade"
+        if ci:
+            title += f" (95% CI {ci[0]:+.2f} to {ci[1]:+.2f})"
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=16, color='black'), x=0.5),
+        height=350,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        legend=dict(orientation="h", y=-0.2)
+    )
+    fig.update_xaxes(gridcolor='rgba(255,255,255,0.1)')
+    fig.update_yaxes(title_text=f"{trend['variable'].title()} ({units})", gridcolor='rgba(255,255,255,0.1)')
+    return fig
+
 def show_thinking_animation():
     """Display thinking animation"""
     thinking_placeholder = st.empty()
@@ -161,6 +376,76 @@ def display_metadata(data):
     """
     st.markdown(metadata_html, unsafe_allow_html=True)
 
+def display_observed_matches(matches):
+    """Table of the ranked observed profiles returned after the modelled one."""
+    if not matches:
+        return
+    with st.expander(f"🔎 {len(matches)} closest observed profiles"):
+        st.dataframe(
+            [
+                {
+                    "Rank": m.get("rank"),
+                    "Profile": m.get("profile_id"),
+                    "Time": m.get("time"),
+                    "Lat": m.get("lat"),
+                    "Lon": m.get("lon"),
+                    "Distance (km)": m.get("distance_km"),
+                    "Score": m.get("score"),
+                    "MLD (m)": (m.get("derived") or {}).get("mld"),
+                    "Peak N² (s⁻²)": (m.get("derived") or {}).get("n2_max"),
+                }
+                for m in matches
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+def display_extremes(extremes):
+    """Table of the record values found for a max/min/anomaly query."""
+    if not extremes or not extremes.get("results"):
+        return
+    label = {"max": "Highest", "min": "Lowest", "anomaly": "Largest anomalies in"}[extremes["kind"]]
+    with st.expander(f"🏔️ {label} {extremes['variable']} ({extremes['units']})"):
+        st.dataframe(
+            [
+                {
+                    "Profile": hit.get("profile_id"),
+                    "Time": hit.get("time"),
+                    "Lat": hit.get("lat"),
+                    "Lon": hit.get("lon"),
+                    "Value": hit.get("value"),
+                    "Depth (m)": hit.get("depth"),
+                    "Distance (km)": hit.get("distance_km"),
+                }
+                for hit in extremes["results"]
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+def display_timing_panel(timing):
+    """Debug panel with the timing breakdown of the last chat turn."""
+    if not timing:
+        st.caption("No timed turn yet.")
+        return
+    server = timing.get("server", {})
+    server_total = server.get("total", 0.0)
+    round_trip = timing.get("round_trip_ms", 0.0)
+    rows = [
+        ("Thinking animation", timing.get("animation_ms", 0.0)),
+        ("query_backend round trip", round_trip),
+        ("  network + HTTP overhead", max(round_trip - server_total, 0.0)),
+        ("  handle_query on server", server_total),
+    ]
+    rows += [(f"    {name}", ms) for name, ms in server.items() if name != "total"]
+    rows += [
+        ("Rendering answer and chart", timing.get("render_ms", 0.0)),
+        ("Whole turn", timing.get("turn_ms", 0.0)),
+    ]
+    st.caption(f"Trace id: `{timing.get('trace_id', 'n/a')}`"
+               + (" · served from session cache (304)" if timing.get("not_modified") else ""))
+    st.table({"Step": [r[0] for r in rows], "ms": [f"{r[1]:.1f}" for r in rows]})
+
 def show_chatbot_ui():
     st.set_page_config(
         page_title="FloatChat", 
@@ -311,6 +596,10 @@ def show_chatbot_ui():
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    if st.checkbox("Show timing of the last turn", key="show_timing_debug"):
+        with st.expander("⏱️ Last turn timing", expanded=True):
+            display_timing_panel(st.session_state.get("last_turn_timing"))
+
     with st.container():
         for msg in st.session_state.messages:
             if msg["role"] == "user":
@@ -324,10 +613,21 @@ def show_chatbot_ui():
                         display_metadata(msg["metadata"])
                     
                     if "chart_data" in msg:
-                        chart = create_ocean_data_charts(msg["chart_data"])
+                        chart = create_ocean_data_charts(msg["chart_data"], msg.get("metadata", {}).get("derived"))
                         if chart:
                             st.plotly_chart(chart, use_container_width=True, config={'displayModeBar': False})
 
+                    trend_chart = create_trend_chart(msg.get("metadata", {}).get("trend"))
+                    if trend_chart:
+                        st.plotly_chart(trend_chart, use_container_width=True, config={'displayModeBar': False})
+
+                    comparison_chart = create_comparison_chart(msg.get("comparison"))
+                    if comparison_chart:
+                        st.plotly_chart(comparison_chart, use_container_width=True, config={'displayModeBar': False})
+
+                    display_extremes(msg.get("metadata", {}).get("extremes"))
+                    display_observed_matches(msg.get("matches"))
+
     if user_input := st.chat_input("Ask me about ocean data..."):
 
         st.session_state.messages.append({"role": "user", "content": user_input})
@@ -336,11 +636,24 @@ def show_chatbot_ui():
 
         with st.chat_message("assistant"):
             if is_ocean_data_query(user_input):
+                timing = {}
+                turn_started = time.perf_counter()
                 thinking_placeholder = show_thinking_animation()
-                response_data = query_backend(user_input)
+                timing["animation_ms"] = (time.perf_counter() - turn_started) * 1e3
+                comparison = compare_backend(user_input) if is_compare_query(user_input) else None
+                response_data = None if comparison else query_backend(user_input, timing)
                 thinking_placeholder.empty()
+                render_started = time.perf_counter()
 
-                if response_data and len(response_data) > 0:
+                if comparison:
+                    st.markdown(comparison["summary"])
+                    chart = create_comparison_chart(comparison)
+                    if chart:
+                        st.plotly_chart(chart, use_container_width=True, config={'displayModeBar': False})
+                    st.session_state.messages.append(
+                        {"role": "assistant", "content": comparison["summary"], "comparison": comparison}
+                    )
+                elif response_data and len(response_data) > 0:
                     data = response_data[0]  
                     
                     if "query_explain" in data:
@@ -356,11 +669,21 @@ def show_chatbot_ui():
                         }
                         
                         if "depth_levels" in data and data["depth_levels"]:
-                            chart = create_ocean_data_charts(data["depth_levels"])
+                            chart = create_ocean_data_charts(data["depth_levels"], data.get("derived"))
                             if chart:
                                 st.plotly_chart(chart, use_container_width=True, config={'displayModeBar': False})
                                 message_obj["chart_data"] = data["depth_levels"]
                         
+                        trend_chart = create_trend_chart(data.get("trend"))
+                        if trend_chart:
+                            st.plotly_chart(trend_chart, use_container_width=True, config={'displayModeBar': False})
+                        
+                        display_extremes(data.get("extremes"))
+                        matches = [p for p in response_data[1:] if p.get("source") == "observed"]
+                        display_observed_matches(matches)
+                        if matches:
+                            message_obj["matches"] = matches
+                        
                         st.session_state.messages.append(message_obj)
                     else:
                         error_msg = "No explanation available in the response."
@@ -370,6 +693,11 @@ def show_chatbot_ui():
                     error_msg = "🚫 Sorry, I couldn't retrieve ocean data right now. Please try again!"
                     st.markdown(error_msg)
                     st.session_state.messages.append({"role": "assistant", "content": error_msg})
+
+                finished = time.perf_counter()
+                timing["render_ms"] = (finished - render_started) * 1e3
+                timing["turn_ms"] = (finished - turn_started) * 1e3
+                st.session_state.last_turn_timing = timing
             else:
                 error_msg = fall_back_query(user_input)
                 st.markdown(error_msg)
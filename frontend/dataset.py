@@ -0,0 +1,115 @@
+"""
+Compact in-memory representation of the ``profiles`` table.
+
+Pages ask for the columns they need; measured variables are downcast to
+float32, identifiers to small integers or categoricals, and rows are held
+on a sorted ``DatetimeIndex`` so year/date filters are index slices rather
+than boolean-mask copies.
+"""
+
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+# SQLite value decoding is shared with the API's profile store
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+from store import numeric_column  # noqa: E402
+
+MEASURED_COLUMNS = ["depth", "latitude", "longitude", "salinity", "temperature", "air_temp", "oxygen"]
+INTEGER_ID_COLUMNS = ["id", "float_id", "cycle"]
+CHUNK_ROWS = 200_000
+
+
+def _compact(frame: pd.DataFrame) -> pd.DataFrame:
+    for col in frame.columns:
+        if col in MEASURED_COLUMNS:
+            frame[col] = numeric_column(frame[col]).astype(np.float32)
+        elif col in INTEGER_ID_COLUMNS:
+            frame[col] = pd.to_numeric(frame[col], downcast="integer")
+        elif frame[col].dtype == object and col != "time":
+            frame[col] = frame[col].astype("category")
+    return frame
+
+
+def table_columns(conn: sqlite3.Connection, table="profiles"):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def load_profiles(conn: sqlite3.Connection, columns=None, where="", params=()) -> pd.DataFrame:
+    """Load the profiles table with column projection and compact dtypes.
+
+    ``columns`` limits what is read from SQLite (``time`` is always read and
+    becomes the index). ``where`` is an optional SQL filter pushed down to
+    the query. Chunks are compacted as they arrive so the float64 copy of
+    the full table never exists at once.
+    """
+    available = table_columns(conn)
+    wanted = [c for c in (columns or available) if c in available and c != "time"]
+    sql = f"SELECT time, {', '.join(wanted)} FROM profiles" if wanted else "SELECT time FROM profiles"
+    if where:
+        sql += f" WHERE {where}"
+
+    chunks = [
+        _compact(chunk)
+        for chunk in pd.read_sql_query(sql, conn, params=params, parse_dates=["time"], chunksize=CHUNK_ROWS)
+    ]
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=["time"] + wanted)
+        df["time"] = pd.to_datetime(df["time"])
+    # Categories from separate chunks may differ; re-unify after concat.
+    df = _compact(df)
+    df = df.set_index("time").sort_index(kind="stable")
+    return df
+
+
+def available_years(df: pd.DataFrame):
+    return sorted(df.index.year.unique())
+
+
+def year_view(df: pd.DataFrame, year) -> pd.DataFrame:
+    """Rows of one calendar year as an index slice of the time-sorted frame."""
+    return df.loc[str(year)]
+
+
+def time_view(df: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Rows with ``start <= time <= end`` (inclusive) as an index slice."""
+    return df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+def memory_report(df: pd.DataFrame) -> dict:
+    """Deep memory use of the frame and its cost per million observations."""
+    total = int(df.memory_usage(deep=True, index=True).sum())
+    rows = len(df)
+    per_row = total / rows if rows else 0.0
+    return {
+        "rows": rows,
+        "bytes": total,
+        "bytes_per_row": per_row,
+        "mb_per_million_rows": per_row * 1_000_000 / 2**20,
+    }
+
+
+def filter_depth_time(df: pd.DataFrame, time_from, time_to, depth_from, depth_to, lat, lon, radius=0.1):
+    """Rows of a time-indexed frame inside the date range (an index slice, ``time_to``
+    inclusive), depth range and +/- ``radius`` degree box."""
+    view = df.loc[pd.Timestamp(time_from):pd.Timestamp(time_to) + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")]
+    keep = (
+        (view["depth"].to_numpy() >= depth_from) & (view["depth"].to_numpy() <= depth_to) &
+        (np.abs(view["latitude"].to_numpy() - lat) < radius) &
+        (np.abs(view["longitude"].to_numpy() - lon) < radius)
+    )
+    return view[keep]
+
+
+def depth_time_grid(filtered_df: pd.DataFrame, parameter) -> pd.DataFrame:
+    """Depth x time matrix of ``parameter``, deepest level first, for the heatmap.
+
+    Repeated (depth, time) observations are averaged instead of failing the pivot.
+    """
+    grid = filtered_df.pivot_table(index="depth", columns="time", values=parameter, aggfunc="mean")
+    return grid.sort_index(ascending=False)
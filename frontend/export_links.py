@@ -0,0 +1,51 @@
+"""
+Export controls for the data pages.
+
+The download link points straight at the API's /export endpoint with the
+page's current filters, so the browser streams the file from the API and
+the Streamlit process never holds the rows.
+"""
+
+import os
+from urllib.parse import urlencode
+
+import requests
+import streamlit as st
+
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet", "NetCDF": "netcdf"}
+
+
+def _export_api():
+    query_api = os.getenv("QUERY_API", default="http://127.0.0.1:5000/query")
+    return os.getenv("EXPORT_API", default=query_api.rsplit("/", 1)[0] + "/export")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def export_formats():
+    """{label: format} the API advertises; CSV and NetCDF if it cannot be asked."""
+    try:
+        response = requests.get(_export_api() + "/formats", timeout=5)
+        response.raise_for_status()
+        available = response.json()["formats"]
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        available = ["csv", "netcdf"]
+    return {label: fmt for label, fmt in EXPORT_FORMATS.items() if fmt in available}
+
+
+def export_url(fmt, start=None, end=None, depth_min=None, depth_max=None, float_ids=None,
+               lat_min=None, lat_max=None, lon_min=None, lon_max=None):
+    """/export URL for the given filters; unset filters are left out."""
+    params = {"format": fmt, "start": start, "end": end, "depth_min": depth_min, "depth_max": depth_max,
+              "lat_min": lat_min, "lat_max": lat_max, "lon_min": lon_min, "lon_max": lon_max}
+    if float_ids is not None:
+        params["float_ids"] = ",".join(str(int(f)) for f in float_ids)
+    return _export_api() + "?" + urlencode({k: v for k, v in params.items() if v is not None})
+
+
+def export_controls(key, **filters):
+    """Format picker and download button for the rows selected by ``filters``."""
+    formats = export_formats()
+    st.subheader("Export Data")
+    label = st.selectbox("Format", list(formats), key=f"{key}_export_format")
+    st.link_button(f"⬇️ Download {label}", export_url(formats[label], **filters))
+    st.caption("Streams every matching row from the API, not just the rows shown here.")
@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from timedepthplot import show_time_depth_plot
 from map_page import show_map
 from chatbot_ui import show_chatbot_ui
+from sketches import refresh_sketches, load_summary, histogram_payload
+from dataset import load_profiles, available_years as dataset_years, year_view, memory_report
 
 
 st.set_page_config(
@@ -210,12 +212,30 @@ def create_dummy_data():
     return conn
 
 @st.cache_data
-def load_data():
+def load_data(columns=('salinity', 'temperature', 'air_temp', 'oxygen')):
+    """Time-indexed, float32 view of the profiles table restricted to ``columns``."""
     conn = create_dummy_data()
-    df = pd.read_sql_query("SELECT * FROM profiles", conn)
-    df['time'] = pd.to_datetime(df['time'])
-    df['year'] = df['time'].dt.year
-    return df
+    return load_profiles(conn, list(columns))
+
+@st.cache_data
+def load_distribution(year, variable):
+    """Box statistics and histogram for one year, read from the stored sketches."""
+    conn = create_dummy_data()
+    refresh_sketches(conn)
+    summary = load_summary(conn, [year], variable)
+    return summary.box_stats(), histogram_payload(summary)
+
+def add_precomputed_box(fig, stats, name, color):
+    fig.add_trace(go.Box(
+        x=[name], q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+        lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+        mean=[stats['mean']], name=name, boxpoints=False, marker_color=color
+    ))
+    if stats['outliers']:
+        fig.add_trace(go.Scatter(
+            x=[name] * len(stats['outliers']), y=stats['outliers'], mode='markers',
+            marker=dict(color=color, size=5), showlegend=False, name=f'{name} outliers'
+        ))
 
 def navigate_to(page):
     st.session_state.current_page = page
@@ -386,7 +406,7 @@ elif st.session_state.current_page == "comparison":
 
     with sidebar_col:
         st.markdown("### Analysis Controls")
-        available_years = sorted(df['year'].unique())
+        available_years = dataset_years(df)
         properties = ['salinity', 'temperature', 'air_temp', 'oxygen']
         property_labels = {
             'salinity': ' Salinity',
@@ -405,6 +425,10 @@ elif st.session_state.current_page == "comparison":
         with col_to:
             year2 = st.selectbox("To Year", available_years, index=1 if len(available_years) > 1 else 0)
 
+        mem = memory_report(df)
+        st.caption(f"In memory: {mem['rows']:,} rows, {mem['bytes'] / 2**20:.1f} MB "
+                   f"({mem['mb_per_million_rows']:.1f} MB per million observations)")
+
     with main_col:
         # Comparison page: remove glass morph effect from graph containers only
         st.markdown(
@@ -428,19 +452,21 @@ elif st.session_state.current_page == "comparison":
             """,
             unsafe_allow_html=True,
         )
-        df_year1 = df[df['year'] == year1]
-        df_year2 = df[df['year'] == year2]
+        df_year1 = year_view(df, year1)
+        df_year2 = year_view(df, year2)
 
         
     # Combined comparison plot removed as requested
 
         
         st.subheader(" Distribution Analysis")
+        stats1, hist1 = load_distribution(year1, selected_property)
+        stats2, hist2 = load_distribution(year2, selected_property)
         fig_box = go.Figure()
-        fig_box.add_trace(go.Box(y=df_year1[selected_property], name=f'{year1}', 
-                                boxpoints='outliers', marker_color='#4fc3f7'))
-        fig_box.add_trace(go.Box(y=df_year2[selected_property], name=f'{year2}', 
-                                boxpoints='outliers', marker_color='#f06292'))
+        if stats1:
+            add_precomputed_box(fig_box, stats1, f'{year1}', '#4fc3f7')
+        if stats2:
+            add_precomputed_box(fig_box, stats2, f'{year2}', '#f06292')
         fig_box.update_layout(
             title=f"{selected_property.title()} Distribution Comparison", 
             yaxis_title=selected_property.title(),
@@ -449,13 +475,27 @@ elif st.session_state.current_page == "comparison":
             font_color='white'
         )
         st.plotly_chart(fig_box, use_container_width=True)
+
+        fig_hist = go.Figure()
+        for (centers, counts, width), label, color in [(hist1, year1, '#4fc3f7'), (hist2, year2, '#f06292')]:
+            fig_hist.add_trace(go.Bar(x=centers, y=counts, width=width, name=f'{label}',
+                                      marker_color=color, opacity=0.6))
+        fig_hist.update_layout(
+            barmode='overlay',
+            xaxis_title=selected_property.title(),
+            yaxis_title='Count',
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white'
+        )
+        st.plotly_chart(fig_hist, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
         st.subheader("Individual Year Analysis")
         year_col1, year_col2 = st.columns(2)
         with year_col1:
             st.markdown('<div class="plot-container">', unsafe_allow_html=True)
-            fig1 = px.line(df_year1, x='time', y=selected_property, 
+            fig1 = px.line(df_year1, x=df_year1.index, y=selected_property, 
                           title=f"{selected_property.title()} - {year1}", 
                           color_discrete_sequence=['#4fc3f7'])
             fig1.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
@@ -464,7 +504,7 @@ elif st.session_state.current_page == "comparison":
             
         with year_col2:
             st.markdown('<div class="plot-container">', unsafe_allow_html=True)
-            fig2 = px.line(df_year2, x='time', y=selected_property, 
+            fig2 = px.line(df_year2, x=df_year2.index, y=selected_property, 
                           title=f"{selected_property.title()} - {year2}", 
                           color_discrete_sequence=['#f06292'])
             fig2.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
@@ -473,18 +513,14 @@ elif st.session_state.current_page == "comparison":
 
         st.subheader("Statistical Summary")
         stats_col1, stats_col2 = st.columns(2)
-        with stats_col1:
-            st.markdown(f"** {year1} Statistics**")
-            st.write(f"**Mean:** {df_year1[selected_property].mean():.2f}")
-            st.write(f"**Std Dev:** {df_year1[selected_property].std():.2f}")
-            st.write(f"**Min:** {df_year1[selected_property].min():.2f}")
-            st.write(f"**Max:** {df_year1[selected_property].max():.2f}")
-        with stats_col2:
-            st.markdown(f"** {year2} Statistics**")
-            st.write(f"**Mean:** {df_year2[selected_property].mean():.2f}")
-            st.write(f"**Std Dev:** {df_year2[selected_property].std():.2f}")
-            st.write(f"**Min:** {df_year2[selected_property].min():.2f}")
-            st.write(f"**Max:** {df_year2[selected_property].max():.2f}")
+        for stats_col, year, stats in [(stats_col1, year1, stats1), (stats_col2, year2, stats2)]:
+            with stats_col:
+                st.markdown(f"** {year} Statistics**")
+                if stats:
+                    st.write(f"**Mean:** {stats['mean']:.2f}")
+                    st.write(f"**Std Dev:** {stats['std']:.2f}")
+                    st.write(f"**Min:** {stats['min']:.2f}")
+                    st.write(f"**Max:** {stats['max']:.2f}")
 
         # Close comparison section wrapper
         st.markdown("</section>", unsafe_allow_html=True)
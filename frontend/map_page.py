@@ -2,9 +2,9 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from geopy.distance import geodesic
 import plotly.express as px
 import plotly.graph_objects as go
+from trajectories import compute_cumulative_distance, find_nearest
 
 def show_map():
     # Custom CSS for map page font colors
@@ -51,19 +51,6 @@ def show_map():
     df = pd.DataFrame(rows, columns=["float_id", "time", "latitude", "longitude", "depth", "temperature", "salinity", "oxygen"])
     df.sort_values(by=["float_id", "time"], inplace=True)
 
-   
-    def compute_cumulative_distance(df):
-        df = df.copy()
-        df["cumulative_distance_km"] = 0.0
-        for float_id in df["float_id"].unique():
-            float_df = df[df["float_id"] == float_id].sort_values("time")
-            distances = [0]
-            for i in range(1, len(float_df)):
-                prev = (float_df.iloc[i - 1]["latitude"], float_df.iloc[i - 1]["longitude"])
-                curr = (float_df.iloc[i]["latitude"], float_df.iloc[i]["longitude"])
-                distances.append(geodesic(prev, curr).km)
-            df.loc[df["float_id"] == float_id, "cumulative_distance_km"] = np.cumsum(distances)
-        return df
 
     df = compute_cumulative_distance(df)
 
@@ -114,11 +101,6 @@ def show_map():
         with col6:
             lon_input = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=82.0)
 
-        def find_nearest(df, lat, lon):
-            df = df.copy()
-            df["distance_km"] = df.apply(lambda row: geodesic((lat, lon), (row["latitude"], row["longitude"])).km, axis=1)
-            return df.nsmallest(3, "distance_km")
-
         if not filtered_df.empty:
             nearest_floats = find_nearest(filtered_df, lat_input, lon_input)
             st.write("Nearest Floats:")
@@ -0,0 +1,304 @@
+"""
+Mergeable distribution summaries for the comparison page.
+
+Each (partition, variable) pair - a partition is one calendar year of the
+``profiles`` table - is summarised by a KLL quantile sketch, a fixed-bin
+histogram, running moments and a bounded set of extreme values. Summaries
+are stored next to the data in ``profile_sketches`` and are merged
+incrementally as new rows are appended, so box plots and histograms can be
+drawn from a few kilobytes instead of every raw observation.
+"""
+
+import json
+import math
+import sqlite3
+
+import numpy as np
+
+SKETCH_VARIABLES = ["salinity", "temperature", "air_temp", "oxygen"]
+
+# Fixed histogram edges per variable; values outside land in the end bins.
+HISTOGRAM_RANGES = {
+    "salinity": (30.0, 40.0, 100),
+    "temperature": (-2.0, 35.0, 111),
+    "air_temp": (-10.0, 45.0, 110),
+    "oxygen": (0.0, 400.0, 100),
+}
+
+MAX_EXTREMES = 50  # values kept at each tail for outlier markers
+CHUNK_ROWS = 100_000
+
+
+class KLLSketch:
+    """KLL quantile sketch with level-wise compactors (Karnin, Lang, Liberty 2016)."""
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                offset = int(self._rng.integers(0, 2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], pairs[offset::2]])
+                self.levels[level] = keep
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.n += int(values.size)
+        # Feed in capacity-sized slices so large batches never sit uncompressed.
+        step = max(self.k, 1)
+        for start in range(0, values.size, step):
+            self.levels[0] = np.concatenate([self.levels[0], values[start:start + step]])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        if self.n == 0:
+            return [float("nan")] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2 ** h, dtype=np.float64) for h, v in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cum = items[order], np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=np.float64) * cum[-1]
+        idx = np.clip(np.searchsorted(cum, targets, side="left"), 0, len(items) - 1)
+        return items[idx].tolist()
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": [v.tolist() for v in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"], seed=data["n"])
+        sketch.n = data["n"]
+        sketch.levels = [np.asarray(v, dtype=np.float64) for v in data["levels"]] or [np.empty(0)]
+        return sketch
+
+
+class DistributionSummary:
+    """KLL sketch + fixed-bin histogram + moments + tail extremes for one variable."""
+
+    def __init__(self, variable):
+        self.variable = variable
+        lo, hi, bins = HISTOGRAM_RANGES[variable]
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.sketch = KLLSketch()
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.low = np.empty(0)
+        self.high = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.sketch.update(values)
+        bins = np.clip(np.searchsorted(self.edges, values, side="right") - 1, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.n += int(values.size)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self._keep_extremes(values, values)
+        return self
+
+    def _keep_extremes(self, low_values, high_values):
+        """Fold candidates into the retained lowest and highest MAX_EXTREMES values."""
+        low = np.concatenate([self.low, low_values])
+        high = np.concatenate([self.high, high_values])
+        if low.size > MAX_EXTREMES:
+            low = np.partition(low, MAX_EXTREMES - 1)[:MAX_EXTREMES]
+        if high.size > MAX_EXTREMES:
+            high = np.partition(high, high.size - MAX_EXTREMES)[-MAX_EXTREMES:]
+        self.low, self.high = np.sort(low), np.sort(high)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        # Each side only from its own side: a small partition holds every value in both
+        self._keep_extremes(other.low, other.high)
+        return self
+
+    def box_stats(self):
+        """Quartiles, Tukey whiskers and the known outliers beyond them."""
+        if self.n == 0:
+            return None
+        q1, median, q3 = self.sketch.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        tails = np.unique(np.concatenate([self.low, self.high]))
+        inside = tails[(tails >= q1 - 1.5 * iqr) & (tails <= q3 + 1.5 * iqr)]
+        # Whiskers reach the most extreme retained value inside 1.5 IQR; if every
+        # retained tail value is an outlier, fall back to the fence itself.
+        lowerfence = float(inside.min()) if inside.size and inside.min() <= q1 else q1 - 1.5 * iqr
+        upperfence = float(inside.max()) if inside.size and inside.max() >= q3 else q3 + 1.5 * iqr
+        outliers = tails[(tails < q1 - 1.5 * iqr) | (tails > q3 + 1.5 * iqr)]
+        return {
+            "n": self.n,
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerfence": lowerfence,
+            "upperfence": upperfence,
+            "outliers": outliers.tolist(),
+            "mean": self.mean,
+            "std": self.std,
+            "min": float(self.low[0]),
+            "max": float(self.high[-1]),
+        }
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else float("nan")
+
+    @property
+    def std(self):
+        if self.n < 2:
+            return float("nan")
+        var = (self.total_sq - self.total ** 2 / self.n) / (self.n - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def to_json(self):
+        return json.dumps({
+            "sketch": self.sketch.to_dict(),
+            "counts": self.counts.tolist(),
+            "n": self.n,
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "low": self.low.tolist(),
+            "high": self.high.tolist(),
+        })
+
+    @classmethod
+    def from_json(cls, variable, payload):
+        data = json.loads(payload)
+        summary = cls(variable)
+        summary.sketch = KLLSketch.from_dict(data["sketch"])
+        summary.counts = np.asarray(data["counts"], dtype=np.int64)
+        summary.n = data["n"]
+        summary.total = data["total"]
+        summary.total_sq = data["total_sq"]
+        summary.low = np.asarray(data["low"], dtype=np.float64)
+        summary.high = np.asarray(data["high"], dtype=np.float64)
+        return summary
+
+
+def _ensure_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profile_sketches (
+        partition TEXT,
+        variable TEXT,
+        summary TEXT,
+        PRIMARY KEY (partition, variable)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profile_sketch_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        max_row_id INTEGER
+    )
+    """)
+
+
+def _load_summaries(conn, partitions, variable=None):
+    summaries = {}
+    for partition in partitions:
+        rows = conn.execute(
+            "SELECT variable, summary FROM profile_sketches WHERE partition = ?", (partition,)
+        ).fetchall()
+        for name, payload in rows:
+            if variable is None or name == variable:
+                summaries[(partition, name)] = DistributionSummary.from_json(name, payload)
+    return summaries
+
+
+def refresh_sketches(conn: sqlite3.Connection) -> int:
+    """Fold rows appended since the last refresh into the stored summaries.
+
+    Returns the number of rows consumed. Summaries are mergeable, so only the
+    new rows are read; a full rebuild happens just once for a fresh table.
+    """
+    _ensure_tables(conn)
+    state = conn.execute("SELECT max_row_id FROM profile_sketch_state WHERE id = 1").fetchone()
+    last_id = state[0] if state else 0
+
+    columns = ", ".join(SKETCH_VARIABLES)
+    cursor = conn.execute(
+        f"SELECT id, strftime('%Y', time), {columns} FROM profiles WHERE id > ? ORDER BY id", (last_id,)
+    )
+    fresh = {}
+    consumed = 0
+    max_id = last_id
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        consumed += len(rows)
+        max_id = rows[-1][0]
+        years = np.array([r[1] for r in rows], dtype=object)
+        values = np.array([r[2:] for r in rows], dtype=np.float64)
+        for year in np.unique(years):
+            mask = years == year
+            for col, variable in enumerate(SKETCH_VARIABLES):
+                key = (str(year), variable)
+                fresh.setdefault(key, DistributionSummary(variable)).update(values[mask, col])
+
+    if not consumed:
+        return 0
+
+    stored = _load_summaries(conn, {partition for partition, _ in fresh})
+    for key, summary in fresh.items():
+        if key in stored:
+            summary = stored[key].merge(summary)
+        conn.execute(
+            "INSERT OR REPLACE INTO profile_sketches (partition, variable, summary) VALUES (?, ?, ?)",
+            (key[0], key[1], summary.to_json()),
+        )
+    conn.execute("INSERT OR REPLACE INTO profile_sketch_state (id, max_row_id) VALUES (1, ?)", (max_id,))
+    conn.commit()
+    return consumed
+
+
+def load_summary(conn: sqlite3.Connection, partitions, variable):
+    """Merge the stored summaries of several partitions (e.g. years) for one variable."""
+    merged = DistributionSummary(variable)
+    for summary in _load_summaries(conn, [str(p) for p in partitions], variable).values():
+        merged.merge(summary)
+    return merged
+
+
+def histogram_payload(summary: DistributionSummary):
+    """Non-empty histogram bins as (centers, counts, width) for a bar chart."""
+    centers = (summary.edges[:-1] + summary.edges[1:]) / 2
+    nonzero = summary.counts > 0
+    return centers[nonzero].tolist(), summary.counts[nonzero].tolist(), float(summary.edges[1] - summary.edges[0])
@@ -4,6 +4,23 @@ import pandas as pd
 import numpy as np
 import sqlite3
 import plotly.express as px 
+from dataset import filter_depth_time, depth_time_grid, load_profiles
+from export_links import export_controls
+
+DEPTH_TIME_COLUMNS = ("depth", "latitude", "longitude", "salinity", "air_temp", "oxygen")
+
+@st.cache_data
+def load_depth_time_data(columns=DEPTH_TIME_COLUMNS):
+    """Time-indexed, float32 view of the profiles table restricted to ``columns``.
+
+    st.cache_data loads it once per server process, shared by every session;
+    each call gets its own copy, so the page may filter it freely.
+    """
+    conn = sqlite3.connect("dummy.db")
+    try:
+        return load_profiles(conn, list(columns))
+    finally:
+        conn.close()
 
 def show_time_depth_plot():
     # Custom CSS for time-depth plot page font colors
@@ -43,15 +60,9 @@ def show_time_depth_plot():
     .plot-container { background: rgba(255,255,255,0.06); border: 1px solid var(--card-border); border-radius: 12px; padding: .75rem; }
     </style>
     """, unsafe_allow_html=True)
-    conn= sqlite3.connect("dummy.db")
-    df=pd.read_sql("SELECT * FROM profiles", conn)
-    conn.close()
-
-    df['time'] = pd.to_datetime(df['time'])
+    df = load_depth_time_data()
 
     st.title("Depth-Time Plot")
-    if isinstance(df['depth'].iloc[0], bytes):
-        df['depth'] = df['depth'].apply(lambda x: int.from_bytes(x, byteorder='little'))
 
     col_graph, col_controls = st.columns([2, 1])
 
@@ -61,9 +72,9 @@ def show_time_depth_plot():
         st.markdown("**Time Range**")
         time_col1,time_col2 = st.columns(2)
         with time_col1:
-            time_from = st.date_input("From", df['time'].min().date())
+            time_from = st.date_input("From", df.index.min().date())
         with time_col2:
-            time_to = st.date_input("To", df['time'].max().date())
+            time_to = st.date_input("To", df.index.max().date())
 
         st.markdown("**Depth Range (m)**")
         depth_col1,depth_col2 = st.columns(2)
@@ -79,18 +90,26 @@ def show_time_depth_plot():
         with loc_2:
             lon = st.number_input("Longitude", float(df['longitude'].min()), float(df['longitude'].max()), float(df['longitude'].mean()))
 
-    filtered_df = df[
-        (df['time'].dt.date >= time_from) & (df['time'].dt.date <= time_to) &
-        (df['depth'] >= depth_from) & (df['depth'] <= depth_to) &
-        (abs(df['latitude'] - lat) < 0.1) &
-        (abs(df['longitude'] - lon) < 0.1)
-    ]
+    filtered_df = filter_depth_time(df, time_from, time_to, depth_from, depth_to, lat, lon)
+
+    with col_controls:
+        export_controls(
+            "time_depth",
+            start=time_from.isoformat(),
+            end=time_to.isoformat(),
+            depth_min=depth_from,
+            depth_max=depth_to,
+            lat_min=lat - 0.1,
+            lat_max=lat + 0.1,
+            lon_min=lon - 0.1,
+            lon_max=lon + 0.1,
+        )
 
     with col_graph:
-        heatmap_data = filtered_df.pivot(index='depth', columns='time', values=parameter)
+        heatmap_data = depth_time_grid(filtered_df, parameter)
 
         fig = px.imshow(
-            heatmap_data.sort_index(ascending=False),
+            heatmap_data,
             labels=dict(x="Time", y="Depth (m)", color=parameter.capitalize()),
             aspect="auto",
             color_continuous_scale="Turbo"  
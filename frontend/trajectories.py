@@ -0,0 +1,31 @@
+"""
+Float trajectory helpers used by the map page.
+
+Kept free of Streamlit so they can be imported by the benchmarks.
+"""
+
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+
+
+def compute_cumulative_distance(df: pd.DataFrame) -> pd.DataFrame:
+    """Add ``cumulative_distance_km`` travelled by each float along its time-ordered track."""
+    df = df.copy()
+    df["cumulative_distance_km"] = 0.0
+    for float_id in df["float_id"].unique():
+        float_df = df[df["float_id"] == float_id].sort_values("time")
+        distances = [0]
+        for i in range(1, len(float_df)):
+            prev = (float_df.iloc[i - 1]["latitude"], float_df.iloc[i - 1]["longitude"])
+            curr = (float_df.iloc[i]["latitude"], float_df.iloc[i]["longitude"])
+            distances.append(geodesic(prev, curr).km)
+        df.loc[df["float_id"] == float_id, "cumulative_distance_km"] = np.cumsum(distances)
+    return df
+
+
+def find_nearest(df: pd.DataFrame, lat, lon, n=3) -> pd.DataFrame:
+    """The ``n`` rows closest to (lat, lon), with a ``distance_km`` column."""
+    df = df.copy()
+    df["distance_km"] = df.apply(lambda row: geodesic((lat, lon), (row["latitude"], row["longitude"])).km, axis=1)
+    return df.nsmallest(n, "distance_km")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Synthetic ARGO dataset generator for load and scale testing.
+
+Produces millions of profiles across many drifting floats from the
+regional model the API's modelled profiles use (api/physics.py), vectorized
+with NumPy, and bulk-loads them into the ``profiles`` table of every
+requested backend. There is no query here, so the Pacific adjustment (which
+the API applies only to queries naming the Pacific) is left out.
+
+By default rows go to a new synthetic.db at the repository root; point the
+API at it with FLOATCHAT_DB.
+
+    python ingestion/synthetic.py --profiles 1000000 --floats 4000
+    python ingestion/synthetic.py --profiles 200000 --backend postgres --dsn postgresql://...
+"""
+
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+from physics import (DETAILED_PRESSURES, STANDARD_PRESSURES, level_salinity, level_temperature,  # noqa: E402
+                     salinity_noise, surface_conditions, temperature_noise)
+
+CYCLE_DAYS = 10  # ARGO floats surface roughly every ten days
+DEFAULT_DB = os.path.join(ROOT, "synthetic.db")
+
+COLUMNS = ["time", "depth", "latitude", "longitude", "salinity", "temperature",
+           "air_temp", "oxygen", "float_id", "cycle"]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TIMESTAMP,
+    depth REAL,
+    latitude REAL,
+    longitude REAL,
+    salinity REAL,
+    temperature REAL,
+    air_temp REAL,
+    oxygen REAL,
+    float_id INTEGER,
+    cycle INTEGER
+)
+"""
+
+POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id BIGSERIAL PRIMARY KEY,
+    time TIMESTAMP,
+    depth REAL,
+    latitude REAL,
+    longitude REAL,
+    salinity REAL,
+    temperature REAL,
+    air_temp REAL,
+    oxygen REAL,
+    float_id INTEGER,
+    cycle INTEGER
+)
+"""
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_profiles_time ON profiles (time)",
+    "CREATE INDEX IF NOT EXISTS idx_profiles_float ON profiles (float_id, cycle)",
+]
+
+
+def seasonal_anomaly(lat, times, warming_per_year=0.02):
+    """Hemisphere-aware seasonal cycle plus a weak warming trend, in degrees C."""
+    day_of_year = (times.astype("datetime64[D]") - times.astype("datetime64[Y]")).astype(np.int64)
+    years = times.astype("datetime64[Y]").astype(np.int64) + 1970
+    phase = 2 * np.pi * (day_of_year - 45) / 365.25
+    amplitude = np.clip(np.abs(lat) / 40.0, 0.2, 1.0) * 2.0
+    return -np.sign(lat + 1e-9) * amplitude * np.cos(phase) + warming_per_year * (years - 2015)
+
+
+def profile_levels(surface_temp, surface_salinity, strength, pressures, rng):
+    """Vectorized temperature/salinity on ``pressures`` for every profile (n x levels)."""
+    n, m = surface_temp.shape[0], pressures.shape[0]
+    p = pressures[None, :]
+    temp_width, salinity_width = temperature_noise(p), salinity_noise(p)
+    temp = level_temperature(surface_temp[:, None], strength[:, None], p,
+                             rng.uniform(-temp_width, temp_width, (n, m)))
+    salinity = level_salinity(surface_salinity[:, None], p, rng.uniform(-salinity_width, salinity_width, (n, m)))
+    return np.round(temp, 2), np.round(salinity, 2)
+
+
+def float_tracks(n_floats, cycles, start, span_days, rng, first_float_id=0):
+    """Launch positions, drift and surfacing times for a batch of floats.
+
+    Floats drift as a random walk around a mean zonal current, with
+    latitude clamped to the open-ocean band and longitude wrapped.
+    Returns flat per-profile arrays ordered by (float, cycle).
+    """
+    lat0 = rng.uniform(-60, 60, n_floats)
+    lon0 = rng.uniform(-180, 180, n_floats)
+    zonal = rng.normal(0.0, 0.08, n_floats)[:, None]  # mean drift, degrees per cycle
+    dlat = rng.normal(0.0, 0.06, (n_floats, cycles))
+    dlon = rng.normal(0.0, 0.08, (n_floats, cycles)) + zonal
+    dlat[:, 0] = dlon[:, 0] = 0.0
+    lat = np.clip(lat0[:, None] + np.cumsum(dlat, axis=1), -65, 65)
+    lon = (lon0[:, None] + np.cumsum(dlon, axis=1) + 180) % 360 - 180
+
+    # Cycles shorten when the window cannot hold them all ten days apart; every time stays inside it
+    window = span_days * 86400
+    cycle_seconds = max(1, min(CYCLE_DAYS * 86400, window // cycles))
+    launch = np.datetime64(start, "s") + rng.integers(0, max(window - cycles * cycle_seconds, 1),
+                                                      n_floats).astype("timedelta64[s]")
+    offsets = (np.arange(cycles) * cycle_seconds).astype("timedelta64[s]")
+    jitter = rng.integers(0, min(86400, cycle_seconds), (n_floats, cycles)).astype("timedelta64[s]")
+    times = np.minimum(launch[:, None] + offsets[None, :] + jitter,
+                       np.datetime64(start, "s") + np.timedelta64(window - 1, "s"))
+
+    float_ids = np.repeat(np.arange(first_float_id, first_float_id + n_floats), cycles)
+    cycle_ids = np.tile(np.arange(1, cycles + 1), n_floats)
+    return lat.ravel(), lon.ravel(), times.ravel(), float_ids, cycle_ids
+
+
+def generate_batches(profiles, floats, pressures, start, years, seed, batch_profiles):
+    """Yield column dicts of rows (one row per profile level), batch by batch."""
+    rng = np.random.default_rng(seed)
+    pressures = np.asarray(pressures, dtype=np.float64)
+    cycles = max(1, -(-profiles // floats))
+    span_days = int(years * 365.25)
+    floats_per_batch = max(1, batch_profiles // cycles)
+    start = np.datetime64(start, "D")
+
+    remaining = profiles
+    first = 0
+    while remaining > 0:
+        batch_floats = min(floats_per_batch, -(-remaining // cycles))
+        lat, lon, times, float_ids, cycle_ids = float_tracks(batch_floats, cycles, start, span_days, rng, first)
+        lat, lon, times = lat[:remaining], lon[:remaining], times[:remaining]
+        float_ids, cycle_ids = float_ids[:remaining], cycle_ids[:remaining]
+
+        surface_temp, surface_salinity, strength = surface_conditions(
+            lat, lon, lambda lo, hi: rng.uniform(lo, hi, lat.shape[0]))
+        surface_temp += seasonal_anomaly(lat, times)
+        temp, salinity = profile_levels(surface_temp, surface_salinity, strength, pressures, rng)
+
+        n, m = temp.shape
+        air_temp = surface_temp + rng.normal(0.0, 1.5, n)
+        # Oxygen solubility falls with temperature; add level noise
+        oxygen = 330 - 5.5 * temp + rng.normal(0.0, 8.0, (n, m))
+
+        yield {
+            "time": np.repeat(times, m),
+            "depth": np.tile(pressures, n),
+            "latitude": np.repeat(np.round(lat, 4), m),
+            "longitude": np.repeat(np.round(lon, 4), m),
+            "salinity": salinity.ravel(),
+            "temperature": temp.ravel(),
+            "air_temp": np.repeat(np.round(air_temp, 2), m),
+            "oxygen": np.round(oxygen, 1).ravel(),
+            "float_id": np.repeat(float_ids, m),
+            "cycle": np.repeat(cycle_ids, m),
+        }
+        remaining -= n
+        first += batch_floats
+
+
+def _time_strings(times):
+    return np.char.replace(np.datetime_as_string(times, unit="s"), "T", " ")
+
+
+def write_sqlite(path, batches, replace=False):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(SQLITE_SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+    for col in ("float_id", "cycle"):
+        if col not in existing:
+            conn.execute(f"ALTER TABLE profiles ADD COLUMN {col} INTEGER")
+    if replace:
+        conn.execute("DELETE FROM profiles")
+
+    sql = f"INSERT INTO profiles ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    total = 0
+    for batch in batches:
+        cols = [_time_strings(batch["time"]).tolist()] + [batch[c].tolist() for c in COLUMNS[1:]]
+        with conn:
+            conn.executemany(sql, zip(*cols))
+        total += len(cols[0])
+        print(f"  sqlite: {total:,} rows")
+    for stmt in INDEXES:
+        conn.execute(stmt)
+    conn.commit()
+    conn.close()
+    return total
+
+
+def write_postgres(dsn, batches, replace=False):
+    try:
+        import psycopg2
+    except ImportError:
+        raise SystemExit("PostgreSQL backend needs psycopg2-binary (see requirements.txt)")
+
+    conn = psycopg2.connect(dsn)
+    total = 0
+    with conn, conn.cursor() as cur:
+        cur.execute(POSTGRES_SCHEMA)
+        if replace:
+            cur.execute("TRUNCATE profiles")
+        for batch in batches:
+            buf = io.StringIO()
+            block = np.column_stack([_time_strings(batch["time"])] + [batch[c].astype(str) for c in COLUMNS[1:]])
+            np.savetxt(buf, block, fmt="%s", delimiter="\t")
+            buf.seek(0)
+            cur.copy_from(buf, "profiles", columns=COLUMNS)
+            total += block.shape[0]
+            print(f"  postgres: {total:,} rows")
+        for stmt in INDEXES:
+            cur.execute(stmt)
+    conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ARGO profiles dataset")
+    parser.add_argument("--profiles", type=int, default=100_000, help="number of profiles to generate")
+    parser.add_argument("--floats", type=int, default=500, help="number of floats sharing the profiles")
+    parser.add_argument("--detailed", action="store_true", help="use the high-resolution pressure levels")
+    parser.add_argument("--start", default="2015-01-01", help="earliest launch date (YYYY-MM-DD)")
+    parser.add_argument("--years", type=float, default=10.0, help="length of the time window in years")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-profiles", type=int, default=50_000, help="profiles generated per batch")
+    parser.add_argument("--backend", choices=["sqlite", "postgres", "all"], default="sqlite")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database path (default: synthetic.db)")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="PostgreSQL DSN")
+    parser.add_argument("--replace", action="store_true", help="delete existing rows first")
+    args = parser.parse_args()
+
+    pressures = DETAILED_PRESSURES if args.detailed else STANDARD_PRESSURES
+    backends = ["sqlite", "postgres"] if args.backend == "all" else [args.backend]
+
+    print(f"🌊 Generating {args.profiles:,} profiles from {args.floats:,} floats "
+          f"({len(pressures)} levels each)")
+    for backend in backends:
+        batches = generate_batches(args.profiles, args.floats, pressures, args.start,
+                                   args.years, args.seed, args.batch_profiles)
+        started = time.perf_counter()
+        if backend == "sqlite":
+            rows = write_sqlite(args.db, batches, args.replace)
+        else:
+            if not args.dsn:
+                raise SystemExit("--dsn (or DATABASE_URL) is required for the postgres backend")
+            rows = write_postgres(args.dsn, batches, args.replace)
+        elapsed = time.perf_counter() - started
+        print(f"✅ {backend}: {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Shared setup: the API modules read their configuration from the
+environment at import time, so it is set here before any test imports
+them. Every run gets a private copy of dummy.db and an empty index
+directory, so indexes start out unbuilt.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="floatchat-tests-")
+
+os.environ["FLOATCHAT_DB"] = shutil.copy(os.path.join(ROOT, "dummy.db"), os.path.join(WORKDIR, "profiles.db"))
+os.environ["FLOATCHAT_INDEX_DIR"] = os.path.join(WORKDIR, "index")
+os.environ["FLOATCHAT_DETERMINISTIC"] = "1"
+os.environ.setdefault("FLOATCHAT_CURSOR_SECRET", "test-secret")
+
+sys.path.insert(0, os.path.join(ROOT, "api"))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+sys.path.insert(0, os.path.join(ROOT, "ingestion"))
@@ -0,0 +1,53 @@
+"""Admission control: client keys and concurrency slots."""
+
+from flask import Flask, Response
+
+from admission import admitted, client_id
+
+app = Flask(__name__)
+
+
+@app.route("/stream")
+@admitted("test_stream", limit=1, max_queue=0, timeout=0)
+def stream():
+    return Response(iter([b"a", b"b"]))
+
+
+@app.route("/plain")
+@admitted("test_plain", limit=1, max_queue=0, timeout=0)
+def plain():
+    return "ok"
+
+
+def _client(remote_addr, forwarded=None, trusted=frozenset()):
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    with app.test_request_context(headers=headers, environ_base={"REMOTE_ADDR": remote_addr}):
+        return client_id(trusted)
+
+
+def test_forwarded_for_ignored_from_untrusted_peer():
+    assert _client("203.0.113.7", "198.51.100.1") == "203.0.113.7"
+
+
+def test_forwarded_for_honoured_behind_trusted_proxy():
+    assert _client("10.0.0.2", "198.51.100.1", {"10.0.0.2"}) == "198.51.100.1"
+
+
+def test_spoofed_forwarded_for_prefix_is_skipped():
+    # The client sent "1.2.3.4" itself; the proxy appended the address it saw
+    assert _client("10.0.0.2", "1.2.3.4, 198.51.100.1", {"10.0.0.2"}) == "198.51.100.1"
+
+
+def test_plain_response_releases_its_slot_on_return():
+    assert app.test_client().get("/plain").status_code == 200
+    assert plain.limiter.active == 0
+
+
+def test_streamed_response_holds_its_slot_until_closed():
+    client = app.test_client()
+    response = client.get("/stream", buffered=False)
+    assert stream.limiter.active == 1
+    assert client.get("/stream").status_code == 503
+    assert b"".join(response.response) == b"ab"
+    response.close()
+    assert stream.limiter.active == 0
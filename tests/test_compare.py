@@ -0,0 +1,28 @@
+"""/compare across locations and time windows."""
+
+import main
+from climatology import get_climatology
+from store import get_store
+
+
+def _compare(subjects):
+    # Build the climatology up front so no background build races later tests
+    get_climatology(get_store(), wait=True)
+    response = main.app.test_client().post("/compare", json={"subjects": subjects})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_unobserved_time_windows_report_no_differences():
+    # dummy.db holds January 2025 only, so neither window has observations
+    body = _compare([{"lat": 13.0, "lon": 77.5, "start": "2019-06-01", "end": "2019-06-30"},
+                     {"lat": 13.0, "lon": 77.5, "start": "2023-06-01", "end": "2023-06-30"}])
+    assert body["basis"] == "model"
+    assert body["differences"] == []
+    assert "no differences" in body["summary"]
+
+
+def test_unobserved_locations_compare_modelled_profiles():
+    body = _compare([{"lat": 10.0, "lon": 60.0}, {"lat": -43.0, "lon": 130.0}])
+    assert body["basis"] == "model"
+    assert len(body["differences"]) == 1
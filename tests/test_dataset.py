@@ -0,0 +1,19 @@
+"""Compact frontend loader for the profiles table."""
+
+import sqlite3
+
+import numpy as np
+
+from dataset import load_profiles
+
+
+def test_blob_encoded_depths_are_decoded(tmp_path):
+    conn = sqlite3.connect(tmp_path / "profiles.db")
+    conn.execute("CREATE TABLE profiles (time TIMESTAMP, depth, salinity REAL)")
+    conn.executemany("INSERT INTO profiles VALUES (?, ?, ?)", [
+        ("2025-01-01 00:00:00", (50).to_bytes(8, "little", signed=True), 35.0),
+        ("2025-01-02 00:00:00", 120, 34.5),
+    ])
+    frame = load_profiles(conn, ["depth", "salinity"])
+    assert frame["depth"].dtype == np.float32
+    assert frame["depth"].tolist() == [50.0, 120.0]
@@ -0,0 +1,52 @@
+"""Profile representations carry the same content."""
+
+import json
+
+import msgpack
+import pytest
+
+from encoding import ARROW, COLUMNAR_JSON, MSGPACK, encode_profiles, slim_profile, stream_profiles
+
+PROFILES = [
+    {"profile_id": 1, "lat": 12.3456789, "lon": 77.6543211, "source": "model",
+     "depth_levels": [{"pres": 5.0, "temp": 28.1, "salinity": 35.1}, {"pres": 1000.0, "temp": 4.5, "salinity": 34.9}]},
+    {"profile_id": 2, "lat": -43.1234567, "lon": 130.7654321, "source": "observed",
+     "score_components": {"distance": 0.9}, "climatology_anomaly": {"temperature": 0.2},
+     "derived": {"mld": 40.0, "sigma0": [22.1, 27.5]},
+     "depth_levels": [{"pres": 5.0, "temp": 12.5, "salinity": 34.2}, {"pres": 1000.0, "temp": 3.1, "salinity": 34.5}]},
+]
+
+
+def _keys(profiles):
+    return [sorted(p) for p in profiles]
+
+
+def test_columnar_and_msgpack_keep_every_field():
+    columnar = json.loads(encode_profiles(PROFILES, COLUMNAR_JSON))
+    packed = msgpack.unpackb(encode_profiles(PROFILES, MSGPACK))
+    assert _keys(columnar) == _keys(packed) == _keys(PROFILES)
+    assert packed[1]["derived"] == PROFILES[1]["derived"]
+
+
+def test_msgpack_keeps_float64_coordinates():
+    packed = msgpack.unpackb(encode_profiles(PROFILES, MSGPACK))
+    assert [(p["lat"], p["lon"]) for p in packed] == [(p["lat"], p["lon"]) for p in PROFILES]
+    assert packed[0]["depth_levels"]["temp"] == pytest.approx([28.1, 4.5], rel=1e-6)
+
+
+def test_streamed_msgpack_matches_whole_body():
+    assert b"".join(stream_profiles(iter(PROFILES), len(PROFILES), MSGPACK)) == encode_profiles(PROFILES, MSGPACK)
+
+
+def test_arrow_keeps_every_field():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.ipc.open_stream(encode_profiles(PROFILES, ARROW)).read_all()
+    assert sorted(table.column_names) == sorted({key for p in PROFILES for key in p})
+
+
+def test_slim_profile_only_trims_observed_rows():
+    assert slim_profile(PROFILES[0]) is PROFILES[0]
+    slim = slim_profile(PROFILES[1])
+    assert "score_components" not in slim and "climatology_anomaly" not in slim
+    assert slim["derived"] == {"mld": 40.0}
+    assert "score_components" in PROFILES[1]
@@ -0,0 +1,19 @@
+"""Which end of the distribution an extremes query asks for."""
+
+import pytest
+
+from main import _extreme_kind
+
+
+@pytest.mark.parametrize("query, kind", [
+    ("determine the peak temperature near mumbai", "max"),
+    ("highest salinity in the last few minutes", "max"),
+    ("maximum temperature in the arabian sea", "max"),
+    ("minimum salinity near chennai", "min"),
+    ("coldest water at lat 10 lon 60", "min"),
+    ("lowest temperature between 0-200m", "min"),
+    ("largest temperature anomalies this year", "anomaly"),
+    ("extreme temperatures near mumbai", "max"),
+])
+def test_extreme_kind(query, kind):
+    assert _extreme_kind(query) == kind
@@ -0,0 +1,13 @@
+"""/profiles/interpolate parameter validation."""
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("variables", [5, {"temperature": 1}, ["temperature", "density"], ""])
+def test_bad_variables_are_rejected(variables):
+    response = main.app.test_client().post("/profiles/interpolate",
+                                           json={"variables": variables, "profile_ids": [1]})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,76 @@
+"""Cursor pagination and page-size validation on /query."""
+
+import pytest
+
+import main
+import pagination
+from pagination import MAX_LIMIT, CursorError, decode_cursor, encode_cursor, parse_limit
+
+QUERY = "temperature at lat 13 lon 77.5"
+
+
+def _page(**body):
+    return main.app.test_client().post("/query", json={"query": QUERY, **body})
+
+
+def test_cursor_round_trip():
+    state = {"q": "abc", "o": 20, "v": "1-2"}
+    assert decode_cursor(encode_cursor(state)) == state
+
+
+def test_tampered_cursor_is_rejected():
+    token = encode_cursor({"q": "abc", "o": 20, "v": "1-2"})
+    forged = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+    with pytest.raises(CursorError):
+        decode_cursor(forged)
+
+
+def test_cursor_signed_with_another_key_is_rejected(monkeypatch):
+    monkeypatch.setattr(pagination, "_SECRET", b"another-key")
+    token = encode_cursor({"q": "abc", "o": 20, "v": "1-2"})
+    monkeypatch.undo()
+    with pytest.raises(CursorError):
+        decode_cursor(token)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(CursorError):
+        decode_cursor("not a cursor!")
+
+
+def test_next_cursor_continues_the_ranking():
+    first = _page(limit=3)
+    second = _page(limit=3, cursor=first.headers["X-Next-Cursor"])
+    assert second.status_code == 200
+    assert [p["source"] for p in first.get_json()] == ["model", "observed", "observed", "observed"]
+    assert [p["rank"] for p in second.get_json()] == [4, 5, 6]
+
+
+def test_cursor_from_another_query_is_rejected():
+    cursor = _page(limit=3).headers["X-Next-Cursor"]
+    response = main.app.test_client().post("/query", json={"query": "salinity near chennai", "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_forged_cursor_on_query_is_rejected():
+    response = _page(cursor=encode_cursor({"q": "0", "o": 0, "v": ""})[:-1] + "x")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("value, expected", [(None, 10), ("", 10), (5, 5), ("7", 7), (3.0, 3),
+                                             (MAX_LIMIT + 1, MAX_LIMIT)])
+def test_parse_limit_accepts_positive_integers(value, expected):
+    assert parse_limit(value, default=10) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", -5, 0, "0", 2.5, "2.5", True, [3], {"n": 3}])
+def test_parse_limit_rejects_everything_else(value):
+    with pytest.raises(ValueError):
+        parse_limit(value)
+
+
+@pytest.mark.parametrize("limit", ["abc", -5, 0])
+def test_invalid_limit_is_a_bad_request(limit):
+    response = _page(limit=limit)
+    assert response.status_code == 400
+    assert "limit" in response.get_json()["error"]
@@ -0,0 +1,49 @@
+"""Request profiling middleware."""
+
+import os
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import profiling
+from profiling import ProfilingMiddleware
+
+
+class Body:
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        yield b"streamed"
+
+    def close(self):
+        self.closed = True
+
+
+def _middleware(tmp_path, body):
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return body
+    return ProfilingMiddleware(app, directory=str(tmp_path), on_demand=True)
+
+
+def test_streamed_body_is_profiled_and_closed(tmp_path):
+    body = Body()
+    response = Client(_middleware(tmp_path, body), Response).get("/export", headers={"X-FloatChat-Profile": "1"})
+    assert response.data == b"streamed"
+    response.close()
+    assert body.closed
+    name = response.headers["X-FloatChat-Profile-Id"]
+    assert os.path.exists(os.path.join(tmp_path, name))
+    assert not profiling._PROFILER_BUSY.locked()
+
+
+def test_request_runs_unprofiled_while_another_is_profiled(tmp_path):
+    body = Body()
+    with profiling._PROFILER_BUSY:
+        response = Client(_middleware(tmp_path, body), Response).get("/query", headers={"X-FloatChat-Profile": "1"})
+    assert response.data == b"streamed"
+    assert "X-FloatChat-Profile-Id" not in response.headers
+    response.close()
+    assert body.closed
+    assert not os.listdir(tmp_path)
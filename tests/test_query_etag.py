@@ -0,0 +1,29 @@
+"""Deterministic /query validators across background index builds."""
+
+import main
+from climatology import get_climatology
+from extremes import get_extremes
+from semantic import get_search
+from shape import get_shape_search
+from store import get_store
+
+QUERY = {"query": "highest temperature at lat 13 lon 77.5", "limit": 5}
+
+
+def test_etag_changes_once_background_indexes_are_built():
+    client = main.app.test_client()
+    first = client.post("/query", json=QUERY)
+    assert first.status_code == 200
+    assert first.get_json()[0]["extremes"] is None
+
+    store = get_store()
+    for get_index in (get_climatology, get_extremes, get_search, get_shape_search):
+        assert get_index(store, wait=True) is not None
+
+    revalidated = client.post("/query", json=QUERY, headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 200
+    assert revalidated.get_json()[0]["extremes"] is not None
+    assert revalidated.headers["ETag"] != first.headers["ETag"]
+
+    again = client.post("/query", json=QUERY, headers={"If-None-Match": revalidated.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,25 @@
+"""Mergeable distribution summaries for the distribution page."""
+
+import numpy as np
+
+from sketches import MAX_EXTREMES, DistributionSummary
+
+
+def test_merging_small_partitions_keeps_each_value_once():
+    values = np.arange(10, dtype=float)
+    merged = DistributionSummary("temperature").update(values[:5])
+    merged.merge(DistributionSummary("temperature").update(values[5:]))
+    assert merged.low.tolist() == values.tolist()
+    assert merged.high.tolist() == values.tolist()
+
+
+def test_merge_matches_a_single_pass():
+    rng = np.random.default_rng(0)
+    values = rng.normal(15, 5, 4 * MAX_EXTREMES)
+    whole = DistributionSummary("temperature").update(values)
+    merged = DistributionSummary("temperature")
+    for part in np.array_split(values, 7):
+        merged.merge(DistributionSummary("temperature").update(part))
+    np.testing.assert_array_equal(merged.low, whole.low)
+    np.testing.assert_array_equal(merged.high, whole.high)
+    assert merged.n == whole.n
@@ -0,0 +1,28 @@
+"""Synthetic dataset generator."""
+
+import numpy as np
+
+from synthetic import STANDARD_PRESSURES, generate_batches
+
+
+def _rows(profiles, floats, years):
+    batches = list(generate_batches(profiles, floats, STANDARD_PRESSURES, "2020-01-01", years, 7, 1000))
+    return {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+
+
+def test_profile_times_stay_inside_the_window():
+    # 40 cycles per float would need 400 days at ten days apart
+    rows = _rows(profiles=400, floats=10, years=0.5)
+    start = np.datetime64("2020-01-01T00:00:00")
+    assert rows["time"].min() >= start
+    assert rows["time"].max() < start + np.timedelta64(int(0.5 * 365.25), "D")
+    assert len(rows["time"]) == 400 * len(STANDARD_PRESSURES)
+
+
+def test_no_pacific_freshening_without_a_query_naming_it():
+    # The API freshens the equatorial Pacific only for queries naming the Pacific
+    rows = _rows(profiles=5000, floats=500, years=5)
+    pacific = ((rows["depth"] == STANDARD_PRESSURES[0]) & (np.abs(rows["latitude"]) <= 10)
+               & (rows["longitude"] > -180) & (rows["longitude"] < -80))
+    assert pacific.any()
+    assert rows["salinity"][pacific].min() >= 34.5 - 0.1